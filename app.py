@@ -1,37 +1,44 @@
-import os, io, json, yaml
+import os, io, json, time, yaml, hashlib
+_run_started = time.perf_counter()
 import pandas as pd
 import numpy as np
 import streamlit as st
-import plotly.express as px
-from parser import EMFlowsParser
-from insights import prep_timeseries, compute_rolls, divergence_equity_vs_bond, generate_alerts
-from digitizer import render_pdf_page, relative_crop, extract_bars_series, extract_line_series, load_template, save_template
+from import_profile import lazy_import, import_report
+from store import FlowsStore
+from insights import prep_timeseries, compute_rolls, divergence_equity_vs_bond, generate_alerts, \
+    refresh_rolling_state, latest_from_state, weekly_note, publish_insights
+# The PDF (pdfplumber, rapidfuzz), CV (PyMuPDF, OpenCV, pytesseract) and plotting stacks are
+# imported on first use via lazy_import, so opening the dashboard doesn't pay for them.
 
 st.set_page_config(page_title="EM Flows – Offline Deep Insights", layout="wide")
 
-@st.cache_data(show_spinner=False)
-def parse_many(pdf_bytes_list, names):
-    parser = EMFlowsParser("config.yml")
-    frames = []
-    dates = []
+def parse_many(pdf_bytes_list, names, workers=1):
+    # Persistent content-hash cache (data/cache/parsed) instead of st.cache_data:
+    # it survives restarts and misses automatically when parsing config changes.
+    parser = lazy_import("parser", "Ingest & Parse").EMFlowsParser("config.yml")
+    cache = lazy_import("parse_cache", "Ingest & Parse").ParseCache(parser.cfg)
+    cache.prune()
     os.makedirs("data", exist_ok=True)
+    paths = []
     for b, nm in zip(pdf_bytes_list, names):
         path = f"data/{nm}"
         with open(path, "wb") as f:
-            f.write(b.read())
-        as_of, df = parser.parse_pdf(path)
-        dates.append(as_of)
-        frames.append(df)
-    if frames:
-        out = pd.concat(frames, ignore_index=True)
-    else:
-        out = pd.DataFrame(columns=["as_of_date","level","region","country","asset_class","measure","value","unit","source_pdf"])
-    return out
-
-def plot_ts(ts, key_cols, title):
+            f.write(b.getvalue())
+        paths.append(path)
+    return parser.parse_many(paths, workers=workers, cache=cache)
+
+@st.cache_resource
+def page_cache():
+    # One per server process: rendered pages survive the reruns every slider move triggers.
+    pcfg = load_cfg().get("digitizer", {}).get("page_cache", {})
+    PageCache = lazy_import("page_cache", "Digitizer").PageCache
+    return PageCache(max_mb=float(pcfg.get("max_mb", 256)), spill_dir=pcfg.get("spill_dir"))
+
+def plot_ts(ts, key_cols, title, key=None):
     d = ts.groupby(key_cols + ["as_of_date"], dropna=False)["flow_wow_usd_mn"].sum().reset_index()
+    px = lazy_import("plotly.express", "charts")
     fig = px.line(d, x="as_of_date", y="flow_wow_usd_mn", color=key_cols[-1] if key_cols else None, markers=True, title=title)
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(fig, use_container_width=True, key=key)
 
 def load_cfg():
     with open("config.yml","r") as f:
@@ -47,14 +54,25 @@ st.caption("All processing is local. No internet calls.")
 with st.sidebar:
     st.header("PDF Ingest (tables/text)")
     files = st.file_uploader("Drop weekly EM Flows PDFs", type=["pdf"], accept_multiple_files=True)
+    workers = st.number_input("Parallel workers", min_value=1, max_value=os.cpu_count() or 1,
+                              value=min(4, os.cpu_count() or 1), step=1)
     if st.button("Ingest & Parse", disabled=not files):
-        df = parse_many(files, [f.name for f in files])
+        df, report = parse_many(files, [f.name for f in files], workers=int(workers))
+        failed = [r for r in report if r["error"]]
+        for r in failed:
+            st.warning(f"{r['source_pdf']}: {r['error']}")
+        parsed, total = sum(r["pages_parsed"] for r in report), sum(r["pages"] for r in report)
+        st.caption(f"Pages parsed: {parsed:,}/{total:,} · early exits: {sum(r['early_exit'] for r in report)}/{len(report)}"
+                   f" · cache hits: {sum(r['cached'] for r in report)}/{len(report)}")
+        with st.expander("Per-file timing"):
+            st.dataframe(pd.DataFrame(report), use_container_width=True)
         if df.empty:
             st.error("No recognizable tables extracted. Use Digitizer tab for charts.")
         else:
-            os.makedirs("data", exist_ok=True)
-            df.to_parquet("data/flows_raw.parquet", index=False)
-            st.success(f"Ingest complete. Rows: {len(df):,} saved to data/flows_raw.parquet")
+            store = FlowsStore()
+            written = store.write(df)
+            publish_insights(store, changed_dates=df["as_of_date"].unique())
+            st.success(f"Ingest complete. Rows: {len(df):,} saved to {len(written)} partition(s) under data/flows")
 
     st.divider()
     st.header("Digitizer Templates")
@@ -65,29 +83,27 @@ with st.sidebar:
 
 tabs = st.tabs(["Overview (Parsed Tables)", "Digitizer (Charts → Data)", "Insights & Alerts", "Download Weekly Note"])
 
+flows_store = FlowsStore()
+
 with tabs[0]:
-    if not os.path.exists("data/flows_raw.parquet"):
+    if not flows_store.exists():
         st.info("No parsed tables yet. Use **Ingest & Parse** on the left, or go to **Digitizer**.")
     else:
-        df = pd.read_parquet("data/flows_raw.parquet")
         st.subheader("Normalized sample")
-        st.dataframe(df.head(50), use_container_width=True)
-
-        base = prep_timeseries(df)
-        ts = compute_rolls(base)
+        st.dataframe(flows_store.head(50), use_container_width=True)
 
+        # Filter choices only need the key columns; the filtered read below is pushed down to Parquet.
+        keys = flows_store.read(columns=["level","region","country","asset_class"])
         with st.expander("Filters", expanded=True):
-            level = st.multiselect("Level", sorted(ts["level"].dropna().unique()))
-            region = st.multiselect("Region", sorted(ts["region"].dropna().unique()))
-            asset = st.multiselect("Asset Class", sorted(ts["asset_class"].dropna().unique()))
-            country = st.multiselect("Country", sorted(ts["country"].dropna().unique()))
-
-        mask = pd.Series(True, index=ts.index)
-        if level: mask &= ts["level"].isin(level)
-        if region: mask &= ts["region"].isin(region)
-        if asset: mask &= ts["asset_class"].isin(asset)
-        if country: mask &= ts["country"].isin(country)
-        tsf = ts[mask].copy()
+            level = st.multiselect("Level", sorted(keys["level"].dropna().unique()))
+            region = st.multiselect("Region", sorted(keys["region"].dropna().unique()))
+            asset = st.multiselect("Asset Class", sorted(keys["asset_class"].dropna().unique()))
+            country = st.multiselect("Country", sorted(keys["country"].dropna().unique()))
+
+        # Rolls are computed per (level, region, country, asset_class), so filtering on those
+        # keys before compute_rolls gives the same rows as filtering afterwards.
+        df = flows_store.read(filters={"level": level, "region": region, "asset_class": asset, "country": country})
+        tsf = compute_rolls(prep_timeseries(df)) if not df.empty else pd.DataFrame()
         if tsf.empty:
             st.warning("No data for current filter.")
         else:
@@ -95,7 +111,7 @@ with tabs[0]:
             if country: group_keys = ["country","asset_class"]
             elif region: group_keys = ["region","asset_class"]
             else: group_keys = ["level","asset_class"]
-            plot_ts(tsf, [k for k in group_keys if k in tsf.columns], "Weekly Net Flows (USD mn)")
+            plot_ts(tsf, [k for k in group_keys if k in tsf.columns], "Weekly Net Flows (USD mn)", key="overview_ts")
             st.subheader("Rolling Sums (4W / 12W / 52W)")
             agg = tsf.groupby(group_keys + ["as_of_date"], dropna=False)[["flow_wow_usd_mn","roll_4w","roll_12w","roll_52w"]].sum().reset_index()
             st.dataframe(agg.tail(1000), use_container_width=True)
@@ -105,18 +121,24 @@ with tabs[1]:
     st.write("**Step 1.** Upload one PDF. **Step 2.** Pick Figure (1–9), adjust crop and Y-axis range, tune colors, then click **Extract**.")
     up = st.file_uploader("Upload a single PDF to digitize", type=["pdf"], accept_multiple_files=False, key="digpdf")
     if up:
-        # Save temp pdf
+        # Save temp pdf (only when the upload changed; the page cache is keyed on its hash)
         os.makedirs("data", exist_ok=True)
         pdf_path = f"data/_digitize.pdf"
-        with open(pdf_path, "wb") as f:
-            f.write(up.read())
+        pdf_bytes = up.getvalue()
+        pdf_sha = hashlib.sha256(pdf_bytes).hexdigest()
+        if st.session_state.get("digitize_sha") != pdf_sha or not os.path.exists(pdf_path):
+            with open(pdf_path, "wb") as f:
+                f.write(pdf_bytes)
+            st.session_state["digitize_sha"] = pdf_sha
 
         cfg = load_cfg()
         dcfg = cfg.get("digitizer", {})
         dpi = int(dcfg.get("dpi", 220))
         page_index = st.number_input("Page index (0-based)", min_value=0, value=int(dcfg.get("crops", {}).get("FIGURE 1", {}).get("page", 2)), step=1)
-        img = render_pdf_page(pdf_path, page_index, dpi=dpi)
+        pages = page_cache()
+        img = pages.page(pdf_path, pdf_sha, page_index, dpi)
         st.image(img, caption=f"Page {page_index}", use_column_width=True)
+        st.caption("Page cache: {pages} pages, {mb} MB, {hits} hits / {renders} renders".format(**pages.stats()))
 
         figure = st.selectbox("Which figure?", ["FIGURE 1","FIGURE 2","FIGURE 3","FIGURE 4","FIGURE 5","FIGURE 6","FIGURE 7","FIGURE 8","FIGURE 9"])
         crop_defaults = dcfg.get("crops", {}).get(figure, {"left":0.06,"top":0.10,"right":0.95,"bottom":0.58,"page":page_index})
@@ -125,7 +147,9 @@ with tabs[1]:
         right = st.slider("Crop right", 0.01, 1.0, float(crop_defaults.get("right",0.95)), 0.001)
         bottom = st.slider("Crop bottom", 0.01, 1.0, float(crop_defaults.get("bottom",0.58)), 0.001)
 
-        plot_img, box = relative_crop(img, left, top, right, bottom)
+        box = lazy_import("page_cache", "Digitizer").crop_box(img.shape, left, top, right, bottom)
+        plot_img = pages.crop(img, box)
+        plot_hsv = pages.hsv(pdf_sha, page_index, dpi, box, plot_img)
         st.image(plot_img, caption=f"{figure} – Cropped plot area", use_column_width=True)
 
         yr_defaults = dcfg.get("y_ranges", {}).get(figure, {"y_min":-10.0,"y_max":46.0,"units":"$bn"})
@@ -157,12 +181,13 @@ with tabs[1]:
         mode = st.selectbox("Extraction mode", ["Bars (weekly columns)","Line (time series)"])
 
         if st.button("Extract"):
+            dig = lazy_import("digitizer", "Digitizer")
             all_series = {}
             for nm, th in zip(series_names, series_thresholds):
                 if mode.startswith("Bars"):
-                    vals, baseline, mask = extract_bars_series(plot_img, th, y_min, y_max)
+                    vals, baseline, mask = dig.extract_bars_series(plot_img, th, y_min, y_max, hsv=plot_hsv)
                 else:
-                    vals, baseline, mask = extract_line_series(plot_img, th, y_min, y_max)
+                    vals, baseline, mask = dig.extract_line_series(plot_img, th, y_min, y_max, hsv=plot_hsv)
                 st.image(mask, caption=f"Mask preview – {nm}", use_column_width=True, clamp=True)
                 all_series[nm] = vals
 
@@ -192,42 +217,56 @@ with tabs[1]:
             yr = dcfg.get("y_ranges", {})
             yr[figure] = {"y_min": float(y_min), "y_max": float(y_max), "units": "$bn"}
             dcfg["y_ranges"] = yr
+            # series + mode so `python digitizer.py <folder>` can replay this figure headlessly
+            figs = dcfg.get("figures") or {}
+            figs[figure] = {"mode": "bars" if mode.startswith("Bars") else "line",
+                            "series": {nm: th for nm, th in zip(series_names, series_thresholds)}}
+            dcfg["figures"] = figs
             cfg["digitizer"] = dcfg
             save_cfg(cfg)
             st.success("Template saved into config.yml")
 
 with tabs[2]:
     st.subheader("Insights & Alerts")
-    # Merge any parsed tables + digitized series we understand
-    frames = []
-    if os.path.exists("data/flows_raw.parquet"):
-        frames.append(pd.read_parquet("data/flows_raw.parquet"))
-    # Example mapping: FIGURE 2 bars to Bond sub-classes (user-renamable)
     fig2_path = "data/digitized/FIGURE_2.parquet"
-    if os.path.exists(fig2_path):
-        df2 = pd.read_parquet(fig2_path)
-        # Assume Series names correspond to: Blended, Hard, Local, Total (as configured by user)
-        long = df2.reset_index().melt(id_vars=["week_index"], var_name="asset_class", value_name="value")
-        long["level"] = "EM"; long["region"] = None; long["country"] = None
-        long["measure"] = "WOW"; long["unit"] = "USD mn"; long["source_pdf"] = "digitized"
-        # Convert $bn → USD mn (×1000)
-        long["value"] = long["value"] * 1000.0
-        # Assign pseudo as_of_date using a reference (user can map week_index to dates later)
-        long["as_of_date"] = pd.Timestamp.today().normalize()
-        frames.append(long[["as_of_date","level","region","country","asset_class","measure","value","unit","source_pdf"]])
-
-    if frames:
-        all_df = pd.concat(frames, ignore_index=True)
-        base = prep_timeseries(all_df)
-        ts = compute_rolls(base)
-        st.write("Latest week in combined data:", ts["as_of_date"].max())
-        plot_ts(ts, ["level","asset_class"], "Weekly Net Flows (USD mn)")
-        div = divergence_equity_vs_bond(ts)
+    latest = hist = None
+    if flows_store.exists() and not os.path.exists(fig2_path):
+        # Parsed tables only: latest rolls/z/streaks come from the persisted per-series state,
+        # which refresh_rolling_state brings up to date in O(series) per new week.
+        latest = latest_from_state(refresh_rolling_state(flows_store))
+        hist = prep_timeseries(flows_store.read(columns=["as_of_date","level","asset_class","measure","value"]))
+        hist = hist[hist["is_wow_like"]].rename(columns={"value": "flow_wow_usd_mn"})
+    else:
+        # Merge any parsed tables + digitized series we understand
+        frames = []
+        if flows_store.exists():
+            frames.append(flows_store.read())
+        # Example mapping: FIGURE 2 bars to Bond sub-classes (user-renamable)
+        if os.path.exists(fig2_path):
+            df2 = pd.read_parquet(fig2_path)
+            # Assume Series names correspond to: Blended, Hard, Local, Total (as configured by user)
+            long = df2.reset_index().melt(id_vars=["week_index"], var_name="asset_class", value_name="value")
+            long["level"] = "EM"; long["region"] = None; long["country"] = None
+            long["measure"] = "WOW"; long["unit"] = "USD mn"; long["source_pdf"] = "digitized"
+            # Convert $bn → USD mn (×1000)
+            long["value"] = long["value"] * 1000.0
+            # Assign pseudo as_of_date using a reference (user can map week_index to dates later)
+            long["as_of_date"] = pd.Timestamp.today().normalize()
+            frames.append(long[["as_of_date","level","region","country","asset_class","measure","value","unit","source_pdf"]])
+        if frames:
+            all_df = pd.concat(frames, ignore_index=True)
+            base = prep_timeseries(all_df)
+            latest = hist = compute_rolls(base)
+
+    if latest is not None:
+        st.write("Latest week in combined data:", latest["as_of_date"].max())
+        plot_ts(hist, ["level","asset_class"], "Weekly Net Flows (USD mn)", key="insights_ts")
+        div = divergence_equity_vs_bond(latest)
         st.write("Equity vs Bond divergences (latest week, opposite signs):")
         if not div.empty:
             latest_d = div[div["as_of_date"]==div["as_of_date"].max()]
             st.dataframe(latest_d[latest_d["divergence"]==-1], use_container_width=True)
-        alerts = generate_alerts(ts)
+        alerts = generate_alerts(latest)
         st.write("Automated Alerts")
         st.dataframe(pd.DataFrame(alerts), use_container_width=True)
     else:
@@ -235,12 +274,23 @@ with tabs[2]:
 
 with tabs[3]:
     st.subheader("Download Weekly Note (auto-written)")
-    if not os.path.exists("data/flows_raw.parquet") and not os.path.exists("data/digitized/FIGURE_2.parquet"):
+    if not flows_store.exists() and not os.path.exists("data/digitized/FIGURE_2.parquet"):
         st.info("Need some data first (parse or digitize).")
+    elif not os.path.exists("data/digitized/FIGURE_2.parquet"):
+        # Parsed tables only: the note is written by every ingest (sidebar, parser.py, watcher.py)
+        note_path = "data/weekly_note.md"
+        if os.path.exists(note_path):
+            with open(note_path, "r", encoding="utf-8") as f:
+                note = f.read()
+        else:
+            note = weekly_note(latest_from_state(publish_insights(flows_store)))
+        st.code(note, language="markdown")
+        st.download_button("Download Weekly Note (Markdown)", note.encode("utf-8"),
+                           file_name="em_flows_weekly_note.md")
     else:
         frames = []
-        if os.path.exists("data/flows_raw.parquet"):
-            frames.append(pd.read_parquet("data/flows_raw.parquet"))
+        if flows_store.exists():
+            frames.append(flows_store.read())
         if os.path.exists("data/digitized/FIGURE_2.parquet"):
             df2 = pd.read_parquet("data/digitized/FIGURE_2.parquet")
             long = df2.reset_index().melt(id_vars=["week_index"], var_name="asset_class", value_name="value")
@@ -251,27 +301,15 @@ with tabs[3]:
             frames.append(long[["as_of_date","level","region","country","asset_class","measure","value","unit","source_pdf"]])
         all_df = pd.concat(frames, ignore_index=True)
         base = prep_timeseries(all_df); ts = compute_rolls(base)
+        note = weekly_note(ts)
 
-        latest = ts["as_of_date"].max()
-        latest_rows = ts[ts["as_of_date"]==latest].sort_values("z_52w")
-        top_in = latest_rows.dropna(subset=["z_52w"]).tail(5)
-        top_out = latest_rows.dropna(subset=["z_52w"]).head(5)
-
-        import io as _io
-        note = _io.StringIO()
-        note.write(f"# EM Flows Weekly – {latest.date() if hasattr(latest,'date') else str(latest)}\\n\\n")
-        note.write("## Highlights\\n")
-        if len(top_in):
-            note.write("**Strongest Inflows (z-score):**\\n")
-            for _, r in top_in.iterrows():
-                lab = r["country"] or r["level"]
-                note.write(f"- {lab} / {r['asset_class']}: z={r['z_52w']:.2f}, WoW={r['flow_wow_usd_mn']:.0f}mn, 4W={r['roll_4w']:.0f}mn\\n")
-        if len(top_out):
-            note.write("\\n**Strongest Outflows (z-score):**\\n")
-            for _, r in top_out.iterrows():
-                lab = r["country"] or r["level"]
-                note.write(f"- {lab} / {r['asset_class']}: z={r['z_52w']:.2f}, WoW={r['flow_wow_usd_mn']:.0f}mn, 4W={r['roll_4w']:.0f}mn\\n")
-
-        st.code(note.getvalue(), language="markdown")
-        st.download_button("Download Weekly Note (Markdown)", note.getvalue().encode("utf-8"),
-                           file_name="em_flows_weekly_note.md")
\ No newline at end of file
+        st.code(note, language="markdown")
+        st.download_button("Download Weekly Note (Markdown)", note.encode("utf-8"),
+                           file_name="em_flows_weekly_note.md")
+
+with st.sidebar:
+    with st.expander("Debug: import profile"):
+        st.caption(f"This run: {(time.perf_counter() - _run_started) * 1000:.0f} ms. "
+                   "Modules below were imported on demand (first use in this server process).")
+        st.dataframe(pd.DataFrame(import_report(), columns=["module", "ms", "new_modules", "needed_by", "loaded_at"]),
+                     use_container_width=True)
@@ -0,0 +1,78 @@
+"""Benchmark table normalization: vectorized numeric coercion vs the per-cell apply it replaced.
+
+    python benchmarks/bench_coerce.py [--rows 5000] [--cols 8]
+
+Builds a synthetic country table of PDF-style cells ("1,234.5", "(12.5)", "-", "n/a", ...), checks
+that utils.coerce_numeric_series and wide_to_long_guess agree with the per-cell path and prints timings.
+"""
+import os, sys, time, argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils import coerce_numeric, coerce_numeric_series, wide_to_long_guess
+
+NUM_REGEX = r"[^0-9+\-.,]"
+
+
+def wide_to_long_guess_reference(df, value_hints):
+    # Original implementation: pd.to_numeric once per column inside df.apply.
+    cols = df.columns
+    val_cols = [c for c in cols if any(h.lower() in str(c).lower() for h in value_hints)]
+    if not val_cols:
+        numeric_mask = df.apply(lambda s: pd.to_numeric(s, errors='coerce')).notna().sum()
+        val_cols = list(numeric_mask.sort_values(ascending=False).head(3).index)
+    id_cols = [c for c in cols if c not in val_cols]
+    return df.melt(id_vars=id_cols, value_vars=val_cols, var_name="measure", value_name="value")
+
+
+def synthetic_table(rows, cols, seed=0):
+    rng = np.random.default_rng(seed)
+    v = rng.normal(0, 2000, size=(rows, cols)).round(1)
+    cells = np.array([f"{x:,.1f}" for x in v.ravel()], dtype=object).reshape(rows, cols)
+    junk = rng.random((rows, cols))
+    cells[junk < 0.05] = "-"
+    cells[(junk >= 0.05) & (junk < 0.08)] = "n/a"
+    cells[(junk >= 0.08) & (junk < 0.10)] = None
+    cells[(junk >= 0.10) & (junk < 0.12)] = "(12.5)"
+    df = pd.DataFrame(cells, columns=[f"Col {j}" for j in range(cols)])
+    df.insert(0, "Country", [f"Country {i}" for i in range(rows)])
+    # a numeric-looking integer column so wide_to_long_guess has something to rank
+    df["Rank"] = np.arange(rows).astype(str)
+    return df
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--cols", type=int, default=8)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    df = synthetic_table(args.rows, args.cols)
+    long = wide_to_long_guess(df, ["Flow"])
+    pd.testing.assert_frame_equal(long, wide_to_long_guess_reference(df, ["Flow"]))
+    ref = long["value"].apply(lambda x: coerce_numeric(x, NUM_REGEX))
+    pd.testing.assert_series_equal(coerce_numeric_series(long["value"], NUM_REGEX), ref, check_names=False)
+
+    print(f"{args.rows} rows x {args.cols + 1} value columns, {len(long)} long cells")
+    for name, new, old in [
+        ("wide_to_long_guess", lambda: wide_to_long_guess(df, ["Flow"]), lambda: wide_to_long_guess_reference(df, ["Flow"])),
+        ("coerce values", lambda: coerce_numeric_series(long["value"], NUM_REGEX),
+                          lambda: long["value"].apply(lambda x: coerce_numeric(x, NUM_REGEX))),
+    ]:
+        t_old, t_new = timed(old, args.repeat), timed(new, args.repeat)
+        print(f"{name:20s} reference {t_old*1000:8.1f} ms   vectorized {t_new*1000:8.1f} ms   x{t_old/t_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Benchmark the NumPy bar/line extraction in digitizer.py against the per-column loops it replaced.
+
+    python benchmarks/bench_digitizer.py [--pages 6] [--dpi 220] [--pdf report.pdf ...]
+
+Without ``--pdf`` a set of synthetic chart pages (bars around a zero line plus a line series) is
+rendered with PyMuPDF. With ``--pdf`` every FIGURE template in config.yml is cropped from the given
+reports instead. Outputs are checked for exact equality before timings are printed.
+
+It then times digitize_pdf per report three ways: full page + crop, clip rendering of each
+figure box, and coarse-to-fine (``digitizer.render.coarse_dpi``). It also prints the megabytes
+of RGB pixels each way renders. Without ``--pdf`` the reports are synthetic pages with the axis
+at a random height, written to a temp PDF. On those, coarse-to-fine is checked two ways:
+
+* its baseline lies on the drawn axis line (either edge row);
+* its values equal the bar/line extraction over the whole box at ``dpi`` with that baseline,
+  so rendering only the rows that hold the series changes nothing.
+"""
+import os, sys, time, argparse, shutil, tempfile
+import numpy as np
+import cv2
+import fitz
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import digitizer
+from digitizer import (_coarse_pass, _clip_rect, snap_baseline, px_per_unit_for_height, extract_bars_series,
+                       _render_page, _render_clip, digitize_pdf, relative_crop, to_cv, mask_hsv, detect_baseline,
+                       estimate_px_per_unit, bars_from_mask, extract_line_series, figure_templates)
+
+
+def bars_from_mask_reference(mask, baseline_y, x_smooth=5):
+    # Original implementation: Python state machine over columns, one np.where per segment.
+    cols = mask.shape[1]
+    col_sum = (mask>0).sum(axis=0)
+    kernel = np.ones(x_smooth, dtype=np.float32)/x_smooth
+    smooth = np.convolve(col_sum, kernel, mode="same")
+    thr = np.percentile(smooth, 75) * 0.3
+    is_bar = smooth > thr
+    bars = []
+    in_seg = False
+    start = 0
+    for i, val in enumerate(is_bar):
+        if val and not in_seg:
+            in_seg = True; start = i
+        elif not val and in_seg:
+            in_seg = False; bars.append((start, i-1))
+    if in_seg: bars.append((start, cols-1))
+    heights = []
+    for (x1,x2) in bars:
+        seg = mask[:, x1:x2+1]
+        ys = np.where(seg>0)[0]
+        if ys.size == 0:
+            heights.append((x1,x2,0.0)); continue
+        y_top = ys.min()
+        y_bot = ys.max()
+        h_pos = baseline_y - y_top if y_top < baseline_y else 0
+        h_neg = y_bot - baseline_y if y_bot > baseline_y else 0
+        heights.append((x1,x2, float(h_pos - h_neg)))
+    return heights
+
+
+def extract_line_series_reference(plot_img, hsv_thresh, y_min, y_max):
+    # Original implementation: np.median of the set rows, one column at a time.
+    bgr = to_cv(plot_img)
+    h,w = bgr.shape[:2]
+    mask = mask_hsv(bgr, **hsv_thresh)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3,3), np.uint8))
+    ys = []
+    for x in range(w):
+        col = np.where(mask[:,x]>0)[0]
+        ys.append(np.nan if col.size==0 else float(np.median(col)))
+    baseline_y = detect_baseline(bgr)
+    px_per_unit = estimate_px_per_unit(bgr, y_min, y_max, baseline_y)
+    vals = [np.nan if np.isnan(y) else (baseline_y - y)/px_per_unit for y in ys]
+    return vals, baseline_y, mask
+
+
+SERIES = {"bond_green": {"h_min":45,"h_max":85,"s_min":50,"s_max":255,"v_min":50,"v_max":255},
+          "equity_blue": {"h_min":90,"h_max":130,"s_min":50,"s_max":255,"v_min":50,"v_max":255}}
+X0, X1, Y0, Y1 = 36, 576, 80, 460  # chart area of a synthetic page, in points
+BOX = (X0/612, Y0/792 - 0.02, X1/612, Y1/792 + 0.02)
+
+
+def draw_chart(page, rng, base, bar_sd=50, line_sd=60):
+    # 52 green bars around a black zero line at y=base, plus a blue line series
+    page.draw_line((X0, base), (X1, base), color=(0,0,0), width=1)
+    pts = []
+    for k in range(52):
+        x = X0 + 6 + k * 10
+        h = float(rng.normal(0, bar_sd))
+        page.draw_rect(fitz.Rect(x, min(base, base-h), x+3, max(base, base-h)), color=(0,0.7,0), fill=(0,0.7,0))
+        pts.append(fitz.Point(x + 5, base - float(rng.normal(0, line_sd))))
+    page.draw_polyline(pts, color=(0,0,0.9), width=1.5)
+
+
+def synthetic_pages(n, dpi, seed=0):
+    """Render n chart pages; returns [(plot image, template)] shaped like figure_templates output."""
+    rng = np.random.default_rng(seed)
+    out = []
+    with fitz.open() as doc:
+        for i in range(n):
+            draw_chart(doc.new_page(width=612, height=792), rng, (Y0 + Y1) / 2)
+            plot_img, _ = relative_crop(_render_page(doc, i, dpi), *BOX)
+            out.append((plot_img, {"y_min": -10.0, "y_max": 46.0, "series": SERIES}))
+    return out
+
+
+def synthetic_pdf(path, n, seed=1):
+    """Write n chart pages with the axis at a random height to ``path``.
+
+    Returns a bars and a lines template per page, and the axis line's centre (points) per template."""
+    rng = np.random.default_rng(seed)
+    templates, axes = {}, {}
+    with fitz.open() as doc:
+        for i in range(n):
+            base = (Y0 + Y1) / 2 + float(rng.integers(-60, 61))
+            draw_chart(doc.new_page(width=612, height=792), rng, base, bar_sd=40, line_sd=40)
+            for mode, name in (("bars", "bond_green"), ("lines", "equity_blue")):
+                fig = f"FIGURE {i+1} {mode}"
+                templates[fig] = {"page": i, "box": BOX, "y_min": -10.0, "y_max": 46.0, "mode": mode,
+                                  "series": {name: SERIES[name]}}
+                axes[fig] = base
+        doc.save(path)
+    return templates, axes
+
+
+def check_coarse(path, templates, axes, dpi, coarse_dpi):
+    # Same steps as digitize_pdf's coarse path, but extracting from the whole box render.
+    df = digitize_pdf(path, templates, dpi, clip=True, coarse_dpi=coarse_dpi)
+    hough = 0
+    with fitz.open(path) as doc:
+        for fig, t in templates.items():
+            series, band, height, coarse_y = _coarse_pass(doc, t["page"], t, dpi, coarse_dpi)
+            plot_img = _render_clip(doc, t["page"], t["box"], dpi)
+            bgr = to_cv(plot_img)
+            y0, pad = band[0], int(np.ceil(dpi / coarse_dpi)) + 2
+            base = y0 + snap_baseline(bgr[y0:band[1]], coarse_y - y0, pad, height // 2 - y0)
+            axis = axes[fig] * dpi / 72 - (_clip_rect(doc.load_page(t["page"]), t["box"]) * fitz.Matrix(dpi/72, dpi/72)).irect.y0
+            on_axis = dpi / 144 + 1  # half the 1pt line, plus a pixel: either edge row counts
+            assert abs(base - axis) <= on_axis, (fig, base, axis)
+            hough += abs(detect_baseline(bgr) - axis) <= on_axis
+            extract = extract_bars_series if t["mode"] == "bars" else extract_line_series
+            ppu = px_per_unit_for_height(height, t["y_min"], t["y_max"], base)
+            for name, th in series.items():
+                expect = extract(plot_img, th, t["y_min"], t["y_max"], baseline_y=base, px_per_unit=ppu)[0]
+                got = df[(df["figure"] == fig) & (df["series"] == name)]["value"].to_numpy()
+                np.testing.assert_array_equal(got, np.asarray(expect, dtype=float))
+    print(f"coarse-to-fine baseline on the drawn axis for {len(templates)}/{len(templates)} figures "
+          f"(full-dpi Hough: {hough}/{len(templates)}); values match whole-box extraction")
+
+
+def pdf_pages(paths, config_path, dpi):
+    with open(config_path, "r") as f:
+        templates = figure_templates(yaml.safe_load(f))
+    out = []
+    for path in paths:
+        with fitz.open(path) as doc:
+            for t in templates.values():
+                if t["page"] < doc.page_count:
+                    plot_img, _ = relative_crop(_render_page(doc, t["page"], dpi), *t["box"])
+                    out.append((plot_img, t))
+    return out
+
+
+def rendered_mb(fn):
+    # MB of RGB pixels digitizer renders while fn runs (counted through its two render helpers)
+    total = [0]
+    originals = digitizer._render_page, digitizer._render_clip
+    def counted(render):
+        def wrapper(*a, **kw):
+            img = render(*a, **kw)
+            total[0] += img.size[0] * img.size[1] * 3
+            return img
+        return wrapper
+    digitizer._render_page, digitizer._render_clip = map(counted, originals)
+    try:
+        fn()
+    finally:
+        digitizer._render_page, digitizer._render_clip = originals
+    return total[0] / 1e6
+
+
+def bench_render(paths, templates, dpi, coarse_dpi, repeat):
+    t_base = None
+    for label, kw in [("full page + crop", dict(clip=False)), ("clip", dict(clip=True)),
+                      (f"clip, coarse {coarse_dpi} dpi", dict(clip=True, coarse_dpi=coarse_dpi))]:
+        run = lambda: [digitize_pdf(p, templates, dpi, **kw) for p in paths]
+        mb, t = rendered_mb(run), timed(run, repeat)
+        t_base = t_base or t
+        print(f"digitize_pdf {label:22s} {t*1000:8.1f} ms  x{t_base/t:4.1f}   rendered {mb:7.1f} MB")
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=6)
+    ap.add_argument("--dpi", type=int, default=220)
+    ap.add_argument("--pdf", nargs="*", default=None)
+    ap.add_argument("--config", default="config.yml")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--coarse-dpi", type=int, default=72)
+    args = ap.parse_args(argv)
+
+    pages = pdf_pages(args.pdf, args.config, args.dpi) if args.pdf else synthetic_pages(args.pages, args.dpi)
+    # Bars run on the blurred masks extract_bars_series builds; lines take the plot image.
+    bar_inputs = []
+    for plot_img, t in pages:
+        bgr = to_cv(plot_img)
+        base_y = detect_baseline(bgr)
+        for th in t["series"].values():
+            bar_inputs.append((cv2.medianBlur(mask_hsv(bgr, **th), 5), base_y))
+    line_inputs = [(plot_img, th, t["y_min"], t["y_max"]) for plot_img, t in pages for th in t["series"].values()]
+
+    for m, b in bar_inputs:
+        assert bars_from_mask(m, b) == bars_from_mask_reference(m, b), "bars_from_mask mismatch"
+    for args_ in line_inputs:
+        new, ref = extract_line_series(*args_)[0], extract_line_series_reference(*args_)[0]
+        np.testing.assert_array_equal(np.asarray(new), np.asarray(ref))
+
+    print(f"{len(pages)} plot crops, {len(bar_inputs)} series, {pages[0][0].size[0]}x{pages[0][0].size[1]} px")
+    for name, new, ref in [
+        ("bars_from_mask", lambda: [bars_from_mask(m, b) for m, b in bar_inputs],
+                           lambda: [bars_from_mask_reference(m, b) for m, b in bar_inputs]),
+        ("extract_line_series", lambda: [extract_line_series(*a) for a in line_inputs],
+                                lambda: [extract_line_series_reference(*a) for a in line_inputs]),
+    ]:
+        t_ref, t_new = timed(ref, args.repeat), timed(new, args.repeat)
+        print(f"{name:22s} reference {t_ref*1000:8.1f} ms   vectorized {t_new*1000:8.1f} ms   x{t_ref/t_new:.1f}")
+    if args.pdf:
+        with open(args.config, "r") as f:
+            bench_render(args.pdf, figure_templates(yaml.safe_load(f)), args.dpi, args.coarse_dpi, args.repeat)
+        return
+    folder = tempfile.mkdtemp()
+    try:
+        path = os.path.join(folder, "synthetic.pdf")
+        templates, axes = synthetic_pdf(path, args.pages)
+        check_coarse(path, templates, axes, args.dpi, args.coarse_dpi)
+        bench_render([path], templates, args.dpi, args.coarse_dpi, args.repeat)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark table-pattern classification: PatternMatcher (one cdist call) vs the per-keyword loop.
+
+    python benchmarks/bench_matcher.py [--patterns 60] [--tables 200]
+
+Starts from the patterns in config.yml and pads them with synthetic regional patterns, the
+way the config grows. Checks that both paths pick the same pattern and score for every table.
+"""
+import os, sys, time, random, argparse
+import yaml
+from rapidfuzz import fuzz
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pattern_matcher import PatternMatcher
+
+REGIONS = ["LatAm", "EMEA", "APAC", "GCC", "CEE", "ASEAN", "Frontier", "China", "India", "Brazil"]
+ASSETS = ["Equity", "Local Bond", "Hard Currency Bond", "Money Market", "Blend"]
+
+
+def classify_reference(title, patterns, threshold=60):
+    # Original implementation: partial_ratio per keyword, strict '>' scan over patterns.
+    title = title.lower()
+    best_score, best_name = 0, None
+    for name, patt in patterns:
+        best = 0
+        for kw in patt.get("keywords", []):
+            best = max(best, fuzz.partial_ratio(title, kw.lower()))
+        if best > best_score:
+            best_score, best_name = best, name
+    if best_name is None or best_score < threshold:
+        return None, best_score
+    return best_name, best_score
+
+
+def build_patterns(config_path, n):
+    with open(config_path, "r") as f:
+        cfg = yaml.safe_load(f)
+    patterns = list((cfg.get("table_patterns") or {}).items()) + list((cfg.get("country_table_patterns") or {}).items())
+    rng = random.Random(0)
+    while len(patterns) < n:
+        region, asset = rng.choice(REGIONS), rng.choice(ASSETS)
+        kws = [f"{region} {asset}", f"{asset} flows {region}", f"{region} {asset} by country",
+               f"{region} {asset.split()[0]} fund flows", f"{asset} ({region})"]
+        patterns.append((f"synthetic_{len(patterns)}", {"keywords": kws}))
+    return patterns
+
+
+def synthetic_titles(n, seed=1):
+    rng = random.Random(seed)
+    words = REGIONS + ASSETS + ["Market", "WoW", "4W", "12W", "USD mn", "Country", "Korea", "flows", "net"]
+    return [" | ".join(rng.choice(words) for _ in range(rng.randint(2, 6))) + " :: " +
+            " ".join(str(rng.randint(-900, 900)) for _ in range(6)) for _ in range(n)]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--patterns", type=int, default=60)
+    ap.add_argument("--tables", type=int, default=200)
+    ap.add_argument("--config", default="config.yml")
+    args = ap.parse_args(argv)
+
+    patterns = build_patterns(args.config, args.patterns)
+    titles = synthetic_titles(args.tables)
+
+    t0 = time.perf_counter()
+    ref = [classify_reference(t, patterns) for t in titles]
+    t_ref = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    matcher = PatternMatcher(patterns)
+    new = matcher.classify(titles)
+    t_new = time.perf_counter() - t0
+    assert new == ref, "PatternMatcher disagrees with the per-keyword loop"
+
+    print(f"{len(patterns)} patterns, {len(matcher.keywords)} distinct keywords, {len(titles)} tables")
+    print(f"classify  reference {t_ref*1000:8.1f} ms   PatternMatcher (incl. build) {t_new*1000:8.1f} ms   x{t_ref/t_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark the Tail dashboard aggregations: one-hot matrix product vs melt/pivot and per-vector loops.
+
+    python benchmarks/bench_tail_agg.py [--rows 300] [--vectors 261]
+
+Builds a sheet shaped like a DVaR/SVaR tail sheet (Node + sensitivity columns + pnl_vector
+block, some rows on nodes outside the map, a few blank cells) and checks that
+tail_agg.asset_sums / summary_frame match the long-format path, and tail_agg.vector_table the
+per-vector loop of updates_tail.aggregate_vectors, before timing them.
+"""
+import os, sys, time, argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tail_flas", "Tail_flask"))
+from tail_agg import NODE_MAP, asset_sums, summary_frame, vector_table
+
+
+def pivot_reference(raw_df, pnl_cols, node_map):
+    # Original implementation: melt to long form, groupby, pivot back.
+    long_df = pd.melt(raw_df, id_vars=["Node"], value_vars=pnl_cols, var_name="Pnl_Vector", value_name="Value")
+    long_df["Asset_Class"] = long_df["Node"].map(node_map)
+    summary = long_df.groupby(["Pnl_Vector", "Asset_Class"])["Value"].sum().reset_index()
+    return summary.pivot_table(index="Pnl_Vector", columns="Asset_Class", values="Value").fillna(0)
+
+
+def summary_reference(raw_df, date_map, pnl_cols, node_map):
+    pivot_df = pivot_reference(raw_df, pnl_cols, node_map)
+    pivot_df["Macro"] = pivot_df.sum(axis=1)
+    pivot_df["Date"] = pivot_df.index.map(date_map)
+    # positional: assigning the extracted frame directly aligns on a RangeIndex and gives NaN
+    pivot_df["P&L Vector No"] = pivot_df.index.str.extract(r'(\d+)')[0].astype(int).to_numpy()
+    pivot_df['Macro Rank'] = pivot_df['Macro'].rank(method='first', ascending=True).astype(int)
+    pivot_df.drop_duplicates(subset=['P&L Vector No'], keep='first', inplace=True)
+    return pivot_df.reset_index()
+
+
+def aggregate_vectors_reference(df, max_vector):
+    # Original updates_tail.aggregate_vectors: three masked sums per vector.
+    df = df[df['Node'].isin([10, 22194, 1373254])].copy()
+    df['Asset class'] = df['Node'].map({10: 'FX', 22194: 'Rates', 1373254: 'EM Macro'})
+
+    rows = []
+    for i in range(1, max_vector + 1):
+        vcol = f"pnl_vector{i}"
+        if vcol not in df.columns:
+            continue
+        fx_sum = df.loc[df['Asset class'] == 'FX', vcol].sum()
+        rates_sum = df.loc[df['Asset class'] == 'Rates', vcol].sum()
+        em_sum = df.loc[df['Asset class'] == 'EM Macro', vcol].sum()
+        macro = fx_sum + rates_sum + em_sum
+        rows.append([i, vcol, fx_sum, rates_sum, em_sum, macro])
+
+    return pd.DataFrame(rows, columns=['rank', 'pnl_vector', 'FX', 'Rates', 'EM Macro', 'Macro'])
+
+
+def synthetic_sheet(rows, vectors, seed=0):
+    rng = np.random.default_rng(seed)
+    nodes = rng.choice(list(NODE_MAP) + [99999], size=rows, p=[0.3, 0.3, 0.3, 0.1])
+    pnl = rng.uniform(-5e5, 5e5, size=(rows, vectors))
+    pnl[rng.random((rows, vectors)) < 0.01] = np.nan
+    cols = [f"pnl_vector{v}" for v in range(1, vectors + 1)]
+    df = pd.DataFrame(pnl, columns=cols)
+    df.insert(0, "Node", nodes)
+    df.insert(1, "sensitivity_type", rng.choice(["IR Delta SABR", "EQ Delta", "FX Vega"], size=rows))
+    date_map = dict(zip(cols, pd.date_range("2024-01-01", periods=vectors).strftime("%d-%m-%Y")))
+    return df, cols, date_map
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=300)
+    ap.add_argument("--vectors", type=int, default=261)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    df, cols, date_map = synthetic_sheet(args.rows, args.vectors)
+    pd.testing.assert_frame_equal(asset_sums(df, cols), pivot_reference(df, cols, NODE_MAP))
+    pd.testing.assert_frame_equal(summary_frame(df, date_map, cols), summary_reference(df, date_map, cols, NODE_MAP))
+    max_vector = args.vectors + 5  # a few ranks past the sheet, which both skip
+    pd.testing.assert_frame_equal(vector_table(df, max_vector), aggregate_vectors_reference(df, max_vector))
+    # an asset class with no rows still gets a (zero) column
+    no_rates = df[df["Node"] != 22194]
+    pd.testing.assert_frame_equal(vector_table(no_rates, max_vector), aggregate_vectors_reference(no_rates, max_vector))
+
+    print(f"{args.rows} rows x {args.vectors} vectors")
+    for name, new, old in [
+        ("asset sums", lambda: asset_sums(df, cols), lambda: pivot_reference(df, cols, NODE_MAP)),
+        ("summary frame", lambda: summary_frame(df, date_map, cols),
+                          lambda: summary_reference(df, date_map, cols, NODE_MAP)),
+        ("vector table", lambda: vector_table(df, max_vector), lambda: aggregate_vectors_reference(df, max_vector)),
+    ]:
+        t_old, t_new = timed(old, args.repeat), timed(new, args.repeat)
+        print(f"{name:15s} reference  {t_old*1000:8.1f} ms   matrix product {t_new*1000:8.1f} ms   x{t_old/t_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
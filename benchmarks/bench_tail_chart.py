@@ -0,0 +1,157 @@
+"""Benchmark the Tail COB vs PrevCOB chart: typed, decimated, cached sources (tail_chart) vs whole frames.
+
+    python benchmarks/bench_tail_chart.py [--vectors 260 5000 50000]
+
+The reference is the old tail.create_bokeh_chart: it merges both summary frames in full and hands
+the result to ``ColumnDataSource``, then builds and serializes a new figure on every rerun. The new
+path does what tail.create_bokeh_chart does: ``chart_data`` sources kept in a ``tail_chart.ChartCache``,
+with a new figure over them on every call. This checks:
+
+* up to ``MAX_POINTS`` vectors, the plotted columns hold the same values as the reference;
+* past that, every kept row holds the reference values, the first and last vectors are kept, and
+  so is each series' min and max in every bucket (checked against a plain loop).
+
+It then prints the JSON payload and the build + serialize time, both on a first render and on a
+rerun with unchanged data, and the time for a cached ``ChartCache.item`` (the Flask route). It also
+checks that a rerun gets a new figure over the same cached arrays.
+"""
+import os, sys, json, time, argparse, warnings
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tail_flas", "Tail_flask"))
+from bokeh.embed import json_item
+from bokeh.plotting import figure
+from bokeh.models import HoverTool, ColumnDataSource, NumeralTickFormatter
+from tail_chart import MAX_POINTS, ChartCache, chart_data, fingerprint, minmax_indices
+warnings.filterwarnings("ignore")  # Bokeh 3 deprecates circle(size=...); the pinned 2.4 doesn't
+
+ASSETS = ["FX", "Rates", "EM Macro"]
+CHART_COLUMNS = ["P&L Vector No", "Date", "Macro"]
+
+
+def _decorate(p, source, title):
+    p.yaxis.formatter = NumeralTickFormatter(format="0,0.00a")
+    p.line(x='P&L Vector No', y='Macro_COB', source=source, legend_label="Macro COB", color="dodgerblue", width=2.5, alpha=0.8)
+    p.circle(x='P&L Vector No', y='Macro_COB', source=source, legend_label="Macro COB", color="dodgerblue", size=5)
+    p.line(x='P&L Vector No', y='Macro_PrevCOB', source=source, legend_label="Macro PrevCOB", color="gray", width=2, line_dash="dashed")
+    p.add_tools(HoverTool(tooltips=[("P&L Vector", "@{P&L Vector No}"), ("Date", "@Date_COB_dt{%F}"), ("Macro COB", "@Macro_COB{0,0}"),
+                                    ("Macro PrevCOB", "@Macro_PrevCOB{0,0}")], formatters={'@Date_COB_dt': 'datetime'}))
+    p.legend.location = "top_left"
+    p.legend.click_policy = "hide"
+    return p
+
+
+def reference_source(cob_df, prev_cob_df):
+    # Full merge of both frames, every column into the source.
+    source_df = pd.merge(cob_df, prev_cob_df, on='P&L Vector No', how="inner", suffixes=('_COB', '_PrevCOB'))
+    source_df['Date_COB_dt'] = pd.to_datetime(source_df['Date_COB'], errors='coerce')
+    return source_df
+
+
+def chart_reference(cob_df, prev_cob_df, title):
+    source = ColumnDataSource(reference_source(cob_df, prev_cob_df))
+    p = figure(height=400, x_axis_label="P&L Vector No", y_axis_label="Value", title=title, sizing_mode="stretch_width", tools="pan,wheel_zoom,box_zoom,reset,save")
+    return _decorate(p, source, title)
+
+
+def new_source(cob_df, prev_cob_df):
+    source_df = pd.merge(cob_df[CHART_COLUMNS], prev_cob_df[["P&L Vector No", "Macro"]], on='P&L Vector No', how="inner", suffixes=('_COB', '_PrevCOB'))
+    source_df['Date_COB_dt'] = pd.to_datetime(source_df['Date'], errors='coerce')
+    return chart_data(source_df, 'P&L Vector No', ['Macro_COB', 'Macro_PrevCOB'], ['Date_COB_dt'])
+
+
+def chart_new(cache, cob_df, prev_cob_df, title):
+    key = fingerprint(title, cob_df[CHART_COLUMNS], prev_cob_df[["P&L Vector No", "Macro"]])
+    data = cache.get_or_build(key, lambda: new_source(cob_df, prev_cob_df))
+    p = figure(height=400, x_axis_label="P&L Vector No", y_axis_label="Value", title=title, sizing_mode="stretch_width", tools="pan,wheel_zoom,box_zoom,reset,save")
+    return _decorate(p, ColumnDataSource(data), title)
+
+
+def synthetic_summary(vectors, seed, date):
+    # the tail_agg.summary_frame layout: index, assets, Macro, Date, P&L Vector No, Macro Rank
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.standard_t(3, size=(vectors, len(ASSETS))) * 1e6, columns=ASSETS)
+    df.insert(0, "index", [f"pnl_vector{i}" for i in range(1, vectors + 1)])
+    df["Macro"] = df[ASSETS].sum(axis=1)
+    df["Date"] = pd.Timestamp(date) - pd.to_timedelta(np.arange(vectors) % 3650, unit="D")
+    df["P&L Vector No"] = np.arange(1, vectors + 1)
+    df["Macro Rank"] = df["Macro"].rank(method="first").astype(int)
+    return df
+
+
+def bucket_extremes(y, max_points):
+    # plain loop over the same equal-count buckets minmax_indices uses
+    n = len(y)
+    buckets = max(1, (max_points - 2) // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.intp)
+    return [(y[a:b].min(), y[a:b].max()) for a, b in zip(edges[:-1], edges[1:])], edges
+
+
+def check(cob, prev):
+    ref = reference_source(cob, prev)
+    new = new_source(cob, prev)
+    ref_ms = ref["Date_COB_dt"].to_numpy(dtype="datetime64[ms]").astype(np.int64).astype(np.float64)
+    if len(ref) <= MAX_POINTS:
+        np.testing.assert_array_equal(new["P&L Vector No"], ref["P&L Vector No"])
+        np.testing.assert_array_equal(new["Macro_COB"], ref["Macro_COB"])
+        np.testing.assert_array_equal(new["Macro_PrevCOB"], ref["Macro_PrevCOB"])
+        np.testing.assert_array_equal(new["Date_COB_dt"], ref_ms)
+        return
+    rows = np.searchsorted(ref["P&L Vector No"].to_numpy(), new["P&L Vector No"])
+    for name in ("Macro_COB", "Macro_PrevCOB"):
+        np.testing.assert_array_equal(new[name], ref[name].to_numpy()[rows])
+    np.testing.assert_array_equal(new["Date_COB_dt"], ref_ms[rows])
+    assert rows[0] == 0 and rows[-1] == len(ref) - 1
+    kept = set(rows.tolist())
+    for name in ("Macro_COB", "Macro_PrevCOB"):
+        y = ref[name].to_numpy()
+        extremes, edges = bucket_extremes(y, MAX_POINTS)
+        for (lo, hi), a, b in zip(extremes, edges[:-1], edges[1:]):
+            in_bucket = [r for r in range(a, b) if r in kept]
+            assert lo in y[in_bucket] and hi in y[in_bucket], (name, a, b)
+    assert set(minmax_indices(ref["Macro_COB"].to_numpy())) <= kept
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vectors", type=int, nargs="+", default=[260, 5000, 50000])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    title = "DVaR: Macro COB vs. Macro PrevCOB"
+    print(f"MAX_POINTS={MAX_POINTS} per series")
+    for n in args.vectors:
+        cob = synthetic_summary(n, 0, "2025-06-06")
+        prev = synthetic_summary(n, 1, "2025-06-05").sample(frac=1.0, random_state=2)  # merge re-aligns it
+        check(cob, prev)
+
+        t_ref, ref_item = timed(lambda: json.dumps(json_item(chart_reference(cob, prev, title))), args.repeat)
+
+        def first():
+            return json.dumps(json_item(chart_new(ChartCache(), cob, prev, title)))
+        t_first, new_item = timed(first, args.repeat)
+        cache = ChartCache()
+        a, b = chart_new(cache, cob, prev, title), chart_new(cache, cob, prev, title)
+        src_a, src_b = a.select_one(ColumnDataSource), b.select_one(ColumnDataSource)
+        assert a is not b and src_a is not src_b and src_a.data["Macro_COB"] is src_b.data["Macro_COB"]
+        t_rerun, _ = timed(lambda: json.dumps(json_item(chart_new(cache, cob, prev, title))), args.repeat)
+        key = fingerprint(title, cob[CHART_COLUMNS], prev[["P&L Vector No", "Macro"]])
+        cache.item(key, lambda: chart_new(cache, cob, prev, title))
+        t_item, _ = timed(lambda: json.dumps(cache.item(key, None)), args.repeat)
+        print(f"{n:6d} vectors  payload {len(ref_item)/1024:9.1f} KiB -> {len(new_item)/1024:7.1f} KiB   "
+              f"render {t_ref*1000:8.1f} ms -> first {t_first*1000:6.1f} ms (x{t_ref/t_first:.1f}), "
+              f"rerun {t_rerun*1000:6.1f} ms (x{t_ref/t_rerun:.1f}), cached item {t_item*1000:5.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
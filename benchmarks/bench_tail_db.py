@@ -0,0 +1,129 @@
+"""Benchmark the Tail Flask SQLite layer: tail_db schema + bulk load vs melt/to_sql + per-asset queries.
+
+    python benchmarks/bench_tail_db.py [--xlsx path/to/Tail_analysis_auto.xlsx] [--rows 300]
+
+Ingests the same workbook both ways and checks that tail_db.var_frames returns the per-asset and
+Macro frames the old ``pnl_data`` queries built, for every (VaR type, sheet type) the app loads.
+"""
+import os, sys, time, sqlite3, argparse, tempfile
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tail_flas", "Tail_flask"))
+import tail_db
+from tail_agg import NODE_MAP
+from tail_excel import pnl_date_map, read_tail_workbook
+from bench_tail_excel import write_synthetic
+
+ASSET_NODES = {asset: node for node, asset in NODE_MAP.items()}
+SHEETS = {"DVaR_COB": ("DVaR", "current", 261, 520), "DVaR_Prev_COB": ("DVaR", "previous", 261, 520),
+          "SVaR_COB": ("SVaR", "current", 1, 260), "SVaR_Prev_COB": ("SVaR", "previous", 1, 260)}
+QUERIES = [(s, v) for v in ("DVaR", "SVaR") for s in ("current", "previous")]
+
+
+def ingest_reference(book, db_path):
+    # Original ingest_excel_to_sqlite: melt every sheet, dates as text, to_sql into pnl_data.
+    dfs = []
+    for name, (var_type, sheet_type, lo, hi) in SHEETS.items():
+        df = book[name].frame().dropna(axis=1, how="all")
+        df["Node"] = pd.to_numeric(df["Node"], errors="coerce").astype("Int64")
+        dates = pnl_date_map(book[name])
+        cols = []
+        for c in [c for c in df.columns if str(c).startswith("pnl_vector")]:
+            prev = "[T-2]" in str(c)
+            digits = "".join(filter(str.isdigit, str(c).split("[T-2]")[0]))
+            if digits and lo <= int(digits) <= hi and prev == (sheet_type == "previous"):
+                cols.append(c)
+        ids = [c for c in ["Var Type", "Node", "Asset class", "currency", "sensitivity_type", "load_code"] if c in df.columns]
+        m = df.melt(id_vars=ids, value_vars=cols, var_name="Pnl_Vector_Name", value_name="Value")
+        m["Pnl_Vector_Rank"] = m["Pnl_Vector_Name"].apply(
+            lambda n: int("".join(filter(str.isdigit, n.split("[T-2]")[0])))).astype("Int64")
+        m["Date"] = pd.to_datetime(m["Pnl_Vector_Name"].map(dates), errors="coerce")
+        m = m.dropna(subset=["Date"])
+        m["Sheet_Type"], m["Var_Type_Original"] = sheet_type, var_type
+        dfs.append(m)
+    out = pd.concat(dfs, ignore_index=True)
+    out["Date"] = out["Date"].dt.strftime("%Y-%m-%d")
+    out.to_sql("pnl_data", create_engine(f"sqlite:///{db_path}"), if_exists="replace", index=False)
+
+
+def query_reference(conn, sheet_type, var_type):
+    # Original get_filtered_var_data_from_db: one f-string query per asset class, merged in pandas.
+    frames = {}
+    for ac, node in ASSET_NODES.items():
+        col = f'{ac.replace(" ", "_")}_{var_type}_Value'
+        frames[ac] = pd.read_sql_query(f"""
+            SELECT Date, Pnl_Vector_Name, Pnl_Vector_Rank, SUM(Value) AS "{col}" FROM pnl_data
+            WHERE Sheet_Type = '{sheet_type}' AND "Var Type" = '{var_type}' AND "Asset class" = '{ac}' AND Node = {node}
+            GROUP BY Date, Pnl_Vector_Name, Pnl_Vector_Rank ORDER BY Date, Pnl_Vector_Rank;""", conn)
+        frames[ac]["Pnl_Vector_Rank"] = frames[ac]["Pnl_Vector_Rank"].astype("Int64")
+    macro = frames["FX"].copy()
+    for ac in ["Rates", "EM Macro"]:
+        macro = pd.merge(macro, frames[ac], on=["Date", "Pnl_Vector_Name", "Pnl_Vector_Rank"], how="outer")
+    cols = [f'{ac.replace(" ", "_")}_{var_type}_Value' for ac in ASSET_NODES]
+    macro[cols] = macro[cols].fillna(0.0)
+    macro[f"Macro_{var_type}_Value"] = macro[cols].sum(axis=1)
+    macro["Sheet_Type"] = sheet_type
+    return frames, macro.sort_values(["Date", "Pnl_Vector_Rank"]).reset_index(drop=True)
+
+
+def with_dates(df):
+    return df.assign(Date=pd.to_datetime(df["Date"]))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--xlsx", default=None, help="an existing tail workbook (default: write a synthetic one)")
+    ap.add_argument("--rows", type=int, default=300)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    tmp = tempfile.mkdtemp()
+    path = args.xlsx
+    if path is None:
+        path = os.path.join(tmp, "Tail_analysis_auto.xlsx")
+        write_synthetic(path, args.rows)
+    book = read_tail_workbook(path)
+    old_db, new_db = os.path.join(tmp, "old.db"), os.path.join(tmp, "new.db")
+
+    t0 = time.perf_counter()
+    ingest_reference(book, old_db)
+    t_old_ingest = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    conn = tail_db.connect(new_db)
+    rows = tail_db.bulk_load(conn, [tail_db.sheet_facts(book[n], *cfg) for n, cfg in SHEETS.items()])
+    conn.close()
+    t_new_ingest = time.perf_counter() - t0
+
+    old_conn = sqlite3.connect(old_db)
+    new_conn = tail_db.connect(new_db)
+    new_conn.row_factory = sqlite3.Row  # as app.get_db_connection
+    for sheet_type, var_type in QUERIES:
+        ref_frames, ref_macro = query_reference(old_conn, sheet_type, var_type)
+        frames, macro = tail_db.var_frames(new_conn, var_type, sheet_type, ASSET_NODES)
+        for ac in ASSET_NODES:
+            pd.testing.assert_frame_equal(frames[ac], with_dates(ref_frames[ac]), check_exact=False, rtol=1e-9, atol=1e-6)
+        pd.testing.assert_frame_equal(macro, with_dates(ref_macro), check_exact=False, rtol=1e-9, atol=1e-6)
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        return best
+
+    t_old_q = timed(lambda: [query_reference(old_conn, s, v) for s, v in QUERIES])
+    t_new_q = timed(lambda: [tail_db.var_frames(new_conn, v, s, ASSET_NODES) for s, v in QUERIES])
+    print(f"{os.path.basename(path)}: {rows} fact rows")
+    print(f"{'ingest':8s} melt + to_sql {t_old_ingest*1000:9.1f} ms   bulk load {t_new_ingest*1000:9.1f} ms   "
+          f"x{t_old_ingest / t_new_ingest:.1f}   ({rows / t_new_ingest:,.0f} rows/s)")
+    print(f"{'request':8s} 12 queries   {t_old_q*1000:9.1f} ms   4 GROUP BYs {t_new_q*1000:9.1f} ms   x{t_old_q / t_new_q:.1f}")
+    print(f"db size  old {os.path.getsize(old_db) / 1e6:.1f} MB   new {os.path.getsize(new_db) / 1e6:.1f} MB")
+    old_conn.close()
+    new_conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark Tail workbook loading: one open per file (tail_excel) vs two read_excel calls per sheet.
+
+    python benchmarks/bench_tail_excel.py [--xlsx path/to/Tail_analysis_auto_06_Jun_2025.xlsx]
+    python benchmarks/bench_tail_excel.py --rows 300          # writes a synthetic workbook first
+
+Checks that every sheet's frame and pnl_vector -> date map match what process_data_file used to
+build with pd.read_excel(nrows=1, header=None) + pd.read_excel(header=1).
+"""
+import os, sys, time, argparse, tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tail_flas", "Tail_flask"))
+from tail_excel import SHEETS, CalamineWorkbook, read_tail_workbook
+
+
+def read_reference(path):
+    # Original process_data_file.read_sheet: two read_excel calls per sheet.
+    out = {}
+    for sheet_name in SHEETS:
+        date_map_df = pd.read_excel(path, sheet_name=sheet_name, nrows=1, header=None)
+        raw_df = pd.read_excel(path, sheet_name=sheet_name, header=1)
+        out[sheet_name] = (raw_df, dict(zip(raw_df.columns, date_map_df.iloc[0])))
+    return out
+
+
+def write_synthetic(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    nodes = [10, 22194, 1373254]
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for sheet_name in SHEETS:
+            vectors = range(261, 522) if sheet_name.startswith("DVaR") else range(1, 261)
+            suffix = "[T-2]" if "Prev" in sheet_name else ""
+            df = pd.DataFrame(rng.uniform(-5e5, 5e5, size=(rows, len(vectors))),
+                              columns=[f"pnl_vector{v}{suffix}" for v in vectors])
+            node = rng.choice(nodes, size=rows)
+            meta = pd.DataFrame({"Var Type": sheet_name[:4], "Node": node,
+                                 "Asset class": pd.Series(node).map({10: "FX", 22194: "Rates", 1373254: "EM Macro"}),
+                                 "currency": rng.choice(["USD", "EUR", "GBP"], size=rows),
+                                 "sensitivity_type": rng.choice(["IR Delta SABR", "FX Vega"], size=rows),
+                                 "load_code": [f"LC{i}" for i in rng.integers(1000, 9999, size=rows)]})
+            dates = pd.date_range(end="2025-06-06", periods=len(vectors))[::-1].strftime("%d-%m-%Y")
+            pd.DataFrame([[np.nan] * 6 + list(dates)]).to_excel(writer, sheet_name=sheet_name, index=False, header=False)
+            pd.concat([meta, df], axis=1).to_excel(writer, sheet_name=sheet_name, index=False, startrow=1)
+
+
+def same_value(a, b):
+    return a == b or (pd.isna(a) and pd.isna(b))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--xlsx", default=None, help="an existing tail workbook (default: write a synthetic one)")
+    ap.add_argument("--rows", type=int, default=300)
+    ap.add_argument("--repeat", type=int, default=2)
+    args = ap.parse_args(argv)
+
+    path = args.xlsx
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "Tail_analysis_auto_06_Jun_2025.xlsx")
+        write_synthetic(path, args.rows)
+
+    engines = ["openpyxl"] + (["calamine"] if CalamineWorkbook is not None else [])
+    ref = read_reference(path)
+    for engine in engines:
+        book = read_tail_workbook(path, engine=engine)
+        for sheet_name, (raw_df, date_map) in ref.items():
+            pd.testing.assert_frame_equal(book[sheet_name].frame(), raw_df)
+            new_map = book[sheet_name].date_map
+            assert list(new_map) == list(date_map) and all(same_value(new_map[k], v) for k, v in date_map.items())
+
+    timings = {}
+    runs = [("read_excel x2 per sheet", lambda: read_reference(path))]
+    runs += [(f"read_tail_workbook {e}", lambda e=e: read_tail_workbook(path, engine=e)) for e in engines]
+    for name, fn in runs:
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        timings[name] = best
+    print(f"{os.path.basename(path)} ({os.path.getsize(path) / 1e6:.1f} MB, {len(SHEETS)} sheets)")
+    base = timings["read_excel x2 per sheet"]
+    for name, t in timings.items():
+        print(f"{name:28s} {t*1000:9.1f} ms   x{base / t:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark ICE tail report fetching: pooled warm sessions (tail_fetch) vs one fresh Excel per pull.
+
+    python benchmarks/bench_tail_fetch.py [--startup 3] [--latency 2] [--workers 4]
+
+Runs against tail_fetch.CannedSession, a local stand-in for Excel + the ICE add-in that sleeps
+``--startup`` seconds to open and ``--latency`` per report. Checks that both paths write the same
+latest/ and history/ CSVs, and that transient failures are retried with backoff.
+"""
+import os, sys, time, shutil, logging, argparse, tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tail_flas", "Tail_flask"))
+from tail_fetch import LAG_COB, LAG_PREV, REPORT_IDS, CannedSession, IceFetcher, report_file_name
+
+JOBS = [(v, lag) for v in ("DVaR", "SVaR") for lag in (LAG_COB, LAG_PREV)]
+
+
+def fetch_reference(factory, base_dir):
+    # Original fetch_all_via_ice: sequential, a fresh session per report, fixed 0.6 s retry sleeps.
+    paths = {}
+    for var_type, lag in JOBS:
+        latest_dir = os.path.join(base_dir, "latest")
+        hist_dir = os.path.join(base_dir, "history", "reference")
+        os.makedirs(latest_dir, exist_ok=True)
+        os.makedirs(hist_dir, exist_ok=True)
+        session = factory()
+        try:
+            for attempt in range(3):
+                try:
+                    data = session.run(REPORT_IDS[var_type], lag)
+                    break
+                except Exception:
+                    if attempt == 2:
+                        raise
+                    time.sleep(0.6)
+            headers, *rows = data
+            df = pd.DataFrame(rows, columns=headers)
+            for d in (latest_dir, hist_dir):
+                df.to_csv(os.path.join(d, report_file_name(var_type, lag)), index=False)
+            paths[(var_type, lag)] = os.path.join(latest_dir, report_file_name(var_type, lag))
+        finally:
+            session.close()
+        time.sleep(0.2)
+    return paths
+
+
+def canned_payloads(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    payloads = {}
+    for var_type, lag in JOBS:
+        vectors = range(261, 522) if var_type == "DVaR" else range(1, 261)
+        header = ["Var Type", "Node", "Asset class"] + [f"pnl_vector{v}" for v in vectors]
+        body = [[var_type, int(n), "FX"] + list(rng.normal(0, 1e5, len(vectors)))
+                for n in rng.choice([10, 22194, 1373254], size=rows)]
+        payloads[(REPORT_IDS[var_type], lag)] = [header] + body
+    return payloads
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--startup", type=float, default=3.0, help="simulated Excel + add-in start-up, seconds")
+    ap.add_argument("--latency", type=float, default=2.0, help="simulated ICE call, seconds")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--rows", type=int, default=200)
+    args = ap.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)  # the injected failures log a warning per retry
+
+    payloads = canned_payloads(args.rows)
+    tmp = tempfile.mkdtemp()
+    ref_dir, new_dir = os.path.join(tmp, "reference"), os.path.join(tmp, "pooled")
+
+    t0 = time.perf_counter()
+    fetch_reference(CannedSession.factory(payloads, latency=args.latency, startup=args.startup), ref_dir)
+    t_ref = time.perf_counter() - t0
+    factory = CannedSession.factory(payloads, latency=args.latency, startup=args.startup)
+    t0 = time.perf_counter()
+    with IceFetcher(factory, new_dir, workers=args.workers) as fetcher:
+        results = fetcher.fetch_all()
+        metrics = fetcher.metrics()
+    t_new = time.perf_counter() - t0
+    assert all(r.error is None for r in results.values())
+    hist = os.path.join(new_dir, "history", os.listdir(os.path.join(new_dir, "history"))[0])
+    for var_type, lag in JOBS:
+        name = report_file_name(var_type, lag)
+        ref = pd.read_csv(os.path.join(ref_dir, "latest", name))
+        pd.testing.assert_frame_equal(pd.read_csv(os.path.join(new_dir, "latest", name)), ref)
+        pd.testing.assert_frame_equal(pd.read_csv(os.path.join(hist, name)), ref)
+
+    # two transient failures per report: retried with backoff, no errors, one warm session per worker
+    flaky = CannedSession.factory(payloads, fail_first=2)
+    with IceFetcher(flaky, os.path.join(tmp, "flaky"), workers=2, retries=4, backoff=0.05) as fetcher:
+        retried = fetcher.fetch_all()
+    assert all(r.error is None and r.attempts >= 1 for r in retried.values())
+    assert sum(r.attempts for r in retried.values()) == len(JOBS) * 3
+
+    print(f"{len(JOBS)} reports, start-up {args.startup:.1f}s, ICE latency {args.latency:.1f}s")
+    print(f"{'sequential, fresh Excel each':32s} {t_ref:7.2f} s")
+    print(f"{f'pooled, {args.workers} warm session(s)':32s} {t_new:7.2f} s   x{t_ref / t_new:.1f}")
+    print(metrics[["var_type", "lag", "seconds", "ice_seconds", "session_seconds", "attempts", "rows"]]
+          .to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark the multi-COB tail history (tail_history) vs reopening every daily workbook.
+
+    python benchmarks/bench_tail_history.py [--cobs 12] [--rows 100] [--workers 4]
+
+Writes ``--cobs`` synthetic Tail_analysis_auto_*.xlsx files, backfills the history serially and
+in parallel, and checks one vector's per-asset series, a COB snapshot and the worst-20 rank
+history against tail_agg.asset_sums over pd.read_excel of each workbook.
+"""
+import os, sys, time, shutil, argparse, tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tail_flas", "Tail_flask"))
+from tail_agg import NODE_MAP, asset_sums, vector_numbers
+from tail_history import TailHistory, build_history
+from bench_tail_excel import write_synthetic
+
+ASSETS = list(NODE_MAP.values())
+
+
+def history_reference(paths, sheet_name):
+    # The only way to get a history today: reopen every workbook and re-aggregate its COB sheet.
+    out = {}
+    for cob, path in paths:
+        sums = asset_sums(pd.read_excel(path, sheet_name=sheet_name, header=1)).reindex(columns=ASSETS, fill_value=0.0)
+        sums.index = vector_numbers(sums.index)
+        out[cob] = sums.sort_index()
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cobs", type=int, default=12)
+    ap.add_argument("--rows", type=int, default=100)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--vector", type=int, default=300)
+    args = ap.parse_args(argv)
+
+    folder = tempfile.mkdtemp()
+    paths = []
+    for i, cob in enumerate(pd.bdate_range(end="2025-06-06", periods=args.cobs)):
+        path = os.path.join(folder, f"Tail_analysis_auto_{cob:%d_%b_%Y}.xlsx")
+        write_synthetic(path, args.rows, seed=i)
+        paths.append((cob, path))
+
+    t0 = time.perf_counter()
+    ref = history_reference(paths, "DVaR_COB")
+    t_ref = time.perf_counter() - t0
+    timings = {}
+    for workers in (1, args.workers):
+        for cache in (".tail_cache", ".tail_history"):
+            shutil.rmtree(os.path.join(folder, cache), ignore_errors=True)
+        t0 = time.perf_counter()
+        build_history(folder, workers=workers)
+        timings[f"backfill, {workers} worker(s)"] = time.perf_counter() - t0
+    assert build_history(folder) == ([], {})  # nothing changed: nothing re-read
+
+    history = TailHistory(os.path.join(folder, ".tail_history"))
+    for asset in ASSETS + ["Macro"]:
+        expect = np.array([(s.sum(axis=1) if asset == "Macro" else s[asset])[args.vector] for s in ref.values()])
+        np.testing.assert_allclose(history.series("DVaR", args.vector, asset).to_numpy(), expect, rtol=1e-12)
+    cob, last = paths[-1]
+    snap = history.snapshot("DVaR", cob)
+    np.testing.assert_allclose(snap[ASSETS].to_numpy(), ref[cob][ASSETS].to_numpy(), rtol=1e-12)
+    ref_ranks = pd.DataFrame({c: s.sum(axis=1).rank(method="first") for c, s in ref.items()}).T
+    np.testing.assert_array_equal(history.rank_history("DVaR").to_numpy(), ref_ranks.to_numpy())
+
+    t0 = time.perf_counter()
+    for _ in range(100):
+        TailHistory(history.root).series("DVaR", args.vector, "Macro", last=60)
+    t_series = (time.perf_counter() - t0) / 100
+    t0 = time.perf_counter()
+    stability = TailHistory(history.root).rank_stability("DVaR", k=20, last=60)
+    t_stab = time.perf_counter() - t0
+
+    # a corrupt workbook is reported and skipped; a good one in the same pass is still added
+    bad = os.path.join(folder, "Tail_analysis_auto_09_Jun_2025.xlsx")
+    with open(bad, "wb") as f:
+        f.write(b"not a workbook")
+    write_synthetic(os.path.join(folder, "Tail_analysis_auto_10_Jun_2025.xlsx"), args.rows, seed=99)
+    added, failed = build_history(folder, workers=args.workers)
+    assert added == ["Tail_analysis_auto_10_Jun_2025.xlsx"] and list(failed) == [os.path.basename(bad)], (added, failed)
+
+    print(f"{args.cobs} COBs x {args.rows} rows; 'Macro P&L of vector {args.vector}' / worst-20 rank stability")
+    print(f"{'reopen every workbook':28s} {t_ref*1000:9.1f} ms")
+    for name, t in timings.items():
+        print(f"{name:28s} {t*1000:9.1f} ms")
+    print(f"{'history series (cold open)':28s} {t_series*1000:9.3f} ms   x{t_ref / t_series:.0f}")
+    print(f"{'history rank stability':28s} {t_stab*1000:9.3f} ms   ({len(stability)} vectors)")
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark tail selection: argpartition top/bottom-K (tail_select) vs full sorts.
+
+    python benchmarks/bench_tail_select.py [--vectors 5000] [--k 20]
+
+Checks that tail_select.tails matches nsmallest/nlargest (keep="first" and "all") and that
+tail_table's ranks and Prev COB migration match a rank() + merge built from full sorts, and that
+report_ranks gives the COB Rank labels the Top 20 views always showed (1..k, then 260 down).
+"""
+import os, sys, time, argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tail_flas", "Tail_flask"))
+from tail_select import report_ranks, tails, tail_table
+
+ASSETS = ["EM Macro", "FX", "Rates"]
+
+
+def tail_table_reference(cob, prev, k):
+    # Full sorts both ways, whole-set ranks, then a merge against Prev COB.
+    neg = cob.sort_values("Macro", ascending=True, kind="stable").head(k)
+    pos = cob.sort_values("Macro", ascending=False, kind="stable").head(k)
+    ranks = cob[["Macro"] + ASSETS].rank(method="first").add_suffix(" Rank")
+    out = pd.concat([neg, pos]).join(ranks)
+    prev_ranks = prev.assign(**{"Prev Rank": prev["Macro"].rank(method="first"), "Prev Macro": prev["Macro"]},
+                             **{f"Prev {a}": prev[a] for a in ASSETS})
+    out = out.merge(prev_ranks[["P&L Vector No", "Prev Macro", "Prev Rank"] + [f"Prev {a}" for a in ASSETS]],
+                    on="P&L Vector No", how="left")
+    out["Rank Change"] = out["Prev Rank"] - out["Macro Rank"]
+    return out
+
+
+def synthetic_cob(vectors, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(0, 1e6, size=(vectors, 3)), columns=ASSETS)
+    df.insert(0, "P&L Vector No", np.arange(1, vectors + 1))
+    df["Macro"] = df[ASSETS].sum(axis=1)
+    return df
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vectors", type=int, default=5000)
+    ap.add_argument("--k", type=int, default=20)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    cob = synthetic_cob(args.vectors, 0)
+    prev = synthetic_cob(args.vectors, 1).sample(frac=0.95, random_state=2)  # shuffled, a few vectors missing
+    for keep in ("first", "all"):
+        neg, pos = tails(cob, "Macro", args.k, keep)
+        pd.testing.assert_frame_equal(neg, cob.nsmallest(args.k, "Macro", keep=keep))
+        pd.testing.assert_frame_equal(pos, cob.nlargest(args.k, "Macro", keep=keep))
+    new = tail_table(cob, prev, "Macro", args.k, asset_cols=ASSETS, prev_cols=ASSETS)
+    ref = tail_table_reference(cob, prev, args.k)
+    pd.testing.assert_frame_equal(new[ref.columns], ref, check_dtype=False)
+    assert report_ranks(new).tolist() == list(range(1, args.k + 1)) + list(range(260, 260 - args.k, -1))
+
+    print(f"{args.vectors} vectors, k={args.k}")
+    for name, fast, old in [
+        ("bottom/top k", lambda: tails(cob, "Macro", args.k),
+                         lambda: (cob.nsmallest(args.k, "Macro"), cob.nlargest(args.k, "Macro"))),
+        ("tail table", lambda: tail_table(cob, prev, "Macro", args.k, asset_cols=ASSETS, prev_cols=ASSETS),
+                       lambda: tail_table_reference(cob, prev, args.k)),
+    ]:
+        t_old, t_new = timed(old, args.repeat), timed(fast, args.repeat)
+        print(f"{name:13s} full sort {t_old*1000:8.2f} ms   argpartition {t_new*1000:8.2f} ms   x{t_old/t_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark Tail workbook loading from the columnar store (tail_store) vs parsing the .xlsx.
+
+    python benchmarks/bench_tail_store.py [--xlsx path/to/Tail_analysis_auto_06_Jun_2025.xlsx]
+    python benchmarks/bench_tail_store.py --rows 300          # writes a synthetic workbook first
+
+Checks that the memory-mapped sheets give the same frames, pnl_vector columns and date row as
+read_tail_workbook, for both header rows the dashboards use (1 for tail.py, 0 for updates_tail.py),
+and that replacing a workbook in its folder drops the old copy from the store on the next open.
+"""
+import os, sys, time, shutil, argparse, tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tail_flas", "Tail_flask"))
+from tail_excel import SHEETS, read_tail_workbook
+from tail_store import CACHE_DIRNAME, TailStore, open_tail_workbook, parquet_ready
+from bench_tail_excel import write_synthetic, same_value
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--xlsx", default=None, help="an existing tail workbook (default: write a synthetic one)")
+    ap.add_argument("--rows", type=int, default=300)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    tmp = tempfile.mkdtemp()
+    path = args.xlsx
+    if path is None:
+        path = os.path.join(tmp, "Tail_analysis_auto_06_Jun_2025.xlsx")
+        write_synthetic(path, args.rows)
+    store = TailStore(os.path.join(tmp, "store"))
+
+    for header_row in (1, 0):
+        ref = read_tail_workbook(path, header_row=header_row)
+        for mmap in (True, False):
+            book = store.load(path, header_row, mmap=mmap)
+            for name in SHEETS:
+                # mixed text/number id columns come back as text (the store only writes Parquet)
+                pd.testing.assert_frame_equal(book[name].frame(), parquet_ready(ref[name].frame()), check_dtype=False)
+                assert book[name].pnl_cols == ref[name].pnl_cols
+                new_map, old_map = book[name].date_map, ref[name].date_map
+                assert list(new_map) == list(old_map) and all(same_value(new_map[k], v) for k, v in old_map.items())
+        assert isinstance(store.load(path, header_row)["DVaR_COB"].pnl, np.memmap)
+
+    # the Flask app overwrites one workbook in place: the store keeps only the current one
+    live = os.path.join(tmp, "live")
+    os.makedirs(live)
+    for seed in (0, 1):
+        write_synthetic(os.path.join(live, "Tail_analysis_auto.xlsx"), 20, seed=seed)
+        open_tail_workbook(os.path.join(live, "Tail_analysis_auto.xlsx"))
+    entries = [e for e in os.listdir(os.path.join(live, CACHE_DIRNAME)) if "-h" in e]
+    assert len(entries) == 1, entries
+
+    def cold():
+        shutil.rmtree(store.root, ignore_errors=True)
+        store.load(path)
+
+    t_xlsx = timed(lambda: read_tail_workbook(path), args.repeat)
+    t_cold = timed(cold, args.repeat)
+    store.load(path)
+    t_mmap = timed(lambda: store.load(path), args.repeat)
+    t_sum = timed(lambda: [float(np.nansum(s.pnl)) for s in store.load(path).values()], args.repeat)
+    print(f"{os.path.basename(path)} ({os.path.getsize(path) / 1e6:.1f} MB, {len(SHEETS)} sheets)")
+    print(f"{'read_tail_workbook (.xlsx)':30s} {t_xlsx*1000:9.1f} ms")
+    print(f"{'first load (convert)':30s} {t_cold*1000:9.1f} ms")
+    print(f"{'cached load (mmap)':30s} {t_mmap*1000:9.1f} ms   x{t_xlsx / t_mmap:.1f}")
+    print(f"{'cached load + touch all P&L':30s} {t_sum*1000:9.1f} ms   x{t_xlsx / t_sum:.1f}")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
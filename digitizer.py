@@ -1,4 +1,5 @@
-import io, os, yaml, math
+import io, os, sys, glob, json, time, hashlib, argparse, yaml, math
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import fitz  # PyMuPDF
@@ -9,27 +10,54 @@ import pytesseract
 # If Tesseract is not on PATH (Windows), set like:
 # pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
-def render_pdf_page(pdf_path: str, page_index: int, dpi: int = 220):
-    doc = fitz.open(pdf_path)
+def _render_page(doc, page_index: int, dpi: int = 220):
     page = doc.load_page(page_index)
     mat = fitz.Matrix(dpi/72, dpi/72)
     pix = page.get_pixmap(matrix=mat, alpha=False)
     img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
     return img
 
+def _clip_rect(page, box):
+    r = page.rect
+    left, top, right, bottom = box
+    return fitz.Rect(r.x0 + left*r.width, r.y0 + top*r.height, r.x0 + right*r.width, r.y0 + bottom*r.height)
+
+def _render_clip(doc, page_index: int, box, dpi: int = 220, rows=None):
+    """Rasterize only the relative (left, top, right, bottom) box of a page.
+
+    With ``rows=(y0, y1)`` only those pixel rows of the box render, on the same pixel grid."""
+    page = doc.load_page(page_index)
+    clip = _clip_rect(page, box)
+    if rows is not None:
+        s = dpi / 72
+        top = (clip * fitz.Matrix(s, s)).irect.y0
+        # nudged inward so MuPDF's outward rounding lands on exactly these rows
+        clip = fitz.Rect(clip.x0, (top + rows[0] + 1e-3) / s, clip.x1, (top + rows[1] - 1e-3) / s)
+    pix = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72), clip=clip, alpha=False)
+    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+def render_pdf_page(pdf_path: str, page_index: int, dpi: int = 220, clip=None):
+    """Render a page, or with ``clip=(left, top, right, bottom)`` (relative) just that figure box."""
+    with fitz.open(pdf_path) as doc:
+        if clip is not None:
+            return _render_clip(doc, page_index, clip, dpi)
+        return _render_page(doc, page_index, dpi)
+
 def relative_crop(img: Image.Image, left: float, top: float, right: float, bottom: float) -> Image.Image:
     w, h = img.size
     box = (int(left*w), int(top*h), int(right*w), int(bottom*h))
     return img.crop(box), box
 
-def to_cv(img: Image.Image):
-    return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+def to_cv(img):
+    # PIL image or RGB ndarray (e.g. a PageCache crop view)
+    return cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
 
 def to_pil(arr):
     return Image.fromarray(cv2.cvtColor(arr, cv2.COLOR_BGR2RGB))
 
-def mask_hsv(img_bgr, h_min, h_max, s_min, s_max, v_min, v_max):
-    hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
+def mask_hsv(img_bgr, h_min, h_max, s_min, s_max, v_min, v_max, hsv=None):
+    if hsv is None:
+        hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
     lower = np.array([h_min, s_min, v_min], dtype=np.uint8)
     upper = np.array([h_max, s_max, v_max], dtype=np.uint8)
     m = cv2.inRange(hsv, lower, upper)
@@ -37,62 +65,88 @@ def mask_hsv(img_bgr, h_min, h_max, s_min, s_max, v_min, v_max):
 
 def detect_baseline(plot_bgr):
     # Detect the dominant horizontal axis line (near center)
+    y = _hough_baseline(plot_bgr)
+    if y is None:
+        # fallback: assume baseline is middle
+        return plot_bgr.shape[0]//2
+    return y
+
+def _hough_baseline(plot_bgr):
     gray = cv2.cvtColor(plot_bgr, cv2.COLOR_BGR2GRAY)
     edges = cv2.Canny(gray, 50, 150, apertureSize=3)
     lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=120, minLineLength=int(plot_bgr.shape[1]*0.5), maxLineGap=10)
     y_candidates = []
     if lines is not None:
-        for x1,y1,x2,y2 in lines[:,0]:
+        for x1,y1,x2,y2 in lines.reshape(-1, 4):  # (N,1,4) or (N,4) depending on OpenCV build
             if abs(y1-y2) <= 2:  # horizontal
                 y_candidates.append(y1)
     if not y_candidates:
-        # fallback: assume baseline is middle
-        return plot_bgr.shape[0]//2
+        return None
     # choose the line closest to the horizontal mid (often x-axis)
     mid = plot_bgr.shape[0]//2
     y = min(y_candidates, key=lambda yy: abs(yy-mid))
     return int(y)
 
+def snap_baseline(plot_bgr, y: int, pad: int, mid: int) -> int:
+    """Move a baseline estimate ``y`` to the row within ``pad`` rows that detect_baseline's Hough
+    search would pick: an edge row at least half the width long, the one closest to ``mid``.
+
+    Runs Canny on that band only. Returns ``y`` when no row in the band qualifies."""
+    h, w = plot_bgr.shape[:2]
+    lo, hi = max(0, y - pad), min(h, y + pad + 1)
+    top = max(0, lo - 2)  # 2 spare rows so the band edges get real gradients
+    edges = cv2.Canny(cv2.cvtColor(plot_bgr[top:min(h, hi + 2)], cv2.COLOR_BGR2GRAY), 50, 150, apertureSize=3)
+    rows = np.flatnonzero(np.count_nonzero(edges, axis=1) >= int(w*0.5)) + top
+    rows = rows[(rows >= lo) & (rows < hi)]
+    if rows.size == 0:
+        return int(y)
+    return int(rows[np.argmin(np.abs(rows - mid))])
+
+def _column_rows(mask):
+    """Set pixels grouped by column: (row indices, per-column counts, per-column start offsets).
+
+    Rows come back ascending within each column (findNonZero on the transposed mask scans
+    column-major), so the k-th set pixel of column x is ``rows[start[x] + k]``.
+    """
+    w = mask.shape[1]
+    pts = cv2.findNonZero(cv2.transpose((mask > 0).view(np.uint8)))
+    if pts is None:
+        return np.empty(0, dtype=np.int64), np.zeros(w, dtype=np.int64), np.zeros(w, dtype=np.int64)
+    pts = pts.reshape(-1, 2)  # (N,1,2) or (N,2) depending on OpenCV build
+    rows, cols = pts[:, 0].astype(np.int64), pts[:, 1]
+    counts = np.bincount(cols, minlength=w)
+    return rows, counts, np.cumsum(counts) - counts
+
 def bars_from_mask(mask, baseline_y, x_smooth=5):
     # Collapse mask vertically to find bar clusters across x
-    cols = mask.shape[1]
-    col_sum = (mask>0).sum(axis=0)
+    on = (mask > 0).view(np.uint8)
+    col_sum = cv2.reduce(on, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel()
     # Smooth to merge thin gaps
     kernel = np.ones(x_smooth, dtype=np.float32)/x_smooth
     smooth = np.convolve(col_sum, kernel, mode="same")
     thr = np.percentile(smooth, 75) * 0.3
     is_bar = smooth > thr
-    # Identify contiguous segments
-    bars = []
-    in_seg = False
-    start = 0
-    for i, val in enumerate(is_bar):
-        if val and not in_seg:
-            in_seg = True; start = i
-        elif not val and in_seg:
-            in_seg = False; bars.append((start, i-1))
-    if in_seg: bars.append((start, cols-1))
-    # For each segment, compute signed height vs baseline
-    heights = []
-    for (x1,x2) in bars:
-        seg = mask[:, x1:x2+1]
-        ys = np.where(seg>0)[0]
-        if ys.size == 0:
-            heights.append((x1,x2,0.0)); continue
-        y_top = ys.min()
-        y_bot = ys.max()
-        if y_top < baseline_y:  # positive (above baseline)
-            h_pos = baseline_y - y_top
-        else:
-            h_pos = 0
-        if y_bot > baseline_y:  # negative part
-            h_neg = y_bot - baseline_y
-        else:
-            h_neg = 0
-        # prefer net height: positive minus negative (handle both sides)
-        net = h_pos - h_neg
-        heights.append((x1,x2, float(net)))
-    return heights
+    # Contiguous segments: rising/falling edges of the padded occupancy
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], is_bar.view(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2] - 1
+    if starts.size == 0:
+        return []
+    # Per-column first/last mask row (sentinels for empty columns), reduced over each segment
+    h = mask.shape[0]
+    rows, _, start = _column_rows(on)
+    has = col_sum > 0
+    col_top = np.full(col_sum.size + 1, h, dtype=np.int64)
+    col_bot = np.full(col_sum.size + 1, -1, dtype=np.int64)
+    col_top[:-1][has] = rows[start[has]]
+    col_bot[:-1][has] = rows[start[has] + col_sum[has] - 1]
+    bounds = np.column_stack((starts, ends + 1)).ravel()
+    y_top = np.minimum.reduceat(col_top, bounds)[0::2]
+    y_bot = np.maximum.reduceat(col_bot, bounds)[0::2]
+    # Signed height vs baseline: positive part above minus negative part below
+    h_pos = np.where(y_top < baseline_y, baseline_y - y_top, 0)
+    h_neg = np.where(y_bot > baseline_y, y_bot - baseline_y, 0)
+    net = np.where(y_top < h, h_pos - h_neg, 0).astype(float)
+    return list(zip(starts.tolist(), ends.tolist(), net.tolist()))
 
 def scale_heights_to_values(heights, px_per_unit):
     # px_per_unit: pixels per 1 unit (e.g., $1bn)
@@ -102,10 +156,12 @@ def scale_heights_to_values(heights, px_per_unit):
     return values
 
 def estimate_px_per_unit(plot_bgr, y_min, y_max, baseline_y):
+    return px_per_unit_for_height(plot_bgr.shape[0], y_min, y_max, baseline_y)
+
+def px_per_unit_for_height(h, y_min, y_max, baseline_y):
     # Derive px_per_unit from total pixel span between min and max reference.
     # Here we approximate: positive span = distance from baseline to top edge; negative to bottom edge.
     # If both positive and negative ranges exist, choose the larger absolute span.
-    h = plot_bgr.shape[0]
     pos_span_px = baseline_y - 0
     neg_span_px = h - baseline_y
     pos_units = max(0.0001, y_max if y_max>0 else 0.0001)
@@ -118,53 +174,386 @@ def estimate_px_per_unit(plot_bgr, y_min, y_max, baseline_y):
         return (px_per_unit_pos + px_per_unit_neg) / 2.0
     return px_per_unit_pos
 
-def extract_bars_series(plot_img: Image.Image, hsv_thresh: dict, y_min: float, y_max: float):
+def extract_bars_series(plot_img: Image.Image, hsv_thresh: dict, y_min: float, y_max: float, hsv=None, baseline_y=None,
+                        px_per_unit=None):
     bgr = to_cv(plot_img)
-    base_y = detect_baseline(bgr)
-    mask = mask_hsv(bgr, **hsv_thresh)
+    base_y = detect_baseline(bgr) if baseline_y is None else int(baseline_y)
+    mask = mask_hsv(bgr, **hsv_thresh, hsv=hsv)
     # Morph to fill gaps
     mask = cv2.medianBlur(mask, 5)
     heights = bars_from_mask(mask, base_y)
-    px_per_unit = estimate_px_per_unit(bgr, y_min, y_max, base_y)
+    if px_per_unit is None:
+        px_per_unit = estimate_px_per_unit(bgr, y_min, y_max, base_y)
     data = scale_heights_to_values(heights, px_per_unit)
     # sort by x
     data = sorted(data, key=lambda t: t[0])
     values = [v for _, v in data]
     return values, base_y, mask
 
-def extract_line_series(plot_img: Image.Image, hsv_thresh: dict, y_min: float, y_max: float):
+def extract_line_series(plot_img: Image.Image, hsv_thresh: dict, y_min: float, y_max: float, hsv=None, baseline_y=None,
+                        px_per_unit=None):
     # For line charts: for each x find the y with strongest mask presence
     bgr = to_cv(plot_img)
     h,w = bgr.shape[:2]
-    mask = mask_hsv(bgr, **hsv_thresh)
+    mask = mask_hsv(bgr, **hsv_thresh, hsv=hsv)
     # thin to single-pixel-ish
     kernel = np.ones((3,3), np.uint8)
     mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-    ys = []
-    for x in range(w):
-        col = np.where(mask[:,x]>0)[0]
-        if col.size==0:
-            ys.append(np.nan)
-        else:
-            ys.append(float(np.median(col)))
-    ys = np.array(ys)
+    # Median mask row per column: mean of the two middle set rows (what np.median gives)
+    rows, counts, start = _column_rows(mask)
+    has = counts > 0
+    lo = rows[start[has] + (counts[has] - 1) // 2]
+    hi = rows[start[has] + counts[has] // 2]
+    ys = np.full(w, np.nan)
+    ys[has] = (lo + hi) / 2.0
     # infer baseline as center if unknown
-    baseline_y = detect_baseline(bgr)
-    px_per_unit = estimate_px_per_unit(bgr, y_min, y_max, baseline_y)
-    # convert y pixel to value: y above baseline positive, below negative
-    vals = []
-    for y in ys:
-        if np.isnan(y):
-            vals.append(np.nan)
-        else:
-            diff = baseline_y - y
-            vals.append(diff/px_per_unit)
+    if baseline_y is None:
+        baseline_y = detect_baseline(bgr)
+    if px_per_unit is None:
+        px_per_unit = estimate_px_per_unit(bgr, y_min, y_max, baseline_y)
+    # convert y pixel to value: y above baseline positive, below negative (NaN stays NaN)
+    vals = ((baseline_y - ys) / px_per_unit).tolist()
     return vals, baseline_y, mask
 
+# ==================== AXIS OCR CALIBRATION ====================
+# Reads the y tick labels once per (template, PDF) and caches the pixel<->value fit.
+
+TICK_OCR_CONFIG = "--psm 11 -c tessedit_char_whitelist=0123456789-.,()"
+
+def _tick_strip(plot_img, side: str = "left", strip_frac: float = 0.12):
+    """The band of the crop where y tick labels sit; returns (strip image, x offset)."""
+    w, h = plot_img.size
+    sw = max(1, int(w * strip_frac))
+    x0 = 0 if side == "left" else w - sw
+    return plot_img.crop((x0, 0, x0 + sw, h)), x0
+
+def ocr_ticks(strip_img):
+    """(y pixel centre, value) for every numeric token tesseract finds in the strip."""
+    from utils import coerce_numeric
+    data = pytesseract.image_to_data(strip_img.convert("L"), config=TICK_OCR_CONFIG,
+                                     output_type=pytesseract.Output.DICT)
+    ticks = []
+    for text, top, height, conf in zip(data["text"], data["top"], data["height"], data["conf"]):
+        if not str(text).strip() or float(conf) < 0:
+            continue
+        value = coerce_numeric(text, r"[^0-9+\-.,]")
+        if not np.isnan(value):
+            ticks.append((top + height / 2.0, value))
+    return ticks
+
+def fit_axis(ticks, min_ticks: int = 3, max_resid_px: float = 4.0):
+    """Least-squares value = a + b * y over the tick labels.
+
+    Returns ``{"baseline_y", "px_per_unit", "y_min", "y_max", "n_ticks", "resid_px"}`` in crop
+    pixels, or None when there are too few distinct ticks or they don't line up.
+    """
+    if len({v for _, v in ticks}) < min_ticks:
+        return None
+    ys = np.array([y for y, _ in ticks], dtype=float)
+    vals = np.array([v for _, v in ticks], dtype=float)
+    b, a = np.polyfit(ys, vals, 1)
+    if b >= 0:  # values must grow upwards
+        return None
+    resid_px = float(np.max(np.abs(vals - (a + b * ys))) / abs(b))
+    if resid_px > max_resid_px:
+        return None
+    return {"baseline_y": float(-a / b), "px_per_unit": float(-1.0 / b), "y_min": float(vals.min()),
+            "y_max": float(vals.max()), "n_ticks": int(len(ticks)), "resid_px": round(resid_px, 2)}
+
+class AxisCalibrator:
+    """JSON-backed cache of OCR axis fits keyed by (figure template, pdf sha256, crop px box, dpi).
+
+    A miss runs tesseract on the tick-label strip once; the fit (or the fact that none was
+    found) is stored so later runs over the same PDF never OCR again. ``stats()`` reports OCR
+    time against cache hits. ``new_entries`` holds what this instance added, so pool workers
+    can hand them back to the parent to merge.
+    """
+
+    def __init__(self, path: str = "data/cache/axis_calibration.json", side: str = "left", strip_frac: float = 0.12,
+                 min_ticks: int = 3):
+        self.path = path
+        self.side, self.strip_frac, self.min_ticks = side, strip_frac, min_ticks
+        self.entries = {}
+        self.new_entries = {}
+        self.hits = self.misses = 0
+        self.ocr_seconds = 0.0
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(figure: str, template: dict, pdf_sha: str, size, dpi: int) -> str:
+        spec = json.dumps({"page": template.get("page"), "box": list(template.get("box", ()))}, sort_keys=True)
+        tpl = hashlib.sha1(spec.encode("utf-8")).hexdigest()[:10]
+        return f"{figure}|{tpl}|{pdf_sha}|{size[0]}x{size[1]}|{int(dpi)}"
+
+    def calibrate(self, figure: str, template: dict, pdf_sha: str, plot_img, dpi: int):
+        key = self.key(figure, template, pdf_sha, plot_img.size, dpi)
+        if key in self.entries:
+            self.hits += 1
+            return self.entries[key].get("fit")
+        self.misses += 1
+        strip, _ = _tick_strip(plot_img, self.side, self.strip_frac)
+        t0 = time.perf_counter()
+        try:
+            ticks = ocr_ticks(strip)
+        except pytesseract.TesseractNotFoundError:
+            return None  # environment problem, not a property of this PDF: don't cache
+        finally:
+            self.ocr_seconds += time.perf_counter() - t0
+        entry = {"fit": fit_axis(ticks, self.min_ticks), "ticks": [[round(y, 1), v] for y, v in ticks]}
+        self.entries[key] = self.new_entries[key] = entry
+        return entry["fit"]
+
+    def merge(self, entries: dict):
+        self.entries.update(entries)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(self.path + ".tmp", self.path)
+
+    def stats(self) -> dict:
+        return {"cached": len(self.entries), "hits": self.hits, "ocr_runs": self.misses,
+                "ocr_seconds": round(self.ocr_seconds, 3)}
+
 def save_template(path:str, template:dict):
     with open(path, "w") as f:
         yaml.safe_dump(template, f)
 
 def load_template(path:str) -> dict:
     with open(path, "r") as f:
-        return yaml.safe_load(f)
\ No newline at end of file
+        return yaml.safe_load(f)
+
+# ==================== BATCH (HEADLESS) MODE ====================
+# Applies every saved FIGURE template to a folder of PDFs without the UI.
+
+DEFAULT_FIGURE_TEMPLATE = {"mode": "bars", "series": {"bond_green": "bond_green", "equity_blue": "equity_blue"}}
+TIDY_COLUMNS = ["as_of_date", "source_pdf", "figure", "series", "week_index", "value"]
+
+def figure_templates(cfg: dict, figures=None) -> dict:
+    """Resolve config.yml ``digitizer`` settings into one ready-to-run template per figure.
+
+    ``figures.<FIGURE n>.series`` maps a series name to either an ``hsv_thresholds`` preset
+    name or an explicit threshold dict (what "Save as Template" writes).
+    """
+    dcfg = cfg.get("digitizer", {})
+    presets = dcfg.get("hsv_thresholds", {})
+    default = dcfg.get("default_figure", DEFAULT_FIGURE_TEMPLATE)
+    out = {}
+    for fig, crop in dcfg.get("crops", {}).items():
+        if figures and fig not in figures:
+            continue
+        yr = dcfg.get("y_ranges", {}).get(fig, {"y_min": -10.0, "y_max": 46.0})
+        spec = dcfg.get("figures", {}).get(fig, default)
+        series = {}
+        for name, th in (spec.get("series") or default["series"]).items():
+            th = presets.get(th) if isinstance(th, str) else th
+            if th:
+                series[name] = {k: int(th[k]) for k in ("h_min","h_max","s_min","s_max","v_min","v_max")}
+        out[fig] = {
+            "page": int(crop.get("page", 0)),
+            "box": (float(crop["left"]), float(crop["top"]), float(crop["right"]), float(crop["bottom"])),
+            "y_min": float(yr["y_min"]), "y_max": float(yr["y_max"]),
+            "mode": spec.get("mode", default.get("mode", "bars")),
+            "series": series,
+        }
+    return out
+
+def _tidy(fig, name, vals):
+    return pd.DataFrame({"figure": fig, "series": name,
+                         "week_index": np.arange(len(vals)), "value": np.asarray(vals, dtype=float)})
+
+def _coarse_pass(doc, page_index: int, t: dict, dpi: int, coarse_dpi: int):
+    """Look at a figure box at ``coarse_dpi`` before rendering it at ``dpi``.
+
+    Returns the series with any pixels in their colour band, the (first, end) rows of the box
+    at ``dpi`` that hold those pixels and the baseline, the full box height at ``dpi`` and the
+    baseline row there. Rows and baseline are None when the coarse Hough search finds no line.
+    """
+    coarse = to_cv(_render_clip(doc, page_index, t["box"], coarse_dpi))
+    hsv = cv2.cvtColor(coarse, cv2.COLOR_BGR2HSV)
+    hit = np.zeros(coarse.shape[0], dtype=bool)
+    series = {}
+    for name, th in t["series"].items():
+        on = cv2.reduce(mask_hsv(coarse, **th, hsv=hsv), 1, cv2.REDUCE_MAX).ravel() > 0
+        if on.any():
+            series[name] = th
+            hit |= on
+    clip = _clip_rect(doc.load_page(page_index), t["box"])
+    fine = (clip * fitz.Matrix(dpi/72, dpi/72)).irect
+    rough = (clip * fitz.Matrix(coarse_dpi/72, coarse_dpi/72)).irect
+    base = _hough_baseline(coarse)
+    if not series or base is None:
+        return series, None, fine.height, None
+    scale = dpi / coarse_dpi
+    def to_fine(row):  # coarse row edge -> fine row edge, each relative to its own render of the box
+        return (rough.y0 + row) * scale - fine.y0
+    baseline_y = int(round(to_fine(base + 0.5) - 0.5))
+    on = np.flatnonzero(hit)
+    pad = int(math.ceil(scale)) + 2  # colour pixels and snap band: two coarse rows of slack, plus rounding
+    y0 = max(0, int(math.floor(min(to_fine(on[0] - 2), baseline_y - 2 * pad))))
+    y1 = min(fine.height, int(math.ceil(max(to_fine(on[-1] + 3), baseline_y + 2 * pad + 1))))
+    return series, (y0, y1), fine.height, baseline_y
+
+def digitize_pdf(pdf_path: str, templates: dict, dpi: int = 220, clip: bool = True, coarse_dpi: int = 0,
+                 calibrator: "AxisCalibrator" = None, pdf_sha: str = None) -> pd.DataFrame:
+    """Run every template over one PDF.
+
+    ``clip`` rasterizes only each figure's box instead of the whole page. With ``coarse_dpi``
+    set, each box is first rendered at that resolution. Series with no pixels in their colour
+    band are skipped. The baseline is taken from the coarse Hough search and snapped at ``dpi``
+    with a few-row edge scan, not a second Hough pass. Only the rows that hold the series and
+    the baseline are rendered at ``dpi``; the scale still uses the full box height.
+    With a ``calibrator`` the zero line and scale come from the OCR'd tick labels when a fit
+    is found, instead of the Hough baseline and the template's y range.
+    """
+    if calibrator is not None and pdf_sha is None:
+        from parse_cache import file_sha256
+        pdf_sha = file_sha256(pdf_path)
+    rows = []
+    by_page = {}
+    for fig, t in templates.items():
+        by_page.setdefault(t["page"], []).append(fig)
+    with fitz.open(pdf_path) as doc:
+        for page_index in sorted(by_page):
+            if page_index >= doc.page_count:
+                continue
+            img = None if clip else _render_page(doc, page_index, dpi)
+            for fig in by_page[page_index]:
+                t = templates[fig]
+                extract = extract_bars_series if t["mode"] == "bars" else extract_line_series
+                series, band = t["series"], None
+                if clip and coarse_dpi:
+                    series, band, height, coarse_y = _coarse_pass(doc, page_index, t, dpi, coarse_dpi)
+                    if not series:
+                        continue
+                    if calibrator is not None:
+                        band = None  # the OCR reads tick labels over the whole box height
+                if clip:
+                    plot_img = _render_clip(doc, page_index, t["box"], dpi, rows=band)
+                else:
+                    plot_img, _ = relative_crop(img, *t["box"])
+                bgr = to_cv(plot_img)
+                fit = calibrator.calibrate(fig, t, pdf_sha, plot_img, dpi) if calibrator is not None else None
+                baseline_y, px_per_unit = None, None
+                if fit is not None:
+                    baseline_y, px_per_unit = int(round(fit["baseline_y"])), fit["px_per_unit"]
+                elif band is not None:
+                    y0 = band[0]
+                    pad = int(math.ceil(dpi / coarse_dpi)) + 2
+                    baseline_y = snap_baseline(bgr, coarse_y - y0, pad, height // 2 - y0)
+                    px_per_unit = px_per_unit_for_height(height, t["y_min"], t["y_max"], baseline_y + y0)
+                plot_hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+                for name, th in series.items():
+                    vals, _, _ = extract(plot_img, th, t["y_min"], t["y_max"], hsv=plot_hsv, baseline_y=baseline_y,
+                                         px_per_unit=px_per_unit)
+                    rows.append(_tidy(fig, name, vals))
+    if not rows:
+        return pd.DataFrame(columns=TIDY_COLUMNS)
+    return pd.concat(rows, ignore_index=True)
+
+def _pdf_as_of(config_path: str, pdf_path: str) -> str:
+    # Same date the ingest path assigns; reuse the parse cache when this PDF was ingested already.
+    from parser import EMFlowsParser
+    from parse_cache import ParseCache, file_sha256
+    parser = EMFlowsParser(config_path)
+    if os.path.isdir("data/cache/parsed"):
+        hit = ParseCache(parser.cfg).get(file_sha256(pdf_path))
+        if hit is not None and hit[0]:
+            return hit[0]
+    return parser.parse_as_of(pdf_path)
+
+def axis_calibrator(cfg: dict):
+    """AxisCalibrator from ``digitizer.axis_ocr`` in config.yml, or None when disabled."""
+    ocfg = cfg.get("digitizer", {}).get("axis_ocr", {}) or {}
+    if not ocfg.get("enabled"):
+        return None
+    return AxisCalibrator(ocfg.get("cache", "data/cache/axis_calibration.json"), side=ocfg.get("side", "left"),
+                          strip_frac=float(ocfg.get("strip_frac", 0.12)), min_ticks=int(ocfg.get("min_ticks", 3)))
+
+def _digitize_task(config_path: str, pdf_path: str, figures=None):
+    """Pool task: tidy frame for one PDF, seconds spent, and the OCR calibrations it added."""
+    t0 = time.perf_counter()
+    with open(config_path, "r") as f:
+        cfg = yaml.safe_load(f)
+    dcfg = cfg.get("digitizer", {})
+    rcfg = dcfg.get("render", {})
+    calibrator = axis_calibrator(cfg)
+    df = digitize_pdf(pdf_path, figure_templates(cfg, figures), int(dcfg.get("dpi", 220)),
+                      clip=bool(rcfg.get("clip", True)), coarse_dpi=int(rcfg.get("coarse_dpi", 0) or 0),
+                      calibrator=calibrator)
+    df["as_of_date"] = _pdf_as_of(config_path, pdf_path)
+    df["source_pdf"] = os.path.basename(pdf_path)
+    calib = (calibrator.new_entries, calibrator.stats()) if calibrator is not None else ({}, {})
+    return df[TIDY_COLUMNS], time.perf_counter() - t0, calib
+
+def digitize_folder(folder: str, config_path: str = "config.yml", out_dir: str = "data/digitized/batch",
+                    workers: int = None, figures=None):
+    """Digitize every PDF in ``folder`` on a process pool and write one tidy Parquet per figure.
+
+    Returns ``(paths, report)``: figure -> written file, and one dict per PDF with
+    ``source_pdf``, ``as_of_date``, ``rows``, ``seconds``, ``error`` and, with axis OCR on,
+    ``ocr_runs``, ``ocr_seconds`` and ``calib_hits``.
+    """
+    pdfs = sorted(glob.glob(os.path.join(folder, "*.pdf"))) if os.path.isdir(folder) else [folder]
+    config_path = os.path.abspath(config_path)
+    workers = int(workers or os.cpu_count() or 1)
+    with open(config_path, "r") as f:
+        calibrator = axis_calibrator(yaml.safe_load(f))
+    report, frames = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_digitize_task, config_path, p, figures) for p in pdfs]
+        for p, fut in zip(pdfs, futures):
+            entry = {"source_pdf": os.path.basename(p), "as_of_date": None, "rows": 0, "seconds": 0.0, "error": None}
+            try:
+                df, sec, (calib_entries, calib_stats) = fut.result()
+                entry.update(as_of_date=df["as_of_date"].iloc[0] if len(df) else None, rows=len(df), seconds=round(sec, 3))
+                if calib_stats:
+                    entry.update(ocr_runs=calib_stats["ocr_runs"], ocr_seconds=calib_stats["ocr_seconds"],
+                                 calib_hits=calib_stats["hits"])
+                    calibrator.merge(calib_entries)
+                frames.append(df)
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+            report.append(entry)
+    # workers only read the calibration cache; the parent is the single writer
+    if calibrator is not None and any(r.get("ocr_runs") for r in report):
+        calibrator.save()
+
+    paths = {}
+    if frames:
+        os.makedirs(out_dir, exist_ok=True)
+        tidy = pd.concat(frames, ignore_index=True)
+        for fig, part in tidy.groupby("figure", sort=True):
+            part = part.sort_values(["as_of_date", "source_pdf", "series", "week_index"], kind="stable")
+            path = os.path.join(out_dir, f"{fig.replace(' ', '_')}.parquet")
+            part.to_parquet(path, index=False)
+            paths[fig] = path
+    return paths, report
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Apply the saved FIGURE templates to a folder of EM Flows PDFs.")
+    ap.add_argument("folder", help="folder of PDFs (or a single PDF)")
+    ap.add_argument("--config", default="config.yml")
+    ap.add_argument("--out", default="data/digitized/batch")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--figure", action="append", dest="figures", help="limit to a figure, e.g. 'FIGURE 2' (repeatable)")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    paths, report = digitize_folder(args.folder, args.config, args.out, args.workers, args.figures)
+    for r in report:
+        status = f"ERROR {r['error']}" if r["error"] else f"{r['rows']} points"
+        print(f"{r['source_pdf']}: as_of={r['as_of_date']} {r['seconds']:.2f}s {status}")
+    for fig, path in paths.items():
+        print(f"{fig} -> {path}")
+    if any("ocr_runs" in r for r in report):
+        print(f"Axis OCR: {sum(r.get('ocr_runs', 0) for r in report)} runs in "
+              f"{sum(r.get('ocr_seconds', 0.0) for r in report):.2f}s, {sum(r.get('calib_hits', 0) for r in report)} cached")
+    print(f"Digitized {len(report)} PDFs in {time.perf_counter() - t0:.2f}s")
+    return 1 if any(r["error"] for r in report) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""Timed, on-demand imports for the Streamlit app.
+
+``lazy_import("digitizer")`` imports a module the first time a tab needs it and records how
+long that took and how many modules it pulled in, so cold-start cost stays visible as the
+app grows. Streamlit reruns the script but keeps ``sys.modules``, so each module is timed
+once per server process.
+"""
+import sys, time, importlib
+from typing import Dict, List
+
+_PROFILE: Dict[str, dict] = {}
+
+def lazy_import(name:str, reason:str=""):
+    """``importlib.import_module`` that records the first (cold) import of ``name``."""
+    if name in sys.modules:
+        return sys.modules[name]
+    before = len(sys.modules)
+    t0 = time.perf_counter()
+    module = importlib.import_module(name)
+    _PROFILE[name] = {"module": name, "ms": round((time.perf_counter() - t0) * 1000, 1),
+                      "new_modules": len(sys.modules) - before, "needed_by": reason,
+                      "loaded_at": time.strftime("%H:%M:%S")}
+    return module
+
+def import_report() -> List[dict]:
+    """One row per lazily imported module, slowest first."""
+    return sorted(_PROFILE.values(), key=lambda r: -r["ms"])
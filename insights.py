@@ -1,3 +1,4 @@
+import os
 import pandas as pd
 import numpy as np
 
@@ -10,40 +11,65 @@ def prep_timeseries(df: pd.DataFrame) -> pd.DataFrame:
     df["is_wow_like"] = df["measure"].isin(wow_alias) | df["measure"].str.contains("WOW|FLOW|USD")
     return df
 
+# (column, window, min_periods) for the rolling sums; z-score uses its own window below.
+ROLL_WINDOWS = (("roll_4w", 4, 2), ("roll_12w", 12, 3), ("roll_52w", 52, 8))
+Z_WINDOW, Z_MIN_PERIODS = 52, 8
+
+def _run_position(starts: np.ndarray) -> np.ndarray:
+    """1-based position of each element inside its run; ``starts[i]`` is True where a run begins."""
+    idx = np.arange(len(starts))
+    return idx - np.maximum.accumulate(np.where(starts, idx, 0)) + 1
+
+def _rolling_sum(csum: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Trailing sums of the last ``n[i]`` values from a zero-prefixed cumulative sum."""
+    idx = np.arange(len(n))
+    return csum[idx + 1] - csum[idx + 1 - n]
+
 def compute_rolls(df: pd.DataFrame, keys=("level","region","country","asset_class")) -> pd.DataFrame:
     d = df.copy()
     d = d[d["is_wow_like"]]
     d = d.groupby(list(keys) + ["as_of_date"], dropna=False)["value"].sum().reset_index(name="flow_wow_usd_mn")
 
-    d = d.sort_values("as_of_date")
-    d["roll_4w"]  = d.groupby(list(keys), dropna=False)["flow_wow_usd_mn"].transform(lambda s: s.rolling(4, min_periods=2).sum())
-    d["roll_12w"] = d.groupby(list(keys), dropna=False)["flow_wow_usd_mn"].transform(lambda s: s.rolling(12, min_periods=3).sum())
-    d["roll_52w"] = d.groupby(list(keys), dropna=False)["flow_wow_usd_mn"].transform(lambda s: s.rolling(52, min_periods=8).sum())
-
-    def rolling_z(s, w=52):
-        mu = s.rolling(w, min_periods=8).mean()
-        sd = s.rolling(w, min_periods=8).std(ddof=0)
-        return (s - mu) / sd.replace(0, np.nan)
-    d["z_52w"] = d.groupby(list(keys), dropna=False)["flow_wow_usd_mn"].transform(rolling_z)
-
-    def streak(arr):
-        out = []
-        cur = 0
-        last_sign = 0
-        for v in arr:
-            sign = 1 if v>0 else (-1 if v<0 else 0)
-            if sign == 0:
-                cur = 0
-            elif sign == last_sign:
-                cur += 1
-            else:
-                cur = 1
-            last_sign = sign
-            out.append(cur*sign)
-        return out
-
-    d["streak"] = d.groupby(list(keys), dropna=False)["flow_wow_usd_mn"].transform(lambda s: streak(s.values))
-    return d
+    # The grouped frame is sorted by keys then date, so every series is one contiguous,
+    # date-ordered block: all windows, the z-score and streaks come from one pass over it.
+    x = d["flow_wow_usd_mn"].to_numpy(dtype=float)
+    if len(x):
+        gid = d.groupby(list(keys), dropna=False, sort=False).ngroup().to_numpy()
+        new_series = np.r_[True, gid[1:] != gid[:-1]]
+        obs = _run_position(new_series)
+
+        # center each series on its mean so the cumulative sums stay small
+        gmean = np.bincount(gid, weights=x) / np.bincount(gid)
+        xc = x - gmean[gid]
+        csum = np.r_[0.0, np.cumsum(xc)]
+        csum2 = np.r_[0.0, np.cumsum(xc * xc)]
+
+        for col, w, min_periods in ROLL_WINDOWS:
+            n = np.minimum(obs, w)
+            d[col] = np.where(n >= min_periods, _rolling_sum(csum, n) + n * gmean[gid], np.nan)
+
+        n = np.minimum(obs, Z_WINDOW)
+        mu_c = _rolling_sum(csum, n) / n
+        var = np.maximum(_rolling_sum(csum2, n) / n - mu_c * mu_c, 0.0)
+        # windows made of one repeated value have zero spread exactly (as pandas reports)
+        same_run = _run_position(new_series | np.r_[True, x[1:] != x[:-1]])
+        var[same_run >= n] = 0.0
+        sd = np.sqrt(var)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(sd > 0, (xc - mu_c) / sd, np.nan)
+        d["z_52w"] = np.where(n >= Z_MIN_PERIODS, z, np.nan)
+
+        # signed streak: length of the current run of same-signed weeks, 0 on a flat week
+        sign = np.where(x > 0, 1, np.where(x < 0, -1, 0))
+        run = _run_position(new_series | np.r_[True, sign[1:] != sign[:-1]])
+        d["streak"] = (run * sign).astype(np.int64)
+    else:
+        for col, _, _ in ROLL_WINDOWS:
+            d[col] = np.nan
+        d["z_52w"] = np.nan
+        d["streak"] = pd.Series(dtype=np.int64)
+
+    return d.sort_values("as_of_date")
 
 def divergence_equity_vs_bond(ts: pd.DataFrame) -> pd.DataFrame:
     e = ts[ts["asset_class"].str.contains("Equity", case=False, na=False)]
@@ -92,4 +118,203 @@ def generate_alerts(ts: pd.DataFrame, top_n=10):
             "where": f'{r["country"] or r["level"]} / {r["asset_class"]}',
             "detail": f'{abs(int(r["streak"]))} weeks of {direction}; last WoW={r["flow_wow_usd_mn"]:.0f} USD mn'
         })
-    return alerts
\ No newline at end of file
+    return alerts
+
+# ==================== INCREMENTAL ROLLING STATE ====================
+# One row per series holding its last Z_WINDOW weekly values plus the latest rolls, z and
+# streak. Ingesting a new week updates only the series that reported, in O(series).
+
+SERIES_KEYS = ("level","region","country","asset_class")
+LATEST_COLUMNS = list(SERIES_KEYS) + ["as_of_date","flow_wow_usd_mn","roll_4w","roll_12w","roll_52w","z_52w","streak"]
+
+def _series_id(df: pd.DataFrame, keys=SERIES_KEYS) -> pd.Series:
+    parts = [df[k].astype(object).where(df[k].notna(), "\x00").astype(str) for k in keys]
+    sid = parts[0]
+    for p in parts[1:]:
+        sid = sid + "\x1f" + p
+    return sid
+
+def _window_stats(win: np.ndarray, n_obs: np.ndarray, last: np.ndarray) -> dict:
+    """Rolls, z and window moments for right-aligned, NaN-padded windows (rows x Z_WINDOW)."""
+    out = {}
+    for col, w, min_periods in ROLL_WINDOWS:
+        out[col] = np.where(np.minimum(n_obs, w) >= min_periods, np.nansum(win[:, -w:], axis=1), np.nan)
+    n = np.minimum(n_obs, Z_WINDOW).astype(float)
+    s1 = np.nansum(win, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mu = s1 / n
+        var = np.nansum((win - mu[:, None]) ** 2, axis=1) / n
+        var[np.nanmax(win, axis=1) == np.nanmin(win, axis=1)] = 0.0
+        sd = np.sqrt(var)
+        z = np.where(sd > 0, (last - mu) / sd, np.nan)
+    out["z_52w"] = np.where(n >= Z_MIN_PERIODS, z, np.nan)
+    out["sum_52w"] = s1
+    out["sumsq_52w"] = np.nansum(win * win, axis=1)
+    return out
+
+def build_rolling_state(base: pd.DataFrame) -> pd.DataFrame:
+    """Full rebuild of the per-series state from prep_timeseries() output."""
+    ts = compute_rolls(base, keys=SERIES_KEYS).sort_values(list(SERIES_KEYS) + ["as_of_date"], kind="stable")
+    if ts.empty:
+        state = pd.DataFrame(columns=LATEST_COLUMNS + ["n_obs","sum_52w","sumsq_52w","window"])
+        state.attrs["watermark"] = None
+        return state
+    grouped = ts.groupby(list(SERIES_KEYS), dropna=False, sort=False)
+    state = grouped.tail(1)[LATEST_COLUMNS].reset_index(drop=True)
+    state["n_obs"] = grouped.size().to_numpy()
+    tails = grouped.tail(Z_WINDOW).groupby(list(SERIES_KEYS), dropna=False, sort=False)["flow_wow_usd_mn"]
+    win = np.full((len(state), Z_WINDOW), np.nan)
+    for r, vals in enumerate(tails.apply(np.asarray)):
+        win[r, Z_WINDOW - len(vals):] = vals
+    state["sum_52w"] = np.nansum(win, axis=1)
+    state["sumsq_52w"] = np.nansum(win * win, axis=1)
+    state["window"] = list(win)
+    state.attrs["watermark"] = ts["as_of_date"].max()
+    return state
+
+def update_rolling_state(state: pd.DataFrame, base_week: pd.DataFrame) -> pd.DataFrame:
+    """Apply one new as_of_date (prep_timeseries() rows for that week) to the state.
+
+    Only series present in ``base_week`` move; the week must be newer than the state's
+    watermark, otherwise the caller should rebuild (see refresh_rolling_state).
+    """
+    d = base_week[base_week["is_wow_like"]]
+    if d.empty:
+        return state
+    week = d["as_of_date"].max()
+    if d["as_of_date"].nunique() != 1:
+        raise ValueError("update_rolling_state expects exactly one as_of_date")
+    if state.attrs.get("watermark") is not None and week <= state.attrs["watermark"]:
+        raise ValueError(f"week {week} is not newer than state watermark {state.attrs['watermark']}")
+    new = d.groupby(list(SERIES_KEYS), dropna=False)["value"].sum().reset_index(name="flow_wow_usd_mn")
+
+    state = state.reset_index(drop=True)
+    sid_state = pd.Index(_series_id(state)) if len(state) else pd.Index([], dtype=object)
+    sid_new = _series_id(new)
+    pos = sid_state.get_indexer(sid_new)
+    fresh = new[pos < 0]
+    if len(fresh):
+        add = fresh[list(SERIES_KEYS)].copy()
+        add["n_obs"] = 0
+        add["streak"] = 0
+        add["window"] = [np.full(Z_WINDOW, np.nan) for _ in range(len(add))]
+        state = pd.concat([state, add], ignore_index=True)
+        pos = pd.Index(_series_id(state)).get_indexer(sid_new)
+
+    win = np.vstack(state["window"].to_numpy()) if len(state) else np.empty((0, Z_WINDOW))
+    vals = new["flow_wow_usd_mn"].to_numpy(dtype=float)
+    win[pos, :-1] = win[pos, 1:]
+    win[pos, -1] = vals
+    n_obs = state["n_obs"].to_numpy(dtype=np.int64).copy()
+    n_obs[pos] += 1
+
+    stats = _window_stats(win[pos], n_obs[pos], vals)
+    prev = state["streak"].to_numpy(dtype=np.int64)[pos]
+    sign = np.where(vals > 0, 1, np.where(vals < 0, -1, 0))
+    streak = np.where(sign == 0, 0, np.where(np.sign(prev) == sign, prev + sign, sign))
+
+    state["window"] = list(win)
+    state["n_obs"] = n_obs
+    state.loc[pos, "as_of_date"] = week
+    state.loc[pos, "flow_wow_usd_mn"] = vals
+    state.loc[pos, "streak"] = streak
+    for col, arr in stats.items():
+        state.loc[pos, col] = arr
+    state["as_of_date"] = pd.to_datetime(state["as_of_date"])
+    state["streak"] = state["streak"].astype(np.int64)
+    state.attrs["watermark"] = week
+    return state
+
+def latest_from_state(state: pd.DataFrame) -> pd.DataFrame:
+    """compute_rolls()-shaped frame with each series' latest row; feeds generate_alerts directly."""
+    return state[LATEST_COLUMNS].sort_values("as_of_date", kind="stable").reset_index(drop=True)
+
+def save_rolling_state(state: pd.DataFrame, path: str = "data/insights_state.parquet"):
+    import pyarrow as pa, pyarrow.parquet as pq
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    out = state.copy()
+    out.attrs = {}
+    out["window"] = [np.asarray(w, dtype=float).tolist() for w in out["window"]]
+    table = pa.Table.from_pandas(out, preserve_index=False)
+    wm = state.attrs.get("watermark")
+    meta = dict(table.schema.metadata or {})
+    meta[b"watermark"] = b"" if wm is None else pd.Timestamp(wm).isoformat().encode("utf-8")
+    pq.write_table(table.replace_schema_metadata(meta), path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def load_rolling_state(path: str = "data/insights_state.parquet"):
+    """Saved state, or None if there is none yet."""
+    import pyarrow.parquet as pq
+    if not os.path.exists(path):
+        return None
+    table = pq.read_table(path)
+    state = table.to_pandas()
+    state["window"] = [np.asarray(w, dtype=float) for w in state["window"]]
+    wm = (table.schema.metadata or {}).get(b"watermark", b"").decode("utf-8")
+    state.attrs["watermark"] = pd.Timestamp(wm) if wm else None
+    return state
+
+def refresh_rolling_state(store, path: str = "data/insights_state.parquet", changed_dates=None) -> pd.DataFrame:
+    """Bring the persisted state up to date with a FlowsStore.
+
+    New weeks after the watermark are applied one at a time; if ``changed_dates`` (the
+    as_of_dates an ingest just wrote) reach back to or before the watermark, history
+    changed and the state is rebuilt from the whole store. The file is only rewritten when
+    something was applied or rebuilt, so read-only page views don't touch it.
+    """
+    state = load_rolling_state(path)
+    changed = pd.to_datetime(pd.Series([] if changed_dates is None else list(changed_dates), dtype=object))
+    wm = None if state is None else state.attrs.get("watermark")
+    if state is None or wm is None or (len(changed) and changed.min() <= wm):
+        state = build_rolling_state(prep_timeseries(store.read()))
+    else:
+        new_dates = [d for d in store.dates() if pd.Timestamp(d) > wm]
+        if not new_dates:
+            return state  # watermark current: nothing to apply or save
+        base = prep_timeseries(store.read(filters={"as_of_date": new_dates}))
+        for _, week in base.groupby("as_of_date", sort=True):
+            state = update_rolling_state(state, week)
+    save_rolling_state(state, path)
+    return state
+
+# ==================== WEEKLY NOTE ====================
+
+def weekly_note(ts: pd.DataFrame, top_n: int = 5) -> str:
+    """Markdown note for the latest week in ``ts``: strongest in/outflows by 52W z-score.
+
+    ``ts`` is compute_rolls() output or latest_from_state(); only rows of the latest
+    as_of_date are used, so both give the same note.
+    """
+    latest = ts["as_of_date"].max()
+    latest_rows = ts[ts["as_of_date"]==latest].sort_values("z_52w")
+    top_in = latest_rows.dropna(subset=["z_52w"]).tail(top_n)
+    top_out = latest_rows.dropna(subset=["z_52w"]).head(top_n)
+
+    def line(r):
+        lab = r["country"] if pd.notna(r["country"]) and r["country"] else r["level"]
+        return f"- {lab} / {r['asset_class']}: z={r['z_52w']:.2f}, WoW={r['flow_wow_usd_mn']:.0f}mn, 4W={r['roll_4w']:.0f}mn\n"
+
+    note = [f"# EM Flows Weekly – {latest.date() if hasattr(latest,'date') else str(latest)}\n\n", "## Highlights\n"]
+    if len(top_in):
+        note.append("**Strongest Inflows (z-score):**\n")
+        note.extend(line(r) for _, r in top_in.iterrows())
+    if len(top_out):
+        note.append("\n**Strongest Outflows (z-score):**\n")
+        note.extend(line(r) for _, r in top_out.iterrows())
+    return "".join(note)
+
+def write_weekly_note(ts: pd.DataFrame, path: str = "data/weekly_note.md") -> str:
+    note = weekly_note(ts)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(note)
+    os.replace(path + ".tmp", path)
+    return note
+
+def publish_insights(store, changed_dates=None, state_path: str = "data/insights_state.parquet",
+                     note_path: str = "data/weekly_note.md") -> pd.DataFrame:
+    """After an ingest: refresh the rolling state and regenerate the weekly note. Returns the state."""
+    state = refresh_rolling_state(store, state_path, changed_dates=changed_dates)
+    if len(state):
+        write_weekly_note(latest_from_state(state), note_path)
+    return state
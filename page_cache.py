@@ -0,0 +1,120 @@
+import os, threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+import cv2
+import fitz  # PyMuPDF
+
+def _render_rgb(pdf_path:str, page_index:int, dpi:int) -> np.ndarray:
+    with fitz.open(pdf_path) as doc:
+        page = doc.load_page(page_index)
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72), alpha=False)
+        # one copy out of the pixmap buffer; everything downstream is a view of this array
+        arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n).copy()
+    arr.flags.writeable = False
+    return arr
+
+def crop_box(shape, left:float, top:float, right:float, bottom:float) -> Tuple[int, int, int, int]:
+    """Pixel box for relative crop fractions, rounded the same way as ``digitizer.relative_crop``."""
+    h, w = shape[:2]
+    return (int(left*w), int(top*h), int(right*w), int(bottom*h))
+
+class PageCache:
+    """LRU of rendered PDF pages keyed by (pdf sha256, page, dpi), bounded by bytes.
+
+    Pages come back as read-only RGB arrays; ``crop`` returns views into them, so moving a crop
+    slider never re-rasterizes or copies the page. With ``spill_dir`` set, evicted pages are
+    written as ``.npy`` and memory-mapped back on the next miss instead of being re-rendered.
+    HSV conversions are memoized per (page key, crop box) for threshold tuning.
+
+    One instance is shared by every Streamlit session, so the LRU bookkeeping runs under a lock;
+    rendering, spilling and HSV conversion happen outside it.
+    """
+
+    def __init__(self, max_mb:float=256, spill_dir:Optional[str]=None, max_hsv:int=16):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.spill_dir = spill_dir
+        self.max_hsv = max_hsv
+        self._pages = OrderedDict()
+        self._hsv = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, key) -> str:
+        sha, page_index, dpi = key
+        return os.path.join(self.spill_dir, f"{sha}-p{page_index}-{dpi}.npy")
+
+    def page(self, pdf_path:str, pdf_sha:str, page_index:int, dpi:int) -> np.ndarray:
+        key = (pdf_sha, int(page_index), int(dpi))
+        with self._lock:
+            arr = self._pages.get(key)
+            if arr is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return arr
+            self.misses += 1
+        rendered = not (self.spill_dir and os.path.exists(self._spill_path(key)))
+        if rendered:
+            arr = _render_rgb(pdf_path, page_index, dpi)
+        else:
+            arr = np.load(self._spill_path(key), mmap_mode="r")
+        with self._lock:
+            self.renders += rendered
+            if key in self._pages:  # another session missed on the same page and got here first
+                self._pages.move_to_end(key)
+                return self._pages[key]
+            self._pages[key] = arr
+            self.bytes += arr.nbytes
+            evicted = self._evict()
+        for old_key, old in evicted:
+            self._spill(old_key, old)
+        return arr
+
+    def _evict(self):
+        # caller holds the lock; keep at least the page just added, even if it alone exceeds the budget
+        evicted = []
+        while self.bytes > self.max_bytes and len(self._pages) > 1:
+            key, arr = self._pages.popitem(last=False)
+            self.bytes -= arr.nbytes
+            evicted.append((key, arr))
+            for hk in [hk for hk in self._hsv if hk[0] == key]:
+                del self._hsv[hk]
+        return evicted
+
+    def _spill(self, key, arr:np.ndarray):
+        if self.spill_dir and not isinstance(arr, np.memmap) and not os.path.exists(self._spill_path(key)):
+            tmp = f"{self._spill_path(key)}.{threading.get_ident()}.tmp.npy"
+            np.save(tmp, arr)
+            os.replace(tmp, self._spill_path(key))
+
+    @staticmethod
+    def crop(arr:np.ndarray, box:Tuple[int, int, int, int]) -> np.ndarray:
+        """Zero-copy view of ``box`` (left, top, right, bottom) in pixel coordinates."""
+        l, t, r, b = box
+        return arr[t:b, l:r]
+
+    def hsv(self, pdf_sha:str, page_index:int, dpi:int, box:Tuple[int, int, int, int], crop:np.ndarray) -> np.ndarray:
+        """HSV (OpenCV scale) of a crop, memoized on (page key, box)."""
+        hk = ((pdf_sha, int(page_index), int(dpi)), tuple(box))
+        with self._lock:
+            hsv = self._hsv.get(hk)
+            if hsv is not None:
+                self._hsv.move_to_end(hk)
+                return hsv
+        hsv = cv2.cvtColor(crop, cv2.COLOR_RGB2HSV)
+        with self._lock:
+            self._hsv[hk] = hsv
+            self._hsv.move_to_end(hk)
+            while len(self._hsv) > self.max_hsv:
+                self._hsv.popitem(last=False)
+        return hsv
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pages": len(self._pages), "mb": round(self.bytes / 1e6, 1), "hits": self.hits,
+                    "misses": self.misses, "renders": self.renders, "hsv_crops": len(self._hsv)}
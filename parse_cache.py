@@ -0,0 +1,75 @@
+import os, glob, hashlib, yaml
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# config.yml keys whose values change what the parser produces; anything else
+# (pool size, chunking) is left out so tuning throughput doesn't bust the cache.
+PARSE_CONFIG_KEYS = ["date_patterns", "value_column_hints", "parsing", "table_patterns", "country_table_patterns"]
+NON_SEMANTIC_PARSING_KEYS = {"workers", "pages_per_task"}
+
+def file_sha256(path:str, chunk_size:int=1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def parse_config_hash(cfg:dict) -> str:
+    section = {k: cfg.get(k) for k in PARSE_CONFIG_KEYS}
+    section["parsing"] = {k: v for k, v in (section.get("parsing") or {}).items() if k not in NON_SEMANTIC_PARSING_KEYS}
+    return hashlib.sha256(yaml.safe_dump(section, sort_keys=True).encode("utf-8")).hexdigest()
+
+class ParseCache:
+    """Persistent per-PDF parse results, one Parquet file per (PDF sha256, parse-config hash).
+
+    Entries are named ``<pdf_sha>-<cfg_hash>.parquet`` so a change to table patterns or
+    table settings simply misses; ``prune()`` deletes the stale files.
+    """
+
+    def __init__(self, cfg:dict, root:str="data/cache/parsed"):
+        self.root = root
+        self.cfg_hash = parse_config_hash(cfg)[:16]
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, pdf_sha:str) -> str:
+        return os.path.join(self.root, f"{pdf_sha}-{self.cfg_hash}.parquet")
+
+    def get(self, pdf_sha:str, pdf_name:str=None):
+        """Return (as_of, frame) for a cached PDF, or None."""
+        path = self._path(pdf_sha)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            table = pq.read_table(path)
+        except Exception:
+            self.misses += 1
+            return None
+        self.hits += 1
+        as_of = (table.schema.metadata or {}).get(b"as_of_date", b"").decode("utf-8") or None
+        df = table.to_pandas()
+        if pdf_name is not None and len(df):
+            # same bytes may arrive under a new file name
+            df["source_pdf"] = pdf_name
+        return as_of, df
+
+    def put(self, pdf_sha:str, as_of:str, df:pd.DataFrame):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        meta = dict(table.schema.metadata or {})
+        meta[b"as_of_date"] = str(as_of).encode("utf-8")
+        table = table.replace_schema_metadata(meta)
+        tmp = self._path(pdf_sha) + ".tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, self._path(pdf_sha))
+
+    def prune(self) -> int:
+        """Delete entries written under a different parse config. Returns files removed."""
+        removed = 0
+        for path in glob.glob(os.path.join(self.root, "*.parquet")):
+            if not path.endswith(f"-{self.cfg_hash}.parquet"):
+                os.remove(path)
+                removed += 1
+        return removed
@@ -1,9 +1,13 @@
-import os, re, yaml
+import os, re, sys, time, glob, logging, argparse, yaml
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Any, Tuple
 import pandas as pd
 import pdfplumber
-from rapidfuzz import fuzz
-from utils import parse_date_from_text, try_date_from_filename, coerce_numeric, wide_to_long_guess
+from pattern_matcher import PatternMatcher
+from parse_cache import ParseCache, file_sha256
+from store import FlowsStore
+from insights import publish_insights
+from utils import parse_date_from_text, try_date_from_filename, coerce_numeric_series, wide_to_long_guess
 
 DEFAULT_TABLE_SETTINGS = {
     "vertical_strategy": "lines",
@@ -12,53 +16,97 @@ DEFAULT_TABLE_SETTINGS = {
     "explicit_horizontal_lines": [],
 }
 
+NORMALIZED_COLUMNS = ["as_of_date","level","region","country","asset_class","measure","value","unit","source_pdf"]
+
+# One parser per worker process, built lazily from the config path the pool was given.
+_WORKER_PARSERS = {}
+
+def _worker_parser(config_path:str) -> "EMFlowsParser":
+    parser = _WORKER_PARSERS.get(config_path)
+    if parser is None:
+        parser = _WORKER_PARSERS[config_path] = EMFlowsParser(config_path)
+    return parser
+
+def _extract_chunk(config_path:str, pdf_path:str, start:int, stop:int, early_exit:bool=False):
+    """Pool task: one page walk over [start, stop) of a PDF, plus seconds spent."""
+    t0 = time.perf_counter()
+    parser = _worker_parser(config_path)
+    text, tables, matches, stats = parser._walk_pages(pdf_path, stop, start=start, early_exit=early_exit)
+    return text, tables, matches, stats, time.perf_counter() - t0
+
 class EMFlowsParser:
     def __init__(self, config_path="config.yml"):
+        self.config_path = config_path
         with open(config_path, "r") as f:
             self.cfg = yaml.safe_load(f)
         self.table_settings = self.cfg.get("parsing", {}).get("table_settings", DEFAULT_TABLE_SETTINGS)
         self.value_hints = self.cfg.get("value_column_hints", [])
         self.num_regex = self.cfg.get("parsing", {}).get("numeric_clean_regex", r"[^0-9+\\-.,]")
+        self.matcher = PatternMatcher(self._patterns())
+
+    def _max_pages(self) -> int:
+        return int(self.cfg.get("parsing", {}).get("max_pages", 40))
 
-    def _extract_text_all(self, pdf_path:str, max_pages:int) -> str:
-        text_chunks = []
+    def _page_count(self, pdf_path:str) -> int:
         with pdfplumber.open(pdf_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                if i >= max_pages: break
-                try:
-                    t = page.extract_text(x_tolerance=2, y_tolerance=2) or ""
-                    text_chunks.append(t)
-                except Exception:
-                    continue
-        return "\\n".join(text_chunks)
+            return min(len(pdf.pages), self._max_pages())
 
-    def _extract_tables(self, pdf_path:str, max_pages:int) -> List[pd.DataFrame]:
+    def _page_tables(self, page) -> List[pd.DataFrame]:
         dfs = []
-        with pdfplumber.open(pdf_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                if i >= max_pages: break
-                try:
-                    tables = page.extract_tables(table_settings=self.table_settings)
-                    for t in tables:
-                        df = pd.DataFrame(t).dropna(axis=0, how="all").dropna(axis=1, how="all")
-                        if df.shape[0] >= 2 and df.shape[1] >= 2:
-                            df = df.rename(columns={c: str(c) for c in df.columns})
-                            if df.shape[0] >= 2:
-                                header = df.iloc[0].astype(str).tolist()
-                                if len(set(header)) == len(header):
-                                    df.columns = header
-                                    df = df.iloc[1:].reset_index(drop=True)
-                            dfs.append(df)
-                except Exception:
-                    continue
+        for t in page.extract_tables(table_settings=self.table_settings):
+            df = pd.DataFrame(t).dropna(axis=0, how="all").dropna(axis=1, how="all")
+            if df.shape[0] >= 2 and df.shape[1] >= 2:
+                df = df.rename(columns={c: str(c) for c in df.columns})
+                if df.shape[0] >= 2:
+                    header = df.iloc[0].astype(str).tolist()
+                    if len(set(header)) == len(header):
+                        df.columns = header
+                        df = df.iloc[1:].reset_index(drop=True)
+                dfs.append(df)
         return dfs
 
-    def _score_match(self, title:str, keywords:List[str]) -> int:
-        title = title.lower()
-        best = 0
-        for kw in keywords:
-            best = max(best, fuzz.partial_ratio(title, kw.lower()))
-        return best
+    def _iter_pages(self, pdf, stop:int, start:int=0):
+        """Yield (page_index, text, tables) for pages [start, stop); each page is laid out once."""
+        for i, page in enumerate(pdf.pages[start:stop], start=start):
+            try:
+                text = page.extract_text(x_tolerance=2, y_tolerance=2) or ""
+            except Exception:
+                text = None
+            try:
+                tables = self._page_tables(page)
+            except Exception:
+                tables = []
+            yield i, text, tables
+            # pdfplumber caches layout objects per page; drop them as we go
+            page.flush_cache()
+
+    def _walk_pages(self, pdf_path:str, stop:int, start:int=0, early_exit:bool=False):
+        """Single pass over pages collecting text and tables.
+
+        With ``early_exit`` the walk stops as soon as a date has been found and every
+        configured table pattern has matched at least one table.
+        Returns ``(raw_text, tables, matches, stats)``.
+        """
+        date_patterns = self.cfg.get("date_patterns", [])
+        wanted = {name for name, _ in self._patterns()}
+        text_chunks, tables, matches = [], [], []
+        seen, have_date = set(), False
+        with pdfplumber.open(pdf_path) as pdf:
+            stop = min(stop, len(pdf.pages))
+            stats = {"pages_total": max(0, stop - start), "pages_parsed": 0, "early_exit": False}
+            for i, text, page_tables in self._iter_pages(pdf, stop, start=start):
+                stats["pages_parsed"] += 1
+                if text is not None:
+                    text_chunks.append(text)
+                    have_date = have_date or parse_date_from_text(text, date_patterns) is not None
+                page_matches = self._classify_many(page_tables)
+                tables.extend(page_tables)
+                matches.extend(page_matches)
+                seen.update(name for name, _ in page_matches if name is not None)
+                if early_exit and have_date and wanted <= seen and i + 1 < stop:
+                    stats["early_exit"] = True
+                    break
+        return "\\n".join(text_chunks), tables, matches, stats
 
     def _guess_title_for_df(self, df:pd.DataFrame) -> str:
         cols = " | ".join([str(c) for c in df.columns[:6]])
@@ -82,7 +130,7 @@ class EMFlowsParser:
         else: name_col = long.columns[0]
 
         long = long.rename(columns={name_col: "label"})
-        long["value"] = long["value"].apply(lambda x: coerce_numeric(x, self.num_regex))
+        long["value"] = coerce_numeric_series(long["value"], self.num_regex)
         long = long.dropna(subset=["value"])
         long["as_of_date"] = as_of
         long["level"] = pattern_block.get("level")
@@ -96,40 +144,227 @@ class EMFlowsParser:
             long["country"] = long["label"]
             long["level"] = "Country"
 
-        long["measure"] = long["measure"].astype(str).strip().upper().replace({"W/W":"WOW", "1W":"WOW", "4W":"4W"})
+        long["measure"] = long["measure"].astype(str).str.strip().str.upper().replace({"W/W":"WOW", "1W":"WOW", "4W":"4W"})
         long["measure"] = long["measure"].str.replace(r"[^A-Z0-9]", "", regex=True)
 
         return long[["as_of_date","level","region","country","asset_class","measure","value","unit","source_pdf"]]
 
     def parse_pdf(self, pdf_path:str):
-        max_pages = int(self.cfg.get("parsing", {}).get("max_pages", 40))
-        raw_text = self._extract_text_all(pdf_path, max_pages)
+        early_exit = bool(self.cfg.get("parsing", {}).get("early_exit", True))
+        raw_text, tables, matches, stats = self._walk_pages(pdf_path, self._max_pages(), early_exit=early_exit)
+        self.last_stats = stats
+        return self._assemble(pdf_path, raw_text, tables, matches)
+
+    def parse_as_of(self, pdf_path:str) -> str:
+        """Just the report date: reads page text until a date pattern matches, no table extraction."""
+        date_patterns = self.cfg.get("date_patterns", [])
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages[:self._max_pages()]:
+                try:
+                    as_of = parse_date_from_text(page.extract_text(x_tolerance=2, y_tolerance=2) or "", date_patterns)
+                except Exception:
+                    as_of = None
+                page.flush_cache()
+                if as_of:
+                    return as_of
+        return try_date_from_filename(os.path.basename(pdf_path)) or "1970-01-01"
+
+    def _patterns(self) -> List[Tuple[str, Dict[str,Any]]]:
+        """Configured table patterns in match-priority order (top-level first, then country)."""
+        return list(self.cfg.get("table_patterns", {}).items()) + \
+               list(self.cfg.get("country_table_patterns", {}).items())
+
+    def _classify(self, df:pd.DataFrame) -> Tuple[str, float]:
+        """Best matching pattern name for a table (None below the 60 threshold) and its score."""
+        return self._classify_many([df])[0]
+
+    def _classify_many(self, dfs:List[pd.DataFrame]) -> List[Tuple[str, float]]:
+        """``_classify`` for a batch of tables, scored in one vectorized call."""
+        return self.matcher.classify([self._guess_title_for_df(df) for df in dfs])
+
+    def _assemble(self, pdf_path:str, raw_text:str, tables:List[pd.DataFrame], matches=None):
         as_of = parse_date_from_text(raw_text, self.cfg.get("date_patterns", [])) or \
                 try_date_from_filename(os.path.basename(pdf_path)) or "1970-01-01"
-        tables = self._extract_tables(pdf_path, max_pages)
+        if matches is None:
+            matches = self._classify_many(tables)
+        blocks_by_name = dict(self._patterns())
 
         blocks = []
-        for df in tables:
-            pseudo_title = self._guess_title_for_df(df)
-            best_score, best_block = 0, None
-            for patt in self.cfg.get("table_patterns", {}).values():
-                score = self._score_match(pseudo_title, patt.get("keywords", []))
-                if score > best_score:
-                    best_score, best_block = score, patt
-            for patt in self.cfg.get("country_table_patterns", {}).values():
-                score = self._score_match(pseudo_title, patt.get("keywords", []))
-                if score > best_score:
-                    best_score, best_block = score, patt
-            if best_block and best_score >= 60:
-                try:
-                    norm = self._normalize_topdown_table(df, best_block, as_of, os.path.basename(pdf_path))
-                    blocks.append(norm)
-                except Exception:
-                    continue
+        for df, (name, _score) in zip(tables, matches):
+            if name is None:
+                continue
+            try:
+                norm = self._normalize_topdown_table(df, blocks_by_name[name], as_of, os.path.basename(pdf_path))
+                blocks.append(norm)
+            except Exception:
+                continue
 
         if blocks:
             out = pd.concat(blocks, ignore_index=True)
         else:
-            out = pd.DataFrame(columns=["as_of_date","level","region","country","asset_class","measure","value","unit","source_pdf"])
+            out = pd.DataFrame(columns=NORMALIZED_COLUMNS)
+
+        return as_of, out
+
+    def parse_many(self, pdf_paths:List[str], workers:int=None, pages_per_task:int=None, cache=None):
+        """Parse several PDFs, fanning files and page ranges out to a process pool.
+
+        Each PDF is split into chunks of ``pages_per_task`` pages (``parsing.pages_per_task``
+        in config.yml); chunks are extracted in parallel and stitched back in page order, so
+        the result does not depend on scheduling. ``workers=1`` parses in-process.
+
+        Files that fit in a single chunk are walked with ``parsing.early_exit`` (see
+        ``_walk_pages``); split files are walked in full since chunks run independently.
+
+        With a ``parse_cache.ParseCache`` as ``cache``, PDFs whose bytes and parse config
+        were seen before are served from it without being opened, and fresh results are
+        written back.
+
+        Returns ``(frame, report)``: the normalized long frame in input order and one dict
+        per file with ``source_pdf``, ``as_of_date``, ``rows``, ``pages``, ``pages_parsed``,
+        ``early_exit``, ``chunks``, ``seconds`` (summed extraction time across chunks),
+        ``cached`` and ``error``.
+        """
+        parsing = self.cfg.get("parsing", {})
+        early_exit = bool(parsing.get("early_exit", True))
+        workers = int(workers or parsing.get("workers") or os.cpu_count() or 1)
+        pages_per_task = max(1, int(pages_per_task or parsing.get("pages_per_task", 10)))
+        config_path = os.path.abspath(self.config_path)
+
+        report = []
+        tasks, hashes, cached = {}, {}, {}
+        for i, path in enumerate(pdf_paths):
+            entry = {"source_pdf": os.path.basename(path), "as_of_date": None, "rows": 0,
+                     "pages": 0, "pages_parsed": 0, "early_exit": False, "chunks": 0, "seconds": 0.0,
+                     "cached": False, "error": None}
+            report.append(entry)
+            try:
+                if cache is not None:
+                    hashes[i] = file_sha256(path)
+                    hit = cache.get(hashes[i], entry["source_pdf"])
+                    if hit is not None:
+                        cached[i] = hit
+                        continue
+                n_pages = self._page_count(path)
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+                continue
+            entry["pages"] = n_pages
+            ranges = [(a, min(a + pages_per_task, n_pages)) for a in range(0, n_pages, pages_per_task)] or [(0, 0)]
+            entry["chunks"] = len(ranges)
+            tasks[i] = [(a, b, early_exit and len(ranges) == 1) for a, b in ranges]
+
+        results = {}
+        if workers <= 1:
+            for i, ranges in tasks.items():
+                results[i] = []
+                for a, b, ee in ranges:
+                    try:
+                        results[i].append(_extract_chunk(config_path, pdf_paths[i], a, b, ee))
+                    except Exception as e:
+                        results[i] = e
+                        break
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {i: [pool.submit(_extract_chunk, config_path, pdf_paths[i], a, b, ee) for a, b, ee in ranges]
+                           for i, ranges in tasks.items()}
+                for i, futs in futures.items():
+                    try:
+                        results[i] = [f.result() for f in futs]
+                    except Exception as e:
+                        results[i] = e
+
+        frames = []
+        for i, entry in enumerate(report):
+            if i in cached:
+                entry["as_of_date"], df = cached[i]
+                entry["rows"] = len(df)
+                entry["cached"] = True
+                frames.append(df)
+                continue
+            res = results.get(i)
+            if res is None:
+                continue
+            if isinstance(res, Exception):
+                entry["error"] = f"{type(res).__name__}: {res}"
+                continue
+            t0 = time.perf_counter()
+            raw_text = "\\n".join(r[0] for r in res)
+            tables = [df for r in res for df in r[1]]
+            matches = [m for r in res for m in r[2]]
+            entry["pages_parsed"] = sum(r[3]["pages_parsed"] for r in res)
+            entry["early_exit"] = any(r[3]["early_exit"] for r in res)
+            try:
+                as_of, df = self._assemble(pdf_paths[i], raw_text, tables, matches)
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+                continue
+            entry["as_of_date"] = as_of
+            entry["rows"] = len(df)
+            entry["seconds"] = round(sum(r[4] for r in res) + time.perf_counter() - t0, 3)
+            if cache is not None:
+                cache.put(hashes[i], as_of, df)
+            frames.append(df)
+
+        if frames:
+            out = pd.concat(frames, ignore_index=True)
+        else:
+            out = pd.DataFrame(columns=NORMALIZED_COLUMNS)
+        return out, report
+
+
+def _expand_pdf_paths(paths:List[str]) -> List[str]:
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out.extend(sorted(glob.glob(os.path.join(p, "*.pdf"))))
+        else:
+            out.append(p)
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Batch-parse weekly EM Flows PDFs into the partitioned flows store.")
+    ap.add_argument("paths", nargs="+", help="PDF files and/or folders containing PDFs")
+    ap.add_argument("--config", default="config.yml")
+    ap.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    ap.add_argument("--pages-per-task", type=int, default=None)
+    ap.add_argument("--store", default="data/flows", help="flows store root (one partition per as_of_date/source_pdf)")
+    ap.add_argument("--out", default=None, help="also write the parsed rows to a single Parquet file")
+    ap.add_argument("--cache-dir", default="data/cache/parsed")
+    ap.add_argument("--no-cache", action="store_true", help="always re-parse, ignoring the content-hash cache")
+    ap.add_argument("--log-matches", action="store_true", help="log each table's best pattern and score (for tuning keywords)")
+    args = ap.parse_args(argv)
+    if args.log_matches:
+        logging.basicConfig(format="%(message)s")
+        logging.getLogger("parser.matches").setLevel(logging.DEBUG)
+
+    parser = EMFlowsParser(args.config)
+    cache = None if args.no_cache else ParseCache(parser.cfg, args.cache_dir)
+    paths = _expand_pdf_paths(args.paths)
+    t0 = time.perf_counter()
+    df, report = parser.parse_many(paths, workers=args.workers, pages_per_task=args.pages_per_task, cache=cache)
+    for r in report:
+        status = f"ERROR {r['error']}" if r["error"] else f"{r['rows']} rows{' (cached)' if r['cached'] else ''}"
+        print(f"{r['source_pdf']}: as_of={r['as_of_date']} pages={r['pages_parsed']}/{r['pages']}"
+              f"{' (early exit)' if r['early_exit'] else ''} chunks={r['chunks']} {r['seconds']:.2f}s {status}")
+    parsed, total = sum(r["pages_parsed"] for r in report), sum(r["pages"] for r in report)
+    print(f"Parsed {len(paths)} PDFs ({parsed}/{total} pages) in {time.perf_counter() - t0:.2f}s")
+    if cache is not None:
+        print(f"Parse cache: {cache.hits} hits, {cache.misses} misses")
+
+    if not df.empty:
+        store = FlowsStore(args.store)
+        written = store.write(df)
+        print(f"Saved {len(df):,} rows to {len(written)} partition(s) under {args.store}")
+        state = publish_insights(store, changed_dates=df["as_of_date"].unique())
+        print(f"Rolling state: {len(state)} series up to {state.attrs['watermark']}")
+        if args.out:
+            os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+            df.to_parquet(args.out, index=False)
+            print(f"Saved {len(df):,} rows to {args.out}")
+    return 1 if any(r["error"] for r in report) else 0
+
 
-        return as_of, out
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
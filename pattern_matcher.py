@@ -0,0 +1,60 @@
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from rapidfuzz import fuzz, process
+
+log = logging.getLogger("parser.matches")
+
+class PatternMatcher:
+    """Scores table titles against every configured pattern in one ``process.cdist`` call.
+
+    Built once per config: keywords are lower-cased and de-duplicated across patterns, and
+    each pattern keeps the column indices of its keywords. A pattern's score for a title is
+    the best ``partial_ratio`` over its keywords, exactly as scoring one keyword at a time.
+    """
+
+    def __init__(self, patterns:Sequence[Tuple[str, Dict[str, Any]]], threshold:float=60):
+        self.names = [name for name, _ in patterns]
+        self.threshold = threshold
+        vocab, columns = {}, []
+        for _, patt in patterns:
+            idx = [vocab.setdefault(str(kw).lower(), len(vocab)) for kw in patt.get("keywords", [])]
+            columns.append(idx)
+        self.keywords = list(vocab)
+        # flatten per-pattern keyword columns so np.maximum.reduceat gives one max per pattern
+        self._has_keywords = np.array([bool(c) for c in columns], dtype=bool)
+        self._take = np.array([i for c in columns if c for i in c], dtype=np.intp)
+        sizes = np.array([len(c) for c in columns if c], dtype=np.intp)
+        self._starts = np.concatenate(([0], np.cumsum(sizes)[:-1])) if sizes.size else sizes
+
+    def scores(self, titles:List[str]) -> np.ndarray:
+        """(titles x patterns) matrix of best keyword scores; 0 for patterns without keywords."""
+        out = np.zeros((len(titles), len(self.names)), dtype=np.float64)
+        if not titles or not self.keywords:
+            return out
+        kw_scores = process.cdist([t.lower() for t in titles], self.keywords, scorer=fuzz.partial_ratio,
+                                  dtype=np.float64)
+        out[:, self._has_keywords] = np.maximum.reduceat(kw_scores[:, self._take], self._starts, axis=1)
+        return out
+
+    def classify(self, titles:List[str]) -> List[Tuple[Optional[str], float]]:
+        """Best pattern per title as ``(name, score)``; name is None below the threshold.
+
+        Ties go to the pattern listed first, as with a strict ``>`` scan over the patterns.
+        """
+        if not titles:
+            return []
+        scores = self.scores(titles)
+        if not self.names:
+            return [(None, 0) for _ in titles]
+        best = scores.argmax(axis=1)
+        out = []
+        for title, row, j in zip(titles, scores, best):
+            score = row[j]
+            name = self.names[j] if score > 0 and score >= self.threshold else None
+            out.append((name, score if score > 0 else 0))
+            if log.isEnabledFor(logging.DEBUG):
+                runner_up = np.argsort(-row, kind="stable")[1] if len(row) > 1 else None
+                log.debug("table %r -> %s (%.1f)%s", title[:80], self.names[j], score,
+                          "" if runner_up is None else f", next {self.names[runner_up]} ({row[runner_up]:.1f})")
+        return out
@@ -0,0 +1,126 @@
+import os, re, glob, hashlib
+from typing import Dict, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+NORMALIZED_COLUMNS = ["as_of_date","level","region","country","asset_class","measure","value","unit","source_pdf"]
+
+# as_of_date lives in the directory name (hive style), everything else in the file.
+FILE_SCHEMA = pa.schema([
+    ("level", pa.string()),
+    ("region", pa.string()),
+    ("country", pa.string()),
+    ("asset_class", pa.string()),
+    ("measure", pa.string()),
+    ("value", pa.float64()),
+    ("unit", pa.string()),
+    ("source_pdf", pa.string()),
+])
+PARTITION_SCHEMA = pa.schema([("as_of_date", pa.string())])
+
+def _partition_file_name(source_pdf:str) -> str:
+    stem = re.sub(r"[^A-Za-z0-9_.-]+", "_", os.path.splitext(str(source_pdf))[0])[:60]
+    digest = hashlib.sha1(str(source_pdf).encode("utf-8")).hexdigest()[:8]
+    return f"{stem}-{digest}.parquet"
+
+class FlowsStore:
+    """Partitioned Parquet store for normalized flows: ``<root>/as_of_date=YYYY-MM-DD/<source>.parquet``.
+
+    Each (as_of_date, source_pdf) pair is one file. Writing a frame replaces only the files for
+    the sources it contains; readers scan the directory as a dataset and push column and row
+    filters down to the Parquet reader.
+    """
+
+    def __init__(self, root:str="data/flows", legacy_path:Optional[str]="data/flows_raw.parquet"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        if legacy_path and os.path.exists(legacy_path) and not self.exists():
+            self._migrate_legacy(legacy_path)
+
+    def _migrate_legacy(self, legacy_path:str):
+        self.write(pd.read_parquet(legacy_path))
+        os.replace(legacy_path, legacy_path + ".migrated")
+
+    def _files(self) -> List[str]:
+        return glob.glob(os.path.join(self.root, "as_of_date=*", "*.parquet"))
+
+    def exists(self) -> bool:
+        return bool(self._files())
+
+    def partitions(self) -> pd.DataFrame:
+        """One row per stored partition: as_of_date, file, bytes."""
+        rows = []
+        for path in self._files():
+            as_of = os.path.basename(os.path.dirname(path)).split("=", 1)[1]
+            rows.append({"as_of_date": as_of, "file": os.path.basename(path), "bytes": os.path.getsize(path)})
+        return pd.DataFrame(rows, columns=["as_of_date", "file", "bytes"]).sort_values(["as_of_date", "file"], ignore_index=True)
+
+    def dates(self) -> List[str]:
+        return sorted({os.path.basename(os.path.dirname(p)).split("=", 1)[1] for p in self._files()})
+
+    def write(self, df:pd.DataFrame) -> List[str]:
+        """Append/replace the (as_of_date, source_pdf) partitions present in ``df``.
+
+        A source's partitions for dates it no longer has in ``df`` are removed first, so
+        re-ingesting a PDF that now parses to a different date never leaves duplicates behind.
+        Returns the files written.
+        """
+        if df.empty:
+            return []
+        df = df.copy()
+        df["as_of_date"] = pd.to_datetime(df["as_of_date"]).dt.strftime("%Y-%m-%d")
+        # sweep first, once per source: a date this frame writes for the source is never stale
+        for source, as_ofs in df.groupby("source_pdf", sort=True, dropna=False)["as_of_date"]:
+            keep = {f"as_of_date={as_of}" for as_of in as_ofs.unique()}
+            for stale in glob.glob(os.path.join(self.root, "as_of_date=*", _partition_file_name(source))):
+                if os.path.basename(os.path.dirname(stale)) not in keep:
+                    os.remove(stale)
+                    if not os.listdir(os.path.dirname(stale)):
+                        os.rmdir(os.path.dirname(stale))
+        written = []
+        for (as_of, source), part in df.groupby(["as_of_date", "source_pdf"], sort=True, dropna=False):
+            name = _partition_file_name(source)
+            part_dir = os.path.join(self.root, f"as_of_date={as_of}")
+            os.makedirs(part_dir, exist_ok=True)
+            table = pa.Table.from_pandas(part[FILE_SCHEMA.names], schema=FILE_SCHEMA, preserve_index=False)
+            path = os.path.join(part_dir, name)
+            tmp = os.path.join(part_dir, f".{name}.tmp")  # dot-prefixed: skipped by dataset discovery
+            pq.write_table(table, tmp)
+            os.replace(tmp, path)
+            written.append(path)
+        return written
+
+    def _dataset(self) -> ds.Dataset:
+        return ds.dataset(self.root, format="parquet", schema=FILE_SCHEMA.append(PARTITION_SCHEMA.field("as_of_date")),
+                          partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+                          exclude_invalid_files=True)
+
+    @staticmethod
+    def _filter_expr(filters:Optional[Dict[str, list]]):
+        expr = None
+        for col, values in (filters or {}).items():
+            if values is None or len(values) == 0:
+                continue
+            e = pc.field(col).isin(list(values))
+            expr = e if expr is None else expr & e
+        return expr
+
+    def read(self, filters:Optional[Dict[str, list]]=None, columns:Optional[List[str]]=None) -> pd.DataFrame:
+        """Read the store, optionally restricted to ``{column: [allowed values]}`` and a column subset.
+
+        Filters on as_of_date prune whole directories; filters on level/region/country/asset_class
+        are evaluated by the Parquet scanner so non-matching row groups are never materialized.
+        """
+        columns = columns or NORMALIZED_COLUMNS
+        if not self.exists():
+            return pd.DataFrame(columns=columns)
+        table = self._dataset().to_table(columns=columns, filter=self._filter_expr(filters))
+        return table.to_pandas()
+
+    def head(self, n:int=50) -> pd.DataFrame:
+        if not self.exists():
+            return pd.DataFrame(columns=NORMALIZED_COLUMNS)
+        return self._dataset().head(n, columns=NORMALIZED_COLUMNS).to_pandas()
@@ -5,11 +5,14 @@ import numpy as np
 import io
 import os # For path joining
 import sqlite3 # For SQLite database operations
-from bokeh.embed import json_item
 from bokeh.plotting import figure
-from bokeh.models import ColumnDataSource, NumeralTickFormatter, DatetimeTickFormatter
+from bokeh.models import ColumnDataSource, HoverTool, NumeralTickFormatter, DatetimeTickFormatter
 from bokeh.palettes import Category10, Category20 # For Bokeh plot colors
-from sqlalchemy import create_engine # For pandas to_sql
+from tail_select import tails
+from tail_store import open_tail_workbook, store_for
+from tail_results import ResultCache
+from tail_chart import CHARTS, chart_data
+import tail_db
 
 app = Flask(__name__)
 app.secret_key = 'your_strong_secret_key_here' # IMPORTANT: Replace with a strong secret key
@@ -17,6 +20,7 @@ app.secret_key = 'your_strong_secret_key_here' # IMPORTANT: Replace with a stron
 # --- Configuration ---
 EXCEL_FILE_PATH = os.path.join(app.root_path, 'data', 'Tail_analysis_auto.xlsx')
 DB_FILE_PATH = os.path.join(app.root_path, 'data', 'data.db') # SQLite database file path
+RESULTS_DIR = os.path.join(app.root_path, 'data', 'results') # processed frames, shared by all workers
 
 CURRENT_DAY_SHEET_NAME = "DVaR_COB"
 PREVIOUS_DAY_SHEET_NAME = "DVaR_Prev_COB"
@@ -43,25 +47,31 @@ BARCLAYS_COLOR_PALETTE = [
     '#28a745',  # Green for positive changes (index 6)
 ]
 
-# --- Database Helper ---
-def get_db_engine():
-    """Returns a SQLAlchemy engine for SQLite."""
-    return create_engine(f'sqlite:///{DB_FILE_PATH}')
+# Asset class -> node its rows must carry to count towards it
+ASSET_CLASS_NODES = {
+    'FX': FX_DVAR_NODE,
+    'Rates': RATES_DVAR_NODE,
+    'EM Macro': EM_MACRO_DVAR_NODE
+}
+
+# Processed frames keyed by workbook hash: on disk for every worker, plus a small LRU per process
+RESULT_CACHE = ResultCache(RESULTS_DIR, keep_latest=True)  # one workbook at a time: drop older results
 
+# --- Database Helper ---
 def get_db_connection():
-    """Returns a direct SQLite connection."""
-    conn = sqlite3.connect(DB_FILE_PATH)
+    """Returns a SQLite connection (WAL mode, tail_db schema in place)."""
+    conn = tail_db.connect(DB_FILE_PATH)
     conn.row_factory = sqlite3.Row # Allows accessing columns by name
     return conn
 
 # --- Data Ingestion Function ---
-def ingest_excel_to_sqlite(excel_file_path):
+def ingest_excel_to_sqlite(excel_file_path, source=None):
     """
-    Reads the Excel file and ingests all relevant data into a SQLite database.
-    Stores processed data in a single 'pnl_data' table in long format.
+    Reads the Excel file and bulk-loads all relevant data into the SQLite database
+    (tail_db schema: dictionary-encoded labels, integer date keys, one 'pnl_value' fact table).
+    `source` (the workbook hash) is recorded so a changed workbook is re-ingested.
     """
     print(f"Ingesting Excel data from {excel_file_path} into SQLite database {DB_FILE_PATH}...")
-    engine = get_db_engine()
 
     sheets_to_process = {
         CURRENT_DAY_SHEET_NAME: {"type": "DVaR", "sheet_type": "current", "vector_start": DVAR_PNL_VECTOR_START, "vector_end": DVAR_PNL_VECTOR_END},
@@ -70,192 +80,62 @@ def ingest_excel_to_sqlite(excel_file_path):
         SVAR_PREV_COB_SHEET_NAME: {"type": "SVaR", "sheet_type": "previous", "vector_start": SVAR_PNL_VECTOR_START, "vector_end": SVAR_PNL_VECTOR_END},
     }
 
-    all_melted_dfs = []
-
-    with pd.ExcelFile(excel_file_path) as xls:
-        for sheet_name, config in sheets_to_process.items():
-            print(f"  Processing sheet: {sheet_name} (Type: {config['type']}, Period: {config['sheet_type']})")
-            try:
-                # Read header rows first to get dates and column names
-                df_temp = pd.read_excel(xls, sheet_name=sheet_name, header=None, nrows=2)
-                if df_temp.empty or len(df_temp) < 2:
-                    print(f"    WARNING: Sheet '{sheet_name}' is empty or has insufficient header rows. Skipping.")
-                    continue
-
-                dates_row = df_temp.iloc[0]
-                column_names_row = df_temp.iloc[1]
-
-                # Read actual data
-                df = pd.read_excel(xls, sheet_name=sheet_name, header=None, skiprows=2)
-                df.columns = column_names_row
-                df = df.dropna(axis=1, how='all') # Drop columns that are entirely NaN
-
-                # Ensure 'Node' column is numeric
-                if 'Node' in df.columns:
-                    df['Node'] = pd.to_numeric(df['Node'], errors='coerce').astype('Int64')
-
-                # Create PnL date map
-                pnl_date_map = {}
-                for col_idx, col_name in enumerate(column_names_row):
-                    if pd.isna(col_name): continue
-                    if str(col_name).startswith('pnl_vector') or ('[T-2]' in str(col_name) and 'pnl_vector' in str(col_name)):
-                        if col_idx < len(dates_row):
-                            date_val = dates_row.iloc[col_idx]
-                            if isinstance(date_val, (int, float)):
-                                try: pnl_date_map[str(col_name)] = pd.to_datetime(date_val, unit='D', origin='1899-12-30')
-                                except: pnl_date_map[str(col_name)] = pd.NaT
-                            else: pnl_date_map[str(col_name)] = pd.to_datetime(date_val, errors='coerce')
-
-                # Identify valid PnL vector columns based on sheet type and range
-                pnl_vector_cols = [col for col in df.columns if str(col).startswith('pnl_vector') or ('[T-2]' in str(col) and 'pnl_vector' in str(col))]
-                valid_pnl_cols_for_sheet = []
-                for col_name in pnl_vector_cols:
-                    col_str = str(col_name)
-                    is_previous_cob_vector = '[T-2]' in col_str
-                    numeric_part_str = ''.join(filter(str.isdigit, col_str.split('[T-2]')[0]))
-
-                    if not numeric_part_str.isdigit(): continue
-                    vector_number = int(numeric_part_str)
-
-                    if config["sheet_type"] == "current":
-                        if not is_previous_cob_vector and config["vector_start"] <= vector_number <= config["vector_end"]:
-                            valid_pnl_cols_for_sheet.append(col_name)
-                    elif config["sheet_type"] == "previous":
-                        if is_previous_cob_vector and config["vector_start"] <= vector_number <= config["vector_end"]:
-                            valid_pnl_cols_for_sheet.append(col_name)
-
-                if not valid_pnl_cols_for_sheet:
-                    print(f"    WARNING: No valid PnL vector columns found for sheet '{sheet_name}'. Skipping.")
-                    continue
-
-                # Melt the DataFrame
-                id_vars = ['Var Type', 'Node', 'Asset class', 'currency', 'sensitivity_type', 'load_code']
-                id_vars_present = [col for col in id_vars if col in df.columns]
-                df_melted = df.melt(id_vars=id_vars_present,
-                                     value_vars=valid_pnl_cols_for_sheet,
-                                     var_name='Pnl_Vector_Name',
-                                     value_name='Value')
-                
-                # Add Pnl_Vector_Rank
-                def extract_pnl_rank_ingest(pnl_vector_name):
-                    name_without_suffix = pnl_vector_name.split('[T-2]')[0]
-                    numeric_part = ''.join(filter(str.isdigit, name_without_suffix))
-                    return int(numeric_part) if numeric_part else np.nan
-                df_melted['Pnl_Vector_Rank'] = df_melted['Pnl_Vector_Name'].apply(extract_pnl_rank_ingest)
-                df_melted['Pnl_Vector_Rank'] = df_melted['Pnl_Vector_Rank'].astype('Int64')
-
-                # Add Date and Sheet_Type
-                df_melted['Date'] = df_melted['Pnl_Vector_Name'].map(pnl_date_map)
-                df_melted['Date'] = pd.to_datetime(df_melted['Date'], errors='coerce')
-                df_melted = df_melted.dropna(subset=['Date'])
-                df_melted['Sheet_Type'] = config["sheet_type"]
-                df_melted['Var_Type_Original'] = config["type"] # Keep original Var Type for filtering in queries
-
-                all_melted_dfs.append(df_melted)
-                print(f"    Successfully processed sheet '{sheet_name}'. Rows: {len(df_melted)}")
-
-            except Exception as e:
-                print(f"    ERROR processing sheet '{sheet_name}': {e}")
-                raise # Re-raise to stop ingestion if one sheet fails critically
-
-    if not all_melted_dfs:
+    all_sheet_facts = []
+
+    # memory-mapped columnar copy of the workbook (tail_store); converted from the .xlsx on first use
+    book = open_tail_workbook(excel_file_path, sheets=list(sheets_to_process))
+    for sheet_name, config in sheets_to_process.items():
+        print(f"  Processing sheet: {sheet_name} (Type: {config['type']}, Period: {config['sheet_type']})")
+        try:
+            sheet = book[sheet_name]
+            if not sheet.columns:
+                print(f"    WARNING: Sheet '{sheet_name}' is empty or has insufficient header rows. Skipping.")
+                continue
+
+            facts = tail_db.sheet_facts(sheet, config["type"], config["sheet_type"], config["vector_start"], config["vector_end"])
+            if not facts["names"]:
+                print(f"    WARNING: No valid PnL vector columns found for sheet '{sheet_name}'. Skipping.")
+                continue
+
+            all_sheet_facts.append(facts)
+            print(f"    Successfully processed sheet '{sheet_name}'. Rows: {facts['values'].size}")
+
+        except Exception as e:
+            print(f"    ERROR processing sheet '{sheet_name}': {e}")
+            raise # Re-raise to stop ingestion if one sheet fails critically
+
+    if not all_sheet_facts:
         print("No data processed from any sheet. Database will be empty.")
         return
 
-    final_ingestion_df = pd.concat(all_melted_dfs, ignore_index=True)
-    # Convert dates to string for SQLite storage to prevent issues with different drivers/versions
-    final_ingestion_df['Date'] = final_ingestion_df['Date'].dt.strftime('%Y-%m-%d')
-    
-    print(f"Total rows to ingest: {len(final_ingestion_df)}")
-    # Write to SQLite
-    final_ingestion_df.to_sql('pnl_data', engine, if_exists='replace', index=False, dtype={
-        'Date': 'TEXT',
-        'Pnl_Vector_Name': 'TEXT',
-        'Pnl_Vector_Rank': 'INTEGER',
-        'Value': 'REAL',
-        'Var Type': 'TEXT',
-        'Node': 'INTEGER',
-        'Asset class': 'TEXT',
-        'currency': 'TEXT',
-        'sensitivity_type': 'TEXT',
-        'load_code': 'TEXT',
-        'Sheet_Type': 'TEXT',
-        'Var_Type_Original': 'TEXT'
-    })
-    print("Ingestion complete. Data stored in 'pnl_data' table.")
+    conn = tail_db.connect(DB_FILE_PATH)
+    try:
+        rows = tail_db.bulk_load(conn, all_sheet_facts, replace=True, source=source)
+    finally:
+        conn.close()
+    print(f"Ingestion complete. {rows} rows stored in 'pnl_value'.")
 
 
 # --- Data Retrieval Functions (Querying SQLite) ---
 
 def get_filtered_var_data_from_db(conn, sheet_type, var_type_original, debug_mode):
     """
-    Fetches and calculates aggregated VAR data (Macro, FX, Rates, EM Macro) from DB.
+    Fetches and calculates aggregated VAR data (Macro, FX, Rates, EM Macro) from DB,
+    with one GROUP BY query for all asset classes.
     """
-    asset_classes = ['FX', 'Rates', 'EM Macro']
-    node_mapping = {
-        'FX': FX_DVAR_NODE, 
-        'Rates': RATES_DVAR_NODE, 
-        'EM Macro': EM_MACRO_DVAR_NODE
-    }
-    
-    # Base query for the specific sheet type and original VAR type (DVaR or SVaR)
-    # The 'Var Type' column in the DB corresponds to DVaR or SVaR from the original sheet
-    # We are filtering by 'Var_Type_Original' now, as 'Var Type' column is just 'DVaR' or 'SVaR'
-    # depending on what was in the source Excel column.
-    
-    # Construct individual asset class queries first
-    asset_dfs = {}
-    for ac in asset_classes:
-        query = f"""
-            SELECT
-                Date,
-                Pnl_Vector_Name,
-                Pnl_Vector_Rank,
-                SUM(Value) AS "{ac.replace(" ", "_")}_{var_type_original}_Value"
-            FROM pnl_data
-            WHERE
-                Sheet_Type = '{sheet_type}' AND
-                "Var Type" = '{var_type_original}' AND  -- Use the 'Var Type' column which stores DVaR/SVaR for filtering
-                "Asset class" = '{ac}' AND
-                Node = {node_mapping[ac]}
-            GROUP BY Date, Pnl_Vector_Name, Pnl_Vector_Rank
-            ORDER BY Date, Pnl_Vector_Rank;
-        """
-        try:
-            df = pd.read_sql_query(query, conn)
-            # Ensure Pnl_Vector_Rank is Int64 for merging
-            df['Pnl_Vector_Rank'] = df['Pnl_Vector_Rank'].astype('Int64')
-            asset_dfs[ac] = df
-            if debug_mode: print(f"  DB Query: {ac} {var_type_original} {sheet_type} rows: {len(df)}")
-        except Exception as e:
-            print(f"  ERROR DB Query for {ac} {var_type_original} {sheet_type}: {e}")
-            asset_dfs[ac] = pd.DataFrame(columns=['Date', 'Pnl_Vector_Name', 'Pnl_Vector_Rank', f'{ac.replace(" ", "_")}_{var_type_original}_Value'])
-
-    # Combine into macro_var_df
-    macro_var_df = pd.DataFrame(columns=['Date', 'Pnl_Vector_Name', 'Pnl_Vector_Rank', f'Macro_{var_type_original}_Value'])
-
-    # Start with FX, then outer join others
-    if 'FX' in asset_dfs and not asset_dfs['FX'].empty:
-        macro_var_df = asset_dfs['FX'].copy()
-        for ac_other in [ac for ac in asset_classes if ac != 'FX']:
-            if ac_other in asset_dfs and not asset_dfs[ac_other].empty:
-                macro_var_df = pd.merge(macro_var_df, asset_dfs[ac_other], on=['Date', 'Pnl_Vector_Name', 'Pnl_Vector_Rank'], how='outer')
-        
-        # Calculate Macro Sum
-        cols_for_sum = [f'{ac.replace(" ", "_")}_{var_type_original}_Value' for ac in asset_classes]
-        # Fill NA for summing, as outer merge might introduce them
-        for col_sum in cols_for_sum:
-            if col_sum not in macro_var_df.columns:
-                macro_var_df[col_sum] = 0.0 # Ensure float type for summing
-            macro_var_df[col_sum] = macro_var_df[col_sum].fillna(0.0)
-
-        macro_var_df[f'Macro_{var_type_original}_Value'] = macro_var_df[cols_for_sum].sum(axis=1)
-        macro_var_df['Sheet_Type'] = sheet_type # Add Sheet_Type column
-        macro_var_df = macro_var_df.sort_values(['Date', 'Pnl_Vector_Rank']).reset_index(drop=True)
-    else:
+    try:
+        asset_dfs, macro_var_df = tail_db.var_frames(conn, var_type_original, sheet_type, ASSET_CLASS_NODES)
+    except Exception as e:
+        print(f"  ERROR DB Query for {var_type_original} {sheet_type}: {e}")
+        asset_dfs = {ac: pd.DataFrame(columns=['Date', 'Pnl_Vector_Name', 'Pnl_Vector_Rank', f'{ac.replace(" ", "_")}_{var_type_original}_Value'])
+                     for ac in ASSET_CLASS_NODES}
+        macro_var_df = pd.DataFrame(columns=['Date', 'Pnl_Vector_Name', 'Pnl_Vector_Rank', f'Macro_{var_type_original}_Value'])
+    if debug_mode:
+        for ac, df in asset_dfs.items():
+            print(f"  DB Query: {ac} {var_type_original} {sheet_type} rows: {len(df)}")
+    if macro_var_df.empty:
         print(f"  WARNING: No FX data found for Macro {var_type_original} {sheet_type} calculation.")
 
-
     return asset_dfs.get('FX', pd.DataFrame()), \
            asset_dfs.get('Rates', pd.DataFrame()), \
            asset_dfs.get('EM Macro', pd.DataFrame()), \
@@ -276,7 +156,7 @@ def create_dvar_trends_bokeh_plot(df, title, y_column, legend_title="Type"):
         sizing_mode="stretch_width", 
         title=title,
         x_axis_type="datetime",
-        tools="pan,wheel_zoom,box_zoom,reset,save,hover",
+        tools="pan,wheel_zoom,box_zoom,reset,save",
         active_drag="pan",
         active_scroll="wheel_zoom"
     )
@@ -287,9 +167,10 @@ def create_dvar_trends_bokeh_plot(df, title, y_column, legend_title="Type"):
     colors = BARCLAYS_COLOR_PALETTE 
 
     for i, sheet_type in enumerate(sheet_types):
-        view = ColumnDataSource(df[df['Sheet_Type'] == sheet_type])
+        # only the plotted columns, as typed arrays, min/max-decimated past tail_chart.MAX_POINTS rows
+        view = ColumnDataSource(chart_data(df[df['Sheet_Type'] == sheet_type], 'Date', [y_column], ['Pnl_Vector_Rank']))
         color_index = i % len(colors)
-        p.line(
+        line = p.line(
             x='Date', 
             y=y_column, 
             source=view, 
@@ -297,7 +178,7 @@ def create_dvar_trends_bokeh_plot(df, title, y_column, legend_title="Type"):
             line_color=colors[color_index],
             line_width=2
         )
-        p.circle(
+        dots = p.circle(
             x='Date', 
             y=y_column, 
             source=view, 
@@ -306,6 +187,13 @@ def create_dvar_trends_bokeh_plot(df, title, y_column, legend_title="Type"):
             alpha=0.6,
             legend_label=sheet_type
         )
+        # the sheet type is fixed per renderer, so it goes in the tooltip rather than a text column
+        p.add_tools(HoverTool(renderers=[line, dots], tooltips=[
+            ("Date", "@Date{%d-%m-%Y}"),
+            (y_column, f"@{y_column}{{0,0.00}}"),
+            (legend_title, sheet_type),
+            ("P&L Vector Rank", "@Pnl_Vector_Rank")
+        ], formatters={"@Date": "datetime"}))
 
     p.xaxis.formatter = DatetimeTickFormatter(days="%d-%m-%Y", months="%d-%m-%Y", years="%d-%m-%Y")
     p.xaxis.axis_label = "Date"
@@ -314,14 +202,6 @@ def create_dvar_trends_bokeh_plot(df, title, y_column, legend_title="Type"):
     p.legend.location = "top_left"
     p.legend.click_policy = "hide"
 
-    p.hover.tooltips = [
-        ("Date", "@Date{%d-%m-%Y}"),
-        (y_column, f"@{y_column}{{0,0.00}}"),
-        (legend_title, "@Sheet_Type"),
-        ("P&L Vector Rank", "@Pnl_Vector_Rank")
-    ]
-    p.hover.formatters = {"@Date": "datetime"}
-
     return p
 
 # --- Flask Routes ---
@@ -330,90 +210,80 @@ def create_dvar_trends_bokeh_plot(df, title, y_column, legend_title="Type"):
 def index():
     return render_template('index.html')
 
-@app.route('/process_data', methods=['POST'])
-def process_data():
-    global processed_data_loaded_flag 
-    global processed_data_store 
-
-    # Only process if data is not already loaded
-    if not processed_data_loaded_flag:
-        try:
-            # Establish DB connection
+def current_results_key():
+    """(result cache key, workbook sha256): the key changes with the workbook and the DB schema."""
+    sha = store_for(EXCEL_FILE_PATH).sha_of(EXCEL_FILE_PATH)
+    return f"{sha[:16]}-db{tail_db.SCHEMA_VERSION}", sha
+
+def compute_results(source_sha, debug_mode=False):
+    """Ingests the workbook if the DB holds another one (or nothing), then runs the queries
+    whose frames the routes serve."""
+    conn = get_db_connection()
+    try:
+        # --- Ingest from Excel if the DB is empty or was loaded from a different workbook ---
+        if not tail_db.has_data(conn) or tail_db.loaded_source(conn) != source_sha:
+            print("'pnl_value' table is empty or stale. Ingesting from Excel...")
+            conn.close() # Close connection before ingestion (ingestion will open its own)
+            ingest_excel_to_sqlite(EXCEL_FILE_PATH, source=source_sha)
+            # Re-establish connection after ingestion
             conn = get_db_connection()
-            cursor = conn.cursor()
-
-            # --- Check if 'pnl_data' table exists and is populated ---
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='pnl_data';")
-            table_exists = cursor.fetchone()
-            
-            if not table_exists:
-                # Table doesn't exist, or is empty: ingest from Excel
-                conn.close() # Close connection before ingestion (ingestion will open its own)
-                ingest_excel_to_sqlite(EXCEL_FILE_PATH)
-                # Re-establish connection after ingestion
-                conn = get_db_connection()
-                cursor = conn.cursor()
-            else:
-                # Check if table has data
-                cursor.execute("SELECT COUNT(*) FROM pnl_data;")
-                if cursor.fetchone()[0] == 0:
-                    print("WARNING: 'pnl_data' table is empty. Ingesting from Excel...")
-                    conn.close()
-                    ingest_excel_to_sqlite(EXCEL_FILE_PATH)
-                    conn = get_db_connection()
-                    cursor = conn.cursor()
-            
-            # Now that we are sure data is in DB, retrieve it via queries
-            # For this simplified Flask structure, we'll fetch all necessary data here
-            # that is needed by subsequent GET requests and store in 'processed_data_store'
-
-            # DVaR Current COB
-            fx_dvar_curr, rates_dvar_curr, em_macro_dvar_curr, macro_dvar_curr = \
-                get_filtered_var_data_from_db(conn, "current", "DVaR", request.json.get('debug_mode', False))
-            
-            # DVaR Previous COB
-            fx_dvar_prev, rates_dvar_prev, em_macro_dvar_prev, macro_dvar_prev = \
-                get_filtered_var_data_from_db(conn, "previous", "DVaR", request.json.get('debug_mode', False))
-            
-            # SVaR Current COB
-            fx_svar_curr, rates_svar_curr, em_macro_svar_curr, macro_svar_curr = \
-                get_filtered_var_data_from_db(conn, "current", "SVaR", request.json.get('debug_mode', False))
-
-            # SVaR Previous COB
-            fx_svar_prev, rates_svar_prev, em_macro_svar_prev, macro_svar_prev = \
-                get_filtered_var_data_from_db(conn, "previous", "SVaR", request.json.get('debug_mode', False))
-            
-            conn.close() # Close connection after all queries
-
-            # Store processed data in the global dictionary
-            processed_data_store['macro_dvar_curr'] = macro_dvar_curr
-            processed_data_store['macro_dvar_prev'] = macro_dvar_prev
-            processed_data_store['fx_dvar_curr'] = fx_dvar_curr
-            processed_data_store['fx_dvar_prev'] = fx_dvar_prev
-            processed_data_store['rates_dvar_curr'] = rates_dvar_curr
-            processed_data_store['rates_dvar_prev'] = rates_dvar_prev
-            processed_data_store['em_macro_dvar_curr'] = em_macro_dvar_curr
-            processed_data_store['em_macro_dvar_prev'] = em_macro_dvar_prev
-            processed_data_store['macro_svar_curr'] = macro_svar_curr
-            processed_data_store['macro_svar_prev'] = macro_svar_prev
-            
-            processed_data_loaded_flag = True # Set flag to true as data is now processed
 
-        except Exception as e:
-            # Ensure connection is closed on error
-            if 'conn' in locals() and conn:
-                conn.close()
-            return jsonify({'success': False, 'error': str(e)}), 500
-    
-    # If successful or data already loaded, return metrics
-    key_metrics = get_key_metrics_from_store()
-    return jsonify({'success': True, 'message': 'Data processed successfully', 'key_metrics': key_metrics}), 200
+        # DVaR Current COB
+        fx_dvar_curr, rates_dvar_curr, em_macro_dvar_curr, macro_dvar_curr = \
+            get_filtered_var_data_from_db(conn, "current", "DVaR", debug_mode)
+
+        # DVaR Previous COB
+        fx_dvar_prev, rates_dvar_prev, em_macro_dvar_prev, macro_dvar_prev = \
+            get_filtered_var_data_from_db(conn, "previous", "DVaR", debug_mode)
 
-def get_key_metrics_from_store():
-    """Helper to extract lowest metrics from the processed_data_store."""
-    macro_dvar_curr = processed_data_store.get('macro_dvar_curr', pd.DataFrame())
-    macro_svar_curr = processed_data_store.get('macro_svar_curr', pd.DataFrame())
+        # SVaR Current COB
+        fx_svar_curr, rates_svar_curr, em_macro_svar_curr, macro_svar_curr = \
+            get_filtered_var_data_from_db(conn, "current", "SVaR", debug_mode)
+
+        # SVaR Previous COB
+        fx_svar_prev, rates_svar_prev, em_macro_svar_prev, macro_svar_prev = \
+            get_filtered_var_data_from_db(conn, "previous", "SVaR", debug_mode)
+    finally:
+        conn.close() # Close connection after all queries
+
+    return {
+        'macro_dvar_curr': macro_dvar_curr,
+        'macro_dvar_prev': macro_dvar_prev,
+        'fx_dvar_curr': fx_dvar_curr,
+        'fx_dvar_prev': fx_dvar_prev,
+        'rates_dvar_curr': rates_dvar_curr,
+        'rates_dvar_prev': rates_dvar_prev,
+        'em_macro_dvar_curr': em_macro_dvar_curr,
+        'em_macro_dvar_prev': em_macro_dvar_prev,
+        'macro_svar_curr': macro_svar_curr,
+        'macro_svar_prev': macro_svar_prev,
+    }
+
+def get_processed_results():
+    """Frames processed for the current workbook by any worker, or {} if not processed yet."""
+    try:
+        key, _ = current_results_key()
+    except OSError:
+        return {}
+    return RESULT_CACHE.get(key) or {}
+
+@app.route('/process_data', methods=['POST'])
+def process_data():
+    debug_mode = request.json.get('debug_mode', False)
+    try:
+        key, sha = current_results_key()
+        # computed once per workbook: concurrent requests (any worker) wait for the first one
+        results = RESULT_CACHE.get_or_compute(key, lambda: compute_results(sha, debug_mode))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    key_metrics = get_key_metrics(results)
+    return jsonify({'success': True, 'message': 'Data processed successfully', 'key_metrics': key_metrics}), 200
 
+def get_key_metrics(results):
+    """Helper to extract lowest metrics from the processed results."""
+    macro_dvar_curr = results.get('macro_dvar_curr', pd.DataFrame())
+    macro_svar_curr = results.get('macro_svar_curr', pd.DataFrame())
     lowest_dvar_row = macro_dvar_curr.nsmallest(1, 'Macro_DVaR_Value').iloc[0] if not macro_dvar_curr.empty else None
     lowest_svar_row = macro_svar_curr.nsmallest(1, 'Macro_SVaR_Value').iloc[0] if not macro_svar_curr.empty else None
 
@@ -433,23 +303,24 @@ def get_key_metrics_from_store():
 
 @app.route('/get_top_bottom_tails', methods=['GET'])
 def get_top_bottom_tails():
-    # Retrieve from cache
-    macro_dvar_curr = processed_data_store.get('macro_dvar_curr', pd.DataFrame())
-    macro_dvar_prev = processed_data_store.get('macro_dvar_prev', pd.DataFrame())
-    fx_dvar_curr = processed_data_store.get('fx_dvar_curr', pd.DataFrame())
-    fx_dvar_prev = processed_data_store.get('fx_dvar_prev', pd.DataFrame())
-    rates_dvar_curr = processed_data_store.get('rates_dvar_curr', pd.DataFrame())
-    rates_dvar_prev = processed_data_store.get('rates_dvar_prev', pd.DataFrame())
-    em_macro_dvar_curr = processed_data_store.get('em_macro_dvar_curr', pd.DataFrame())
-    em_macro_dvar_prev = processed_data_store.get('em_macro_dvar_prev', pd.DataFrame())
+    # Retrieve from the shared result cache
+    results = get_processed_results()
+    macro_dvar_curr = results.get('macro_dvar_curr', pd.DataFrame())
+    macro_dvar_prev = results.get('macro_dvar_prev', pd.DataFrame())
+    fx_dvar_curr = results.get('fx_dvar_curr', pd.DataFrame())
+    fx_dvar_prev = results.get('fx_dvar_prev', pd.DataFrame())
+    rates_dvar_curr = results.get('rates_dvar_curr', pd.DataFrame())
+    rates_dvar_prev = results.get('rates_dvar_prev', pd.DataFrame())
+    em_macro_dvar_curr = results.get('em_macro_dvar_curr', pd.DataFrame())
+    em_macro_dvar_prev = results.get('em_macro_dvar_prev', pd.DataFrame())
 
     if macro_dvar_curr.empty:
         return jsonify({'error': 'No DVaR data available. Please process the file first.'}), 400
 
     common_merge_keys = ['Date', 'Pnl_Vector_Name', 'Pnl_Vector_Rank']
 
-    top_20_positive_curr = macro_dvar_curr.nlargest(min(20, len(macro_dvar_curr)), 'Macro_DVaR_Value', keep='all').copy()
-    top_20_negative_curr = macro_dvar_curr.nsmallest(min(20, len(macro_dvar_curr)), 'Macro_DVaR_Value', keep='all').copy()
+    top_20_negative_curr, top_20_positive_curr = tails(macro_dvar_curr, 'Macro_DVaR_Value', 20, keep='all')
+    top_20_negative_curr, top_20_positive_curr = top_20_negative_curr.copy(), top_20_positive_curr.copy()
 
     all_current_tails_base = pd.concat([top_20_positive_curr, top_20_negative_curr]).drop_duplicates(subset=common_merge_keys).reset_index(drop=True)
     all_current_tails_base.rename(columns={'Macro_DVaR_Value': 'Macro_DVaR_Value_Current'}, inplace=True)
@@ -496,8 +367,8 @@ def get_top_bottom_tails():
     final_display_df.dropna(subset=['Macro_DVaR_Value_Current'], inplace=True)
     final_display_df = final_display_df.sort_values(by=['Date', 'Pnl_Vector_Rank']).reset_index(drop=True)
 
-    top_20_positive_aggrid = final_display_df.nlargest(min(20, len(final_display_df)), 'Macro_DVaR_Value_Current', keep='all')
-    top_20_negative_aggrid = final_display_df.nsmallest(min(20, len(final_display_df)), 'Macro_DVaR_Value_Current', keep='all')
+    top_20_negative_aggrid, top_20_positive_aggrid = tails(final_display_df, 'Macro_DVaR_Value_Current', 20, keep='all')
+    top_20_negative_aggrid, top_20_positive_aggrid = top_20_negative_aggrid.copy(), top_20_positive_aggrid.copy()
 
     top_20_positive_aggrid['Date'] = top_20_positive_aggrid['Date'].dt.strftime('%Y-%m-%d')
     top_20_negative_aggrid['Date'] = top_20_negative_aggrid['Date'].dt.strftime('%Y-%m-%d')
@@ -510,8 +381,9 @@ def get_top_bottom_tails():
 
 @app.route('/get_dvar_trends_plot', methods=['GET'])
 def get_dvar_trends_plot():
-    macro_dvar_curr = processed_data_store.get('macro_dvar_curr', pd.DataFrame())
-    macro_dvar_prev = processed_data_store.get('macro_dvar_prev', pd.DataFrame())
+    results = get_processed_results()
+    macro_dvar_curr = results.get('macro_dvar_curr', pd.DataFrame())
+    macro_dvar_prev = results.get('macro_dvar_prev', pd.DataFrame())
 
     if macro_dvar_curr.empty and macro_dvar_prev.empty:
         return jsonify({'error': 'No DVaR data available for trends plot.'}), 400
@@ -522,10 +394,13 @@ def get_dvar_trends_plot():
 
     all_macro_dvar['Date'] = pd.to_datetime(all_macro_dvar['Date'])
 
-    plot = create_dvar_trends_bokeh_plot(all_macro_dvar, "Macro DVaR Trend (Current vs. Previous Day)", 'Macro_DVaR_Value')
+    # built and serialized once per processed workbook; later requests reuse the same item
+    key, _ = current_results_key()
+    plot = CHARTS.item(f"{key}-dvar_trends", lambda: create_dvar_trends_bokeh_plot(
+        all_macro_dvar, "Macro DVaR Trend (Current vs. Previous Day)", 'Macro_DVaR_Value'), "dvar_trends_plot_div")
     
     if plot:
-        return jsonify(json_item(plot, "dvar_trends_plot_div")), 200
+        return jsonify(plot), 200
     else:
         return jsonify({'error': 'Failed to create Bokeh plot.'}), 500
 
@@ -1,3 +1,4 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -7,6 +8,10 @@ from bokeh.models import ColumnDataSource, NumeralTickFormatter, DatetimeTickFor
 from bokeh.embed import json_item # Not directly used for st.bokeh_chart, but useful for debugging Bokeh plots
 from bokeh.palettes import Category10, Category20 
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, DataReturnMode, JsCode
+from tail_select import tails
+from tail_excel import pnl_date_map
+from tail_store import CACHE_DIRNAME, open_tail_workbook
+from tail_chart import CHARTS, chart_data, fingerprint
 
 # --- Configuration (UPDATE THESE BASED ON YOUR DATA) ---
 CURRENT_DAY_SHEET_NAME = "DVaR_COB"
@@ -24,6 +29,9 @@ DVAR_PNL_VECTOR_END = 520
 SVAR_PNL_VECTOR_START = 1
 SVAR_PNL_VECTOR_END = 260
 
+# Columnar copies of uploaded workbooks (tail_store), keyed by file content
+TAIL_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', CACHE_DIRNAME)
+
 # Define Barclays-specific color palette for Bokeh plots and AgGrid styling
 BARCLAYS_COLOR_PALETTE = [
     '#0076B6',  # Primary Blue (used for trends, main elements)
@@ -74,60 +82,34 @@ def load_data(file_buffer, debug_mode):
         SVAR_PREV_COB_SHEET_NAME
     ]
 
+    try:
+        # memory-mapped columnar copy of the upload (tail_store); the .xlsx is parsed once per distinct file
+        book = open_tail_workbook(file_buffer, sheets=sheets_to_load, root=TAIL_CACHE_DIR)
+    except Exception as e:
+        print(f"ERROR: Failed to read workbook: {e}. Check file format.")
+        return None, None # Indicate error
+
     for sheet_name in sheets_to_load:
         if debug_mode:
             print(f"DEBUG: Loading Sheet: {sheet_name}") # Use print for console output in Streamlit
-        try:
-            # Using pd.ExcelFile context manager for efficient multi-sheet reading
-            with pd.ExcelFile(file_buffer) as xls:
-                # Read the first two rows to get dates and column names
-                df_temp = pd.read_excel(xls, sheet_name=sheet_name, header=None, nrows=2)
-                
-                if df_temp.empty:
-                    print(f"ERROR: Sheet '{sheet_name}' is empty or could not be read.")
-                    return None, None # Indicate error
-                if len(df_temp) < 2:
-                    print(f"ERROR: Sheet '{sheet_name}' has fewer than 2 rows (expected dates in row 1, headers in row 2). Found {len(df_temp)} rows.")
-                    return None, None # Indicate error
-
-                dates_row = df_temp.iloc[0]
-                column_names_row = df_temp.iloc[1]
-
-                # Read the actual data, skipping the first two rows
-                df = pd.read_excel(xls, sheet_name=sheet_name, header=None, skiprows=2)
-                df.columns = column_names_row # Assign the second row as column headers
-                
-                # Drop columns that are entirely NaN after header adjustments (e.g., empty columns in Excel)
-                df = df.dropna(axis=1, how='all')
-
-                if 'Node' in df.columns:
-                    df['Node'] = pd.to_numeric(df['Node'], errors='coerce').astype('Int64')
-                else:
-                    if debug_mode:
-                        print(f"DEBUG: 'Node' column not found in sheet '{sheet_name}'. This might cause issues downstream.")
-
-                pnl_date_map = {}
-                for col_idx, col_name in enumerate(column_names_row):
-                    if pd.isna(col_name):
-                        continue
-                    if str(col_name).startswith('pnl_vector') or ('[T-2]' in str(col_name) and 'pnl_vector' in str(col_name)): 
-                        if col_idx < len(dates_row):
-                            date_val = dates_row.iloc[col_idx]
-                            if isinstance(date_val, (int, float)):
-                                try:
-                                    pnl_date_map[str(col_name)] = pd.to_datetime(date_val, unit='D', origin='1899-12-30')
-                                except:
-                                    pnl_date_map[str(col_name)] = pd.NaT
-                            else:
-                                pnl_date_map[str(col_name)] = pd.to_datetime(date_val, errors='coerce')
-                
-                data_frames[sheet_name] = df
-                date_mappings[sheet_name] = pnl_date_map
-
-        except Exception as e:
-            print(f"ERROR: Failed to process sheet '{sheet_name}': {e}. Check file format.")
+        sheet = book[sheet_name]
+        if not sheet.columns:
+            print(f"ERROR: Sheet '{sheet_name}' is empty or could not be read.")
             return None, None # Indicate error
-    
+
+        df = sheet.frame()
+        # Drop columns that are entirely NaN after header adjustments (e.g., empty columns in Excel)
+        df = df.dropna(axis=1, how='all')
+
+        if 'Node' in df.columns:
+            df['Node'] = pd.to_numeric(df['Node'], errors='coerce').astype('Int64')
+        else:
+            if debug_mode:
+                print(f"DEBUG: 'Node' column not found in sheet '{sheet_name}'. This might cause issues downstream.")
+
+        data_frames[sheet_name] = df
+        date_mappings[sheet_name] = pnl_date_map(sheet)
+
     return data_frames, date_mappings
 
 
@@ -279,24 +261,36 @@ def create_bokeh_line_chart(df, title, y_column, legend_title="Type", colors=BAR
         return
 
     df['Date'] = pd.to_datetime(df['Date'])
-    
+    extra = ['Pnl_Vector_Rank'] if 'Pnl_Vector_Rank' in df.columns else []
+    columns = ['Date', y_column, legend_title] + extra
+    # same data as an earlier rerun: reuse its source arrays, but build a new figure for this session
+    key = fingerprint(y_column, legend_title, df[columns])
+    views = CHARTS.get_or_build(key, lambda: line_chart_data(df[columns], y_column, legend_title))
+    st.bokeh_chart(build_bokeh_line_chart(views, title, y_column, legend_title, colors), use_container_width=True)
+
+def line_chart_data(df, y_column, legend_title):
+    """(type, source data) per unique ``legend_title`` value, in order of appearance."""
+    extra = ['Pnl_Vector_Rank'] if 'Pnl_Vector_Rank' in df.columns else []
+    # only the plotted columns, as typed arrays, min/max-decimated past tail_chart.MAX_POINTS rows
+    return [(chart_type, chart_data(df[df[legend_title] == chart_type], 'Date', [y_column], extra))
+            for chart_type in df[legend_title].unique()]
+
+def build_bokeh_line_chart(views, title, y_column, legend_title, colors):
     p = figure(
         height=350, 
         sizing_mode="stretch_width", 
         title=title,
         x_axis_type="datetime",
-        tools="pan,wheel_zoom,box_zoom,reset,save,hover",
+        tools="pan,wheel_zoom,box_zoom,reset,save",
         active_drag="pan",
         active_scroll="wheel_zoom"
     )
 
-    # Determine unique types for coloring (e.g., 'current', 'previous')
-    unique_types = df[legend_title].unique()
-    
-    for i, chart_type in enumerate(unique_types):
-        view = ColumnDataSource(df[df[legend_title] == chart_type])
+    # one line per type (e.g., 'current', 'previous')
+    for i, (chart_type, data) in enumerate(views):
+        view = ColumnDataSource(data)
         color_index = i % len(colors) # Cycle through colors if more types than defined colors
-        p.line(
+        line = p.line(
             x='Date', 
             y=y_column, 
             source=view, 
@@ -304,7 +298,7 @@ def create_bokeh_line_chart(df, title, y_column, legend_title="Type", colors=BAR
             line_color=colors[color_index],
             line_width=2
         )
-        p.circle(
+        dots = p.circle(
             x='Date', 
             y=y_column, 
             source=view, 
@@ -314,25 +308,23 @@ def create_bokeh_line_chart(df, title, y_column, legend_title="Type", colors=BAR
             legend_label=chart_type
         )
 
+        # Define hover tooltips based on available columns; the type is fixed per renderer
+        tooltips_list = [
+            ("Date", "@Date{%d-%m-%Y}"),
+            (y_column, f"@{y_column}{{0,0.00}}"),
+            (legend_title, str(chart_type))
+        ]
+        if 'Pnl_Vector_Rank' in data:
+            tooltips_list.append(("P&L Vector Rank", "@Pnl_Vector_Rank"))
+        p.add_tools(HoverTool(renderers=[line, dots], tooltips=tooltips_list, formatters={"@Date": "datetime"}))
+
     p.xaxis.formatter = DatetimeTickFormatter(days="%d-%m-%Y", months="%d-%m-%Y", years="%d-%m-%Y")
     p.xaxis.axis_label = "Date"
     p.yaxis.formatter = NumeralTickFormatter(format="0,0.00")
     p.yaxis.axis_label = y_column
     p.legend.location = "top_left"
     p.legend.click_policy = "hide"
-
-    # Define hover tooltips based on available columns
-    tooltips_list = [
-        ("Date", "@Date{%d-%m-%Y}"),
-        (y_column, f"@{y_column}{{0,0.00}}"),
-        (legend_title, f"@{legend_title}")
-    ]
-    if 'Pnl_Vector_Rank' in df.columns:
-        tooltips_list.append(("P&L Vector Rank", "@Pnl_Vector_Rank"))
-    
-    p.add_tools(HoverTool(tooltips=tooltips_list, formatters={"@Date": "datetime"}))
-
-    st.bokeh_chart(p, use_container_width=True)
+    return p
 
 def create_bokeh_stacked_area_chart(df, title, colors=BARCLAYS_COLOR_PALETTE):
     """Generates a Bokeh stacked area chart for DVaR contributions."""
@@ -661,8 +653,8 @@ def display_top_bottom_tails_table(macro_dvar_curr, macro_dvar_prev, fx_dvar_cur
         return # Exit function if no data
 
     # Get top 20 positive and negative Macro DVaR values from current COB
-    top_20_positive_curr = macro_dvar_curr.nlargest(min(20, len(macro_dvar_curr)), 'Macro_DVaR_Value', keep='all').copy()
-    top_20_negative_curr = macro_dvar_curr.nsmallest(min(20, len(macro_dvar_curr)), 'Macro_DVaR_Value', keep='all').copy()
+    top_20_negative_curr, top_20_positive_curr = tails(macro_dvar_curr, 'Macro_DVaR_Value', 20, keep='all')
+    top_20_negative_curr, top_20_positive_curr = top_20_negative_curr.copy(), top_20_positive_curr.copy()
 
     # Combine these identified top/bottom tails into a single DataFrame for processing
     # This DataFrame will be the base for our final table, ensuring we only analyze these specific tails
@@ -762,8 +754,8 @@ def display_top_bottom_tails_table(macro_dvar_curr, macro_dvar_prev, fx_dvar_cur
         print(final_display_df.columns.tolist())
 
     # --- Step 5: Prepare data for AgGrid display (re-select top/bottom from final_display_df) ---
-    top_20_positive_aggrid = final_display_df.nlargest(min(20, len(final_display_df)), 'Macro_DVaR_Value_Current', keep='all').copy()
-    top_20_negative_aggrid = final_display_df.nsmallest(min(20, len(final_display_df)), 'Macro_DVaR_Value_Current', keep='all').copy()
+    top_20_negative_aggrid, top_20_positive_aggrid = tails(final_display_df, 'Macro_DVaR_Value_Current', 20, keep='all')
+    top_20_negative_aggrid, top_20_positive_aggrid = top_20_negative_aggrid.copy(), top_20_positive_aggrid.copy()
 
 
     columnDefs = [
@@ -8,6 +8,10 @@ from datetime import datetime, timedelta
 from bokeh.plotting import figure
 from bokeh.models import HoverTool, ColumnDataSource, NumeralTickFormatter
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
+from tail_agg import NODE_MAP, summary_frame
+from tail_select import report_ranks, tail_table, tails
+from tail_store import open_tail_workbook
+from tail_chart import CHARTS, chart_data, fingerprint
 
 # --- Page Configuration and Styling ---
 st.set_page_config(
@@ -84,35 +88,22 @@ def process_data_file(file_path):
     Main function to process the selected Excel file. Reads all sheets, performs
     aggregations, and creates all final dataframes exactly as specified.
     """
+    try:
+        # memory-mapped columnar copy of the workbook (tail_store); converted from the .xlsx on first use
+        book = open_tail_workbook(file_path)
+    except Exception as e:
+        st.error(f"Could not read '{os.path.basename(file_path)}'. Error: {e}")
+        return None
+
     def read_sheet(sheet_name):
-        try:
-            date_map_df = pd.read_excel(file_path, sheet_name=sheet_name, nrows=1, header=None)
-            raw_df = pd.read_excel(file_path, sheet_name=sheet_name, header=1)
-            date_map = dict(zip(raw_df.columns, date_map_df.iloc[0]))
-            pnl_cols = [col for col in raw_df.columns if 'pnl_vector' in str(col)]
-            return raw_df, date_map, pnl_cols
-        except Exception as e:
-            st.error(f"Could not read sheet '{sheet_name}'. Error: {e}")
-            return None, None, None
-
-    def create_summary_df(sheet_name, node_map={10: "FX", 22194: "Rates", 1373254: "EM Macro"}):
+        sheet = book[sheet_name]
+        return sheet.frame(), sheet.date_map, sheet.pnl_cols
+
+    def create_summary_df(sheet_name, node_map=NODE_MAP):
         raw_df, date_map, pnl_vectors = read_sheet(sheet_name)
         if raw_df is None: return None
-        
-        long_df = pd.melt(raw_df, id_vars=["Node"], value_vars=pnl_vectors, var_name="Pnl_Vector", value_name="Value")
-        long_df["Asset_Class"] = long_df["Node"].map(node_map)
-        summary = long_df.groupby(["Pnl_Vector", "Asset_Class"])["Value"].sum().reset_index()
-        pivot_df = summary.pivot_table(index="Pnl_Vector", columns="Asset_Class", values="Value").fillna(0)
-        
-        pivot_df["Macro"] = pivot_df.sum(axis=1)
-        pivot_df["Date"] = pivot_df.index.map(date_map)
-        pivot_df["P&L Vector No"] = pivot_df.index.str.extract(r'(\d+)').astype(int)
-        
-        # FIX: Add the requested internal rank column based on Macro value
-        pivot_df['Macro Rank'] = pivot_df['Macro'].rank(method='first', ascending=True).astype(int)
-        
-        pivot_df.drop_duplicates(subset=['P&L Vector No'], keep='first', inplace=True)
-        return pivot_df.reset_index()
+        # per-asset sums as one (asset x row) @ (row x vector) product, no long-format melt
+        return summary_frame(raw_df, date_map, pnl_vectors, node_map)
 
     dvar_cob_df = create_summary_df("DVaR_COB")
     dvar_prev_cob_df = create_summary_df("DVaR_Prev_COB")
@@ -122,37 +113,25 @@ def process_data_file(file_path):
     if any(df is None for df in [dvar_cob_df, dvar_prev_cob_df, svar_cob_df, svar_prev_cob_df]): return None
 
     def create_top_20_comparison_df(cob_df, prev_cob_df):
-        top_20_neg = cob_df.sort_values("Macro", ascending=True).head(20).copy()
-        top_20_pos = cob_df.sort_values("Macro", ascending=False).head(20).copy()
-        
-        top_20_neg['COB Rank'] = range(1, len(top_20_neg) + 1)
-        top_20_pos['COB Rank'] = range(260, 260 - len(top_20_pos), -1)
+        # shared rank/migration table; COB Rank keeps the report labels (1..20 and 260..241)
+        assets = ["Rates", "FX", "EM Macro"]
+        top = tail_table(cob_df, prev_cob_df, "Macro", 20, prev_cols=[c for c in assets if c in prev_cob_df.columns])
 
-        combined_top = pd.concat([top_20_neg, top_20_pos])
-        comparison = pd.merge(combined_top, prev_cob_df, on="P&L Vector No", how="left", suffixes=('_COB', '_PrevCOB'))
-        
-        for col in ["Macro", "Rates", "FX", "EM Macro"]:
-            if f'{col}_COB' in comparison.columns and f'{col}_PrevCOB' in comparison.columns:
-                 comparison[f'Diff_{col}'] = comparison[f'{col}_COB'] - comparison[f'{col}_PrevCOB']
-        
         final_df = pd.DataFrame()
-        final_df["COB Rank"] = comparison["COB Rank"]
-        final_df["COB P&L Vector No"] = comparison["P&L Vector No"]
-        final_df["Date"] = comparison["Date_COB"]
-        final_df["Macro"] = comparison.get("Macro_COB")
-        final_df["Rates"] = comparison.get("Rates_COB")
-        final_df["FX"] = comparison.get("FX_COB")
-        final_df["EM Macro"] = comparison.get("EM Macro_COB")
-        final_df["Prev Cob Rank"] = comparison.get("Macro Rank_PrevCOB")
-        final_df["Prev COB P&L Vector No"] = comparison.get("P&L Vector No")
-        final_df["Macro "] = comparison.get("Macro_PrevCOB")
-        final_df["Rates "] = comparison.get("Rates_PrevCOB")
-        final_df["FX "] = comparison.get("FX_PrevCOB")
-        final_df["EM Macro "] = comparison.get("EM Macro_PrevCOB")
-        final_df["Macro  "] = comparison.get("Diff_Macro")
-        final_df["Rates  "] = comparison.get("Diff_Rates")
-        final_df["FX  "] = comparison.get("Diff_FX")
-        final_df["EM Macro  "] = comparison.get("Diff_EM Macro")
+        final_df["COB Rank"] = report_ranks(top)
+        final_df["COB P&L Vector No"] = top["P&L Vector No"]
+        final_df["Date"] = top["Date"]
+        final_df["Macro"] = top["Macro"]
+        for col in assets:
+            final_df[col] = top.get(col)
+        final_df["Prev Cob Rank"] = top["Prev Rank"]
+        final_df["Prev COB P&L Vector No"] = top["P&L Vector No"]
+        final_df["Macro "] = top["Prev Macro"]
+        for col in assets:
+            final_df[f"{col} "] = top.get(f"Prev {col}")
+        final_df["Macro  "] = top["Macro"] - top["Prev Macro"]
+        for col in assets:
+            final_df[f"{col}  "] = top[col] - top[f"Prev {col}"] if col in top and f"Prev {col}" in top else None
 
         return final_df.sort_values(by="COB Rank").reset_index(drop=True)
 
@@ -162,8 +141,7 @@ def process_data_file(file_path):
         
         merged_df['Diff'] = merged_df['Macro_COB'] - merged_df['Macro_PrevCOB']
         
-        top_20_neg_changes = merged_df.sort_values("Diff", ascending=True).head(20)
-        top_20_pos_changes = merged_df.sort_values("Diff", ascending=False).head(20)
+        top_20_neg_changes, top_20_pos_changes = tails(merged_df, "Diff", 20)
         
         combined_changes = pd.concat([top_20_neg_changes, top_20_pos_changes])
         if combined_changes.empty: return pd.DataFrame()
@@ -255,16 +233,22 @@ def display_aggrid(df):
         fit_columns_on_grid_load=True
     )
 
-def create_bokeh_chart(cob_df, prev_cob_df, title):
-    if cob_df is None or prev_cob_df is None or cob_df.empty or prev_cob_df.empty:
-        p = figure(height=400, title=f"{title} - No Data Available", sizing_mode="stretch_width")
-        return p
-    source_df = pd.merge(cob_df, prev_cob_df, on='P&L Vector No', how="inner", suffixes=('_COB', '_PrevCOB'))
+CHART_COLUMNS = ["P&L Vector No", "Date", "Macro"]  # of the COB frame; the PrevCOB one only adds its Macro
+
+def bokeh_chart_data(cob_df, prev_cob_df):
+    """Source data of the COB vs PrevCOB chart; empty when no vector is in both frames."""
+    source_df = pd.merge(cob_df[CHART_COLUMNS], prev_cob_df[["P&L Vector No", "Macro"]], on='P&L Vector No', how="inner", suffixes=('_COB', '_PrevCOB'))
     if source_df.empty:
+        return {}
+    source_df['Date_COB_dt'] = pd.to_datetime(source_df['Date'], errors='coerce')
+    # only the plotted columns, as typed arrays, min/max-decimated past tail_chart.MAX_POINTS vectors
+    return chart_data(source_df, 'P&L Vector No', ['Macro_COB', 'Macro_PrevCOB'], ['Date_COB_dt'])
+
+def build_bokeh_chart(data, title):
+    if not data:
         p = figure(height=400, title=f"{title} - No Matching P&L Vectors to Compare", sizing_mode="stretch_width")
         return p
-    source_df['Date_COB_dt'] = pd.to_datetime(source_df['Date_COB'], errors='coerce')
-    source = ColumnDataSource(source_df)
+    source = ColumnDataSource(data)
     p = figure(height=400, x_axis_label="P&L Vector No", y_axis_label="Value", title=title, sizing_mode="stretch_width", tools="pan,wheel_zoom,box_zoom,reset,save")
     p.yaxis.formatter = NumeralTickFormatter(format="0,0.00a")
     p.line(x='P&L Vector No', y='Macro_COB', source=source, legend_label="Macro COB", color="dodgerblue", width=2.5, alpha=0.8)
@@ -276,6 +260,14 @@ def create_bokeh_chart(cob_df, prev_cob_df, title):
     p.legend.click_policy = "hide"
     return p
 
+def create_bokeh_chart(cob_df, prev_cob_df, title):
+    """The COB vs PrevCOB chart: a new figure per call, over source data reused while it is unchanged."""
+    if cob_df is None or prev_cob_df is None or cob_df.empty or prev_cob_df.empty:
+        p = figure(height=400, title=f"{title} - No Data Available", sizing_mode="stretch_width")
+        return p
+    key = fingerprint(title, cob_df[CHART_COLUMNS], prev_cob_df[["P&L Vector No", "Macro"]])
+    return build_bokeh_chart(CHARTS.get_or_build(key, lambda: bokeh_chart_data(cob_df, prev_cob_df)), title)
+
 # --- MAIN APP ---
 def main():
     st.title("📊 Tail Analysis Dashboard")
@@ -0,0 +1,88 @@
+"""Per-asset-class P&L vector sums for the Tail dashboards, as one matrix product.
+
+A tail sheet is a few hundred sensitivity rows by a few hundred ``pnl_vector`` columns. Summing
+the vectors per asset class used to melt the sheet to long form and groupby/pivot it back. Here
+the vector block stays a 2-D float64 array and each asset class is one row of a one-hot
+(asset x sheet row) matrix, so ``onehot @ pnl`` gives every asset's sums in a single BLAS call.
+
+Shared by the Streamlit (tail.py), Flask and updates_tail.py front ends.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+# Node id -> asset class for the tail report nodes
+NODE_MAP = {10: "FX", 22194: "Rates", 1373254: "EM Macro"}
+
+def pnl_columns(columns) -> List:
+    """The P&L vector columns of a sheet, in sheet order."""
+    return [c for c in columns if "pnl_vector" in str(c)]
+
+def vector_numbers(names) -> np.ndarray:
+    """Vector number of each column name ('pnl_vector12[T-2]' -> 12): the first run of digits."""
+    return pd.Series([str(n) for n in names], dtype=object).str.extract(r"(\d+)", expand=False).astype(int).to_numpy()
+
+def node_onehot(nodes, node_map:Dict=NODE_MAP, assets:Optional[Sequence[str]]=None) -> Tuple[List[str], np.ndarray]:
+    """Asset classes and the (asset x row) 0/1 matrix assigning each sheet row to one.
+
+    By default the asset classes are the ones present, sorted; pass ``assets`` to fix the rows
+    (absent ones are all zero). Rows whose node is not in ``node_map`` get an all-zero column,
+    i.e. they are dropped.
+    """
+    labels = pd.Series(np.asarray(nodes)).map(node_map)
+    if assets is None:
+        codes, assets = pd.factorize(labels, sort=True)
+    else:
+        codes = pd.Categorical(labels, categories=list(assets)).codes
+    onehot = np.zeros((len(assets), len(codes)), dtype=np.float64)
+    rows = np.flatnonzero(codes >= 0)
+    onehot[codes[rows], rows] = 1.0
+    return [str(a) for a in assets], onehot
+
+def asset_sums(raw_df:pd.DataFrame, pnl_cols:Optional[Sequence]=None, node_map:Dict=NODE_MAP,
+               node_col:str="Node") -> pd.DataFrame:
+    """Pnl_Vector x Asset_Class sums of a sheet.
+
+    Same frame as melting to (Node, Pnl_Vector, Value), mapping nodes, summing per
+    (Pnl_Vector, Asset_Class) and pivoting back: vectors in lexicographic name order, asset
+    classes alphabetical, missing values counted as 0 and unmapped nodes left out.
+    """
+    pnl_cols = pnl_columns(raw_df.columns) if pnl_cols is None else list(pnl_cols)
+    assets, onehot = node_onehot(raw_df[node_col], node_map)
+    names = sorted(pnl_cols, key=str)
+    index = pd.Index(names, name="Pnl_Vector")
+    if not assets:
+        return pd.DataFrame(index=index[:0], columns=pd.Index([], name="Asset_Class"), dtype=np.float64)
+    pnl = raw_df[names].to_numpy(dtype=np.float64, na_value=0.0)
+    sums = onehot @ pnl
+    return pd.DataFrame(sums.T, index=index, columns=pd.Index(assets, name="Asset_Class"))
+
+def summary_frame(raw_df:pd.DataFrame, date_map:Dict, pnl_cols:Optional[Sequence]=None,
+                  node_map:Dict=NODE_MAP) -> pd.DataFrame:
+    """One row per P&L vector: asset-class sums, Macro total, date, vector number and Macro rank."""
+    out = asset_sums(raw_df, pnl_cols, node_map)
+    out["Macro"] = out.sum(axis=1)
+    out["Date"] = out.index.map(date_map)
+    out["P&L Vector No"] = vector_numbers(out.index)
+    out["Macro Rank"] = out["Macro"].rank(method="first", ascending=True).astype(int)
+    out = out.drop_duplicates(subset=["P&L Vector No"], keep="first")
+    return out.reset_index()
+
+def vector_table(df:pd.DataFrame, max_vector:int, node_map:Dict=NODE_MAP, node_col:str="Node") -> pd.DataFrame:
+    """``rank, pnl_vector, <asset classes...>, Macro`` for each of pnl_vector1..max_vector present.
+
+    Asset columns follow the order of ``node_map`` (every mapped class gets a column, 0 if it has
+    no rows) and Macro is their sum. Every vector is reduced in the same matrix product.
+    """
+    assets = list(dict.fromkeys(node_map.values()))
+    present = set(df.columns)
+    ranks = [i for i in range(1, max_vector + 1) if f"pnl_vector{i}" in present]
+    names = [f"pnl_vector{i}" for i in ranks]
+    _, onehot = node_onehot(df[node_col], node_map, assets)
+    sums = onehot @ df[names].to_numpy(dtype=np.float64, na_value=0.0)
+
+    out = pd.DataFrame({"rank": ranks, "pnl_vector": names})
+    for asset, row in zip(assets, sums):
+        out[asset] = row
+    out["Macro"] = sums.sum(axis=0)
+    return out
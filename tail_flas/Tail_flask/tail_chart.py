@@ -0,0 +1,149 @@
+"""Chart data for the Tail Bokeh charts: only the plotted columns, as typed arrays, decimated.
+
+The charts used to hand whole merged frames to ``ColumnDataSource``: every column went into the
+document, and text, object and nullable columns were serialized as JSON lists. Then the whole
+document was rebuilt and re-serialized on every Streamlit rerun. This module builds the sources
+a different way:
+
+* ``chart_data`` keeps only the x, y and tooltip columns. Each one becomes a contiguous
+  float64 or int32 array, and dates become float64 milliseconds. Those are the dtypes Bokeh
+  (2.4 and 3.x) sends as base64 binary buffers rather than one JSON number per point.
+* ``minmax_indices`` thins a series longer than ``max_points`` to the first and last points
+  plus the min and max of each bucket. A tail spike is always kept, however many vectors
+  share a pixel. Series that share one source keep the union of their rows, so lines stay
+  aligned on x.
+* ``ChartCache`` keeps the ``chart_data`` of each chart, keyed by a fingerprint of the frames it
+  came from, so a rerun with the same data skips the merge, typing and decimation. It never
+  keeps a figure. ``CHARTS`` is shared by every Streamlit session, and ``json_item`` themes the
+  document it serializes while it runs. A figure shared by two sessions could be serialized
+  with the other session's theme half applied, so each call builds a new figure over the cached
+  arrays. ``ColumnDataSource`` copies the dict it is given, and nothing writes to the arrays.
+  ``ChartCache.item`` keeps the ``json_item`` output instead, so a Flask request for an unchanged
+  chart skips serialization altogether.
+"""
+import hashlib, threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Sequence
+import numpy as np
+import pandas as pd
+from bokeh.embed import json_item
+
+MAX_POINTS = 2000  # per series, after decimation
+
+_INT32 = np.iinfo(np.int32)
+
+def column(values) -> np.ndarray:
+    """``values`` as a contiguous array in a dtype Bokeh sends in binary.
+
+    Integers that fit become int32. Dates become float64 ms since the epoch, with NaT as NaN.
+    Everything numeric else, including nullable integers with NA, becomes float64."""
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(s):
+        if s.dt.tz is not None:
+            s = s.dt.tz_convert(None)
+        ns = s.to_numpy(dtype="datetime64[ns]")
+        out = ns.astype(np.int64).astype(np.float64) / 1e6
+        out[np.isnat(ns)] = np.nan
+        return out
+    if pd.api.types.is_integer_dtype(s) and not s.isna().any():
+        arr = s.to_numpy(dtype=np.int64)
+        if len(arr) == 0 or (arr.min() >= _INT32.min and arr.max() <= _INT32.max):
+            return np.ascontiguousarray(arr, dtype=np.int32)
+    if pd.api.types.is_bool_dtype(s) and not s.isna().any():
+        return s.to_numpy(dtype=np.int32)
+    return np.ascontiguousarray(pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan))
+
+def minmax_indices(y, max_points:int=MAX_POINTS) -> np.ndarray:
+    """Row positions of ``y`` to plot: all of them up to ``max_points``, else the first, the last
+    and the min and max of each of ``(max_points - 2) // 2`` equal-count buckets, in row order."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    buckets = max(1, (max_points - 2) // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.intp)[:-1]
+    bucket = np.repeat(np.arange(buckets), np.diff(np.append(edges, n)))
+    keep = [np.array([0, n - 1])]
+    with np.errstate(invalid="ignore"):
+        for reduce in (np.fmin, np.fmax):  # fmin/fmax skip NaN; an all-NaN bucket keeps nothing
+            extreme = reduce.reduceat(y, edges)
+            hit = np.flatnonzero(y == extreme[bucket])
+            keep.append(hit[np.unique(bucket[hit], return_index=True)[1]])  # first hit per bucket
+    return np.unique(np.concatenate(keep))
+
+def decimate(ys:Sequence, max_points:int=MAX_POINTS) -> Optional[np.ndarray]:
+    """Rows to keep so every series in ``ys`` keeps its spikes; None when nothing needs dropping."""
+    if not ys or len(ys[0]) <= max_points:
+        return None
+    return np.unique(np.concatenate([minmax_indices(y, max_points) for y in ys]))
+
+def chart_data(df:pd.DataFrame, x:str, ys:Sequence[str], extra:Sequence[str]=(),
+               max_points:int=MAX_POINTS) -> Dict[str, np.ndarray]:
+    """``ColumnDataSource`` data with just ``x``, ``ys`` and ``extra`` (tooltip) columns of ``df``,
+    typed by ``column`` and min/max-decimated on the ``ys``."""
+    data = {name: column(df[name]) for name in dict.fromkeys([x, *ys, *extra]) if name in df.columns}
+    rows = decimate([data[y] for y in ys if y in data], max_points)
+    if rows is not None:
+        data = {name: values[rows] for name, values in data.items()}
+    return data
+
+def fingerprint(*parts) -> str:
+    """Hash of the arrays, frames and plain values a chart is built from."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            h.update(str(list(part.columns)).encode())
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        elif isinstance(part, pd.Series):
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray):
+            h.update(str(part.dtype).encode())
+            h.update(np.ascontiguousarray(part).tobytes())
+        else:
+            h.update(repr(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+class ChartCache:
+    """The last ``max_items`` chart sources (or ``json_item`` outputs), never figures."""
+
+    def __init__(self, max_items:int=32):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build:Callable):
+        """The value cached under ``key``, or ``build()``'s, kept unless it is None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = build()
+        if value is None:
+            return None
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+        return value
+
+    def item(self, key:str, build:Callable, target:Optional[str]=None) -> Optional[dict]:
+        """``json_item`` of the figure ``build()`` returns, serialized once per key and target.
+
+        The figure is dropped once serialized; only the JSON is shared between requests."""
+        def serialize():
+            fig = build()
+            return None if fig is None else json_item(fig, target)
+        return self.get_or_build(("item", key, target), serialize)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# shared by every session of a dashboard process
+CHARTS = ChartCache()
@@ -0,0 +1,224 @@
+"""SQLite schema, bulk loader and queries for the Tail Flask app.
+
+The app used to melt every sheet into long rows, ``to_sql`` them into one unindexed ``pnl_data``
+table with dates as text, and then run one f-string query per asset class. Here:
+
+* dates are integer keys (20250606), and the repeated labels (VaR type, sheet type, asset class,
+  currency, sensitivity type, load code, P&L vector) are dictionary-encoded into small lookup
+  tables, so a fact row is a handful of integers and one REAL;
+* ``pnl_value`` has a composite index on (var_type, sheet_type, asset_class, date), extended with
+  node / vector / value so the tail queries are answered from the index alone;
+* loading is one transaction of ``executemany`` batches in WAL mode, with the index rebuilt once
+  at the end instead of maintained row by row;
+* ``asset_values`` is a single parameterized GROUP BY for all asset classes of a (VaR type,
+  sheet type), pivoted in pandas into the per-asset and Macro frames the routes use.
+"""
+import sqlite3
+from itertools import islice
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from tail_excel import TailSheet, pnl_date_map
+
+SCHEMA_VERSION = 2
+DIMENSIONS = ("var_type", "sheet_type", "asset_class", "currency", "sensitivity_type", "load_code")
+# sheet column feeding each dictionary-encoded fact column
+DIMENSION_COLUMNS = {"var_type": "Var Type", "asset_class": "Asset class", "currency": "currency",
+                     "sensitivity_type": "sensitivity_type", "load_code": "load_code"}
+BATCH_ROWS = 50_000
+
+SCHEMA = "\n".join(
+    [f"CREATE TABLE IF NOT EXISTS {d} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);" for d in DIMENSIONS] + [
+    """CREATE TABLE IF NOT EXISTS pnl_vector (
+        id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, vector_no INTEGER);""",
+    "CREATE TABLE IF NOT EXISTS load_info (key TEXT PRIMARY KEY, value TEXT);",
+    """CREATE TABLE IF NOT EXISTS pnl_value (
+        var_type_id INTEGER REFERENCES var_type(id),
+        sheet_type_id INTEGER NOT NULL REFERENCES sheet_type(id),
+        asset_class_id INTEGER REFERENCES asset_class(id),
+        date_key INTEGER NOT NULL,
+        node INTEGER,
+        vector_id INTEGER NOT NULL REFERENCES pnl_vector(id),
+        currency_id INTEGER REFERENCES currency(id),
+        sensitivity_type_id INTEGER REFERENCES sensitivity_type(id),
+        load_code_id INTEGER REFERENCES load_code(id),
+        value REAL);""",
+])
+LOOKUP_INDEX = """CREATE INDEX IF NOT EXISTS pnl_value_lookup
+    ON pnl_value (var_type_id, sheet_type_id, asset_class_id, date_key, node, vector_id, value);"""
+FACT_COLUMNS = ("var_type_id", "sheet_type_id", "asset_class_id", "date_key", "node", "vector_id",
+                "currency_id", "sensitivity_type_id", "load_code_id", "value")
+
+def connect(path:str) -> sqlite3.Connection:
+    """Connection in WAL mode (readers don't block the loader) with the schema in place."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    ensure_schema(conn)
+    return conn
+
+def ensure_schema(conn:sqlite3.Connection):
+    if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+        return
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS pnl_data")  # the old long-format table
+        conn.executescript(SCHEMA + LOOKUP_INDEX)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def has_data(conn:sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM pnl_value LIMIT 1").fetchone() is not None
+
+def loaded_source(conn:sqlite3.Connection) -> Optional[str]:
+    """The ``source`` (e.g. workbook hash) passed to the last ``bulk_load``, if any."""
+    row = conn.execute("SELECT value FROM load_info WHERE key = 'source'").fetchone()
+    return row[0] if row else None
+
+def date_keys(dates) -> np.ndarray:
+    """yyyymmdd integer keys of datetimes (NaT -> 0)."""
+    d = pd.DatetimeIndex(dates)
+    keys = d.year * 10000 + d.month * 100 + d.day
+    return np.where(d.isna(), 0, keys).astype(np.int64)
+
+def key_dates(keys) -> pd.Series:
+    return pd.to_datetime(pd.Series(keys, dtype="Int64").astype(str), format="%Y%m%d")
+
+def _codes(conn:sqlite3.Connection, table:str, values) -> np.ndarray:
+    # dictionary-encode labels: new ones are added, NaN -> NULL (None)
+    labels = pd.Series(values, dtype=object)
+    labels = labels.where(labels.isna(), labels.astype(str))
+    codes, uniques = pd.factorize(labels)
+    if len(uniques) == 0:
+        return np.full(len(labels), None, dtype=object)
+    conn.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", [(u,) for u in uniques])
+    ids = dict(conn.execute(f"SELECT name, id FROM {table}"))
+    lookup = np.array([ids[u] for u in uniques] + [None], dtype=object)
+    return lookup[codes]  # code -1 (NaN) picks the trailing None
+
+def sheet_facts(sheet:TailSheet, var_type:str, sheet_type:str, vector_start:int, vector_end:int) -> dict:
+    """The (sheet row x P&L column) cells of one sheet that the app keeps, as column arrays.
+
+    Same selection as the old melt: columns ``vector_start..vector_end``, ``[T-2]`` ones only on
+    the previous-COB sheet, all-empty columns and columns without a date dropped.
+    """
+    previous = sheet_type == "previous"
+    dates = pnl_date_map(sheet)
+    keep, numbers = [], []
+    for i, col in enumerate(sheet.pnl_cols):
+        name = str(col)
+        if not name.startswith("pnl_vector") or ("[T-2]" in name) != previous:
+            continue
+        digits = "".join(filter(str.isdigit, name.split("[T-2]")[0]))
+        if digits and vector_start <= int(digits) <= vector_end and not pd.isna(dates.get(name)):
+            keep.append(i)
+            numbers.append(int(digits))
+    values = np.asarray(sheet.pnl[:, keep], dtype=np.float64)
+    present = ~np.isnan(values).all(axis=0) if len(values) else np.zeros(len(keep), dtype=bool)
+    keep = [k for k, p in zip(keep, present) if p]
+    numbers = [n for n, p in zip(numbers, present) if p]
+    values = values[:, present]
+    meta = {}
+    for dim, col in DIMENSION_COLUMNS.items():
+        meta[dim] = sheet.meta[col] if col in sheet.meta.columns and sheet.meta[col].notna().any() else None
+    if meta["var_type"] is None:
+        meta["var_type"] = pd.Series([var_type] * len(sheet.meta), dtype=object)
+    node = (pd.to_numeric(sheet.meta["Node"], errors="coerce").astype("Int64")
+            if "Node" in sheet.meta.columns else pd.Series(pd.NA, index=sheet.meta.index, dtype="Int64"))
+    return {"names": [str(sheet.pnl_cols[k]) for k in keep], "numbers": numbers,
+            "dates": date_keys([dates[str(sheet.pnl_cols[k])] for k in keep]),
+            "values": values, "node": node, "meta": meta, "sheet_type": sheet_type}
+
+def _fact_rows(conn:sqlite3.Connection, facts:dict) -> Iterable[Tuple]:
+    n, m = facts["values"].shape
+    if n == 0 or m == 0:
+        return iter(())
+    vec_ids = _codes(conn, "pnl_vector", facts["names"])
+    conn.executemany("UPDATE pnl_vector SET vector_no = ? WHERE id = ?", zip(facts["numbers"], vec_ids.tolist()))
+    sheet_type_id = _codes(conn, "sheet_type", [facts["sheet_type"]])[0]
+    per_row = [_codes(conn, dim, facts["meta"][dim]) if facts["meta"][dim] is not None else np.full(n, None, dtype=object)
+               for dim in ("var_type", "asset_class", "currency", "sensitivity_type", "load_code")]
+    var_ids, asset_ids, ccy_ids, sens_ids, load_ids = (np.tile(a, m).tolist() for a in per_row)
+    node = np.tile(facts["node"].astype(object).where(facts["node"].notna(), None).to_numpy(), m).tolist()
+    dates = np.repeat(facts["dates"], n).tolist()
+    vectors = np.repeat(vec_ids, n).tolist()
+    values = facts["values"].T.ravel().tolist()  # column by column, like the melt
+    return zip(var_ids, [sheet_type_id] * (n * m), asset_ids, dates, node, vectors, ccy_ids, sens_ids, load_ids, values)
+
+def bulk_load(conn:sqlite3.Connection, sheets:Sequence[dict], replace:bool=True, source:Optional[str]=None) -> int:
+    """Insert ``sheet_facts`` outputs in one transaction; ``replace`` empties the table first.
+
+    The lookup index is dropped for the load and rebuilt once at the end; ``source`` is recorded
+    for ``loaded_source``. Returns rows written.
+    """
+    placeholders = ", ".join("?" * len(FACT_COLUMNS))
+    insert = f"INSERT INTO pnl_value ({', '.join(FACT_COLUMNS)}) VALUES ({placeholders})"
+    written = 0
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DROP INDEX IF EXISTS pnl_value_lookup")
+        if replace:
+            conn.execute("DELETE FROM pnl_value")
+        for facts in sheets:
+            rows = _fact_rows(conn, facts)
+            while True:
+                batch = list(islice(rows, BATCH_ROWS))
+                if not batch:
+                    break
+                conn.executemany(insert, batch)
+                written += len(batch)
+        conn.execute(LOOKUP_INDEX)
+        conn.execute("INSERT OR REPLACE INTO load_info (key, value) VALUES ('source', ?)", (source,))
+    conn.execute("PRAGMA optimize")
+    return written
+
+def asset_values(conn:sqlite3.Connection, var_type:str, sheet_type:str, asset_nodes:Dict[str, int]) -> pd.DataFrame:
+    """Per (date, vector, asset class) sums for one VaR type and sheet type, in one query.
+
+    Only rows whose (asset class, node) pair is in ``asset_nodes`` count, as in the app's old
+    per-asset-class queries. Columns: Date, Pnl_Vector_Name, Pnl_Vector_Rank, Asset_Class, Value.
+    """
+    pairs = ", ".join(["(?, ?)"] * len(asset_nodes))
+    # aggregate on the fact columns alone, in index order (node is fixed per asset class, so
+    # grouping on it changes nothing), then attach labels to the few hundred groups
+    query = f"""
+        SELECT g.date_key, v.name, v.vector_no, a.name, g.total
+        FROM (SELECT asset_class_id, date_key, vector_id, SUM(value) AS total
+              FROM pnl_value
+              WHERE var_type_id = (SELECT id FROM var_type WHERE name = ?)
+                AND sheet_type_id = (SELECT id FROM sheet_type WHERE name = ?)
+                AND (asset_class_id, node) IN (
+                    SELECT a.id, p.column2 FROM asset_class a JOIN (VALUES {pairs}) p ON a.name = p.column1)
+              GROUP BY asset_class_id, date_key, node, vector_id) g
+        JOIN asset_class a ON a.id = g.asset_class_id
+        JOIN pnl_vector v ON v.id = g.vector_id
+        ORDER BY g.date_key, v.vector_no, a.name"""
+    params = [var_type, sheet_type] + [x for pair in asset_nodes.items() for x in pair]
+    rows = conn.execute(query, params).fetchall()
+    out = pd.DataFrame(rows, columns=["date_key", "Pnl_Vector_Name", "Pnl_Vector_Rank", "Asset_Class", "Value"])
+    out.insert(0, "Date", key_dates(out.pop("date_key")) if len(out) else pd.Series([], dtype="datetime64[ns]"))
+    out["Pnl_Vector_Rank"] = out["Pnl_Vector_Rank"].astype("Int64")
+    out["Value"] = out["Value"].astype(np.float64)
+    return out
+
+def var_frames(conn:sqlite3.Connection, var_type:str, sheet_type:str,
+               asset_nodes:Dict[str, int]) -> Tuple[Dict[str, pd.DataFrame], pd.DataFrame]:
+    """Per-asset frames ``{asset: Date, Pnl_Vector_Name, Pnl_Vector_Rank, <Asset>_<VaR>_Value}``
+    and the Macro frame (all vectors seen for any asset, missing assets as 0, ``Macro_<VaR>_Value``
+    and ``Sheet_Type``). The Macro frame is empty when there is no data for the first asset."""
+    keys = ["Date", "Pnl_Vector_Name", "Pnl_Vector_Rank"]
+    long = asset_values(conn, var_type, sheet_type, asset_nodes)
+    value_cols = {ac: f'{ac.replace(" ", "_")}_{var_type}_Value' for ac in asset_nodes}
+    frames = {}
+    for ac, col in value_cols.items():
+        part = long[long["Asset_Class"] == ac]
+        frames[ac] = part[keys].assign(**{col: part["Value"]}).reset_index(drop=True)
+    macro_col = f"Macro_{var_type}_Value"
+    first = next(iter(asset_nodes))
+    if frames[first].empty:
+        return frames, pd.DataFrame(columns=keys + [macro_col])
+    # one row per (date, vector) any asset has, like the old outer merges; absent assets count 0
+    wide = long.set_index(keys + ["Asset_Class"])["Value"].unstack("Asset_Class")
+    macro = wide.reindex(columns=list(asset_nodes)).fillna(0.0).rename(columns=value_cols).reset_index()
+    macro.columns.name = None
+    macro[macro_col] = macro[list(value_cols.values())].sum(axis=1)
+    macro["Sheet_Type"] = sheet_type
+    return frames, macro.sort_values(["Date", "Pnl_Vector_Rank"]).reset_index(drop=True)
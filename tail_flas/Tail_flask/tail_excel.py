@@ -0,0 +1,144 @@
+"""Read Tail_analysis_auto_*.xlsx workbooks with one open and one pass per sheet.
+
+The loaders used to call ``pd.read_excel`` twice per sheet (``nrows=1`` for the date row,
+``header=1`` for the body), and every call re-opened and re-parsed the whole .xlsx zip.
+``read_tail_workbook`` opens the workbook once (python-calamine when installed, else openpyxl
+read-only mode) and streams each sheet's rows a single time. The date row becomes the pnl_vector -> date map, the header row the
+column names, and the body is split into the id columns (a small DataFrame) and the P&L block
+(a float matrix that can go straight into tail_agg).
+"""
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+# --- Optional Rust reader; several times faster than openpyxl on large sheets ---
+try:
+    from python_calamine import CalamineWorkbook
+except Exception:
+    CalamineWorkbook = None
+
+SHEETS = ("DVaR_COB", "DVaR_Prev_COB", "SVaR_COB", "SVaR_Prev_COB")
+
+@dataclass
+class TailSheet:
+    name: str
+    columns: List            # header row, named the way pd.read_excel names it
+    meta: pd.DataFrame       # the non-P&L columns: Var Type, Node, Asset class, currency, ...
+    pnl_cols: List           # pnl_vector columns, sheet order
+    pnl: np.ndarray          # rows x pnl_cols
+    date_map: Dict           # column -> value of the date row above the header (empty if none)
+
+    def frame(self) -> pd.DataFrame:
+        """The sheet as ``pd.read_excel(header=header_row)`` returns it, P&L columns as floats."""
+        body = pd.DataFrame(self.pnl, columns=self.pnl_cols, index=self.meta.index)
+        return pd.concat([self.meta, body], axis=1)[self.columns]
+
+def _cell(v):
+    # the conversions pandas' openpyxl reader applies: empty -> NaN, integral floats -> int
+    if v is None:
+        return np.nan
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+def _column_names(header:Sequence) -> List:
+    names, seen = [], {}
+    for i, v in enumerate(header):
+        name = f"Unnamed: {i}" if v is None else _cell(v)
+        if name in seen:  # duplicate headers get .1, .2, ... like read_excel
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        names.append(name)
+    return names
+
+def _float_block(rows:List[tuple], idx:List[int], dtype) -> np.ndarray:
+    if not idx:
+        return np.empty((len(rows), 0), dtype=dtype)
+    if idx == list(range(idx[0], idx[-1] + 1)):
+        a, b = idx[0], idx[-1] + 1
+        block = [r[a:b] for r in rows]
+    else:
+        get = itemgetter(*idx)
+        block = [get(r) for r in rows] if len(idx) > 1 else [(r[idx[0]],) for r in rows]
+    try:
+        return np.array(block, dtype=dtype).reshape(len(rows), len(idx))
+    except (TypeError, ValueError):
+        # text in a P&L cell: coerce it to NaN, as pd.to_numeric(errors="coerce") would
+        return pd.DataFrame(block).apply(pd.to_numeric, errors="coerce").to_numpy(dtype=dtype, na_value=np.nan)
+
+def split_sheet(rows, name:str, header_row:int=1, dtype=np.float64) -> TailSheet:
+    """Split one sheet's streamed row tuples into date map, id columns and the P&L matrix.
+
+    Rows above ``header_row`` are read as the date row (the first of them); rows below it are
+    the body. Empty cells are None. Trailing empty rows are dropped, as read_excel does.
+    """
+    rows = iter(rows)
+    above = [next(rows, ()) for _ in range(header_row)]
+    columns = _column_names(next(rows, ()))
+    width = len(columns)
+    body = []
+    for r in rows:
+        r = tuple(r[:width]) + (None,) * (width - len(r))
+        body.append(r)
+    while body and all(v is None for v in body[-1]):
+        body.pop()
+
+    pnl_idx = [i for i, c in enumerate(columns) if "pnl_vector" in str(c)]
+    meta_idx = [i for i, c in enumerate(columns) if "pnl_vector" not in str(c)]
+    meta = pd.DataFrame({columns[i]: [_cell(r[i]) for r in body] for i in meta_idx}, index=pd.RangeIndex(len(body)))
+    date_map = dict(zip(columns, (_cell(v) for v in above[0]))) if above else {}
+    return TailSheet(name=name, columns=columns, meta=meta, pnl_cols=[columns[i] for i in pnl_idx],
+                     pnl=_float_block(body, pnl_idx, dtype), date_map=date_map)
+
+def pnl_date_map(sheet:TailSheet) -> Dict[str, pd.Timestamp]:
+    """pnl_vector column -> date from the date row; Excel serial numbers and date text both work."""
+    out = {}
+    for col in sheet.pnl_cols:
+        v = sheet.date_map.get(col, np.nan)
+        if isinstance(v, (int, float)):
+            try:
+                out[str(col)] = pd.to_datetime(v, unit="D", origin="1899-12-30")
+            except Exception:
+                out[str(col)] = pd.NaT
+        else:
+            out[str(col)] = pd.to_datetime(v, errors="coerce")
+    return out
+
+def _calamine_rows(sheet):
+    for r in sheet.to_python(skip_empty_area=False):
+        yield tuple(None if v == "" else v for v in r)
+
+def read_tail_workbook(path, sheets:Optional[Sequence[str]]=SHEETS, header_row:int=1,
+                       dtype=np.float64, engine:Optional[str]=None) -> Dict[str, TailSheet]:
+    """Every requested sheet of a tail workbook (path or file-like) from a single open.
+
+    ``sheets=None`` reads all of them; a missing sheet raises KeyError. ``engine`` is
+    "calamine" or "openpyxl" (default: calamine if installed). ``dtype=np.float32`` halves the
+    P&L matrices when full precision is not needed.
+    """
+    engine = engine or ("calamine" if CalamineWorkbook is not None else "openpyxl")
+    if engine == "calamine":
+        wb = CalamineWorkbook.from_path(path) if isinstance(path, str) else CalamineWorkbook.from_filelike(path)
+        names = wb.sheet_names if sheets is None else list(sheets)
+        out = {}
+        for name in names:
+            if name not in wb.sheet_names:
+                raise KeyError(f"Worksheet named '{name}' not found")
+            out[name] = split_sheet(_calamine_rows(wb.get_sheet_by_name(name)), name, header_row, dtype)
+        return out
+
+    wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        names = wb.sheetnames if sheets is None else list(sheets)
+        out = {}
+        for name in names:
+            if name not in wb.sheetnames:
+                raise KeyError(f"Worksheet named '{name}' not found")
+            out[name] = split_sheet(wb[name].iter_rows(values_only=True), name, header_row, dtype)
+        return out
+    finally:
+        wb.close()
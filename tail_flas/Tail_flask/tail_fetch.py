@@ -0,0 +1,322 @@
+"""Concurrent ICE tail report fetcher with warm sessions, backoff retries and per-report metrics.
+
+    python tail_fetch.py --out "C:/Users/x01489120/Downloads" --workers 2        # ICE via Excel
+    python tail_fetch.py --out /tmp/ice --canned canned/ --latency 2 --workers 4   # local stand-in
+
+``fetch_all_via_ice`` used to pull DVaR/SVaR x COB/Prev COB one after another, each in a freshly
+started hidden Excel with the ICE add-in registered, retrying with fixed sleeps. ``IceFetcher``
+runs the pulls on a bounded set of worker threads instead. Each worker opens one session when it
+gets its first report and keeps it warm for the rest, and closes it on the same thread, as COM
+requires. Failed calls are retried with exponential backoff (and the session restarted when
+retries run out). Every pull is recorded as a ``FetchResult`` with its latency, attempts and
+row count.
+
+Sessions are pluggable: ``XlwingsSession`` drives Excel + the ICE add-in on Windows;
+``CannedSession`` serves report payloads from memory or CSV files, so the scheduler runs on
+Linux too.
+"""
+import os, sys, time, queue, random, logging, argparse, threading
+from concurrent.futures import Future
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import pandas as pd
+
+# --- Optional Excel/COM bindings; only XlwingsSession needs them ---
+try:
+    import xlwings as xw
+except Exception:
+    xw = None
+try:
+    import pythoncom
+except Exception:
+    pythoncom = None
+
+XLL_PATH = r"C:/Program Files/Barclays Capital/ICE Excel ToolKit/Barclays.ICE.ExcelAddIn64.xll"
+REPORT_IDS = {"DVaR": 20455915, "SVaR": 20455936}
+LAG_COB = 1
+LAG_PREV = 2
+LAG_TAGS = {LAG_COB: "COB", LAG_PREV: "PrevCOB"}
+
+def report_file_name(var_type:str, lag:int) -> str:
+    """CSV name load_from_ice_latest expects, e.g. DVaR_PrevCOB.csv."""
+    return f"{var_type}_{LAG_TAGS.get(lag, f'lag{lag}')}.csv"
+
+class XlwingsSession:
+    """Hidden Excel with the ICE add-in registered; one per worker thread."""
+
+    def __init__(self, xll_path:str=XLL_PATH):
+        if xw is None:
+            raise RuntimeError("xlwings not available in this environment.")
+        self.app = None
+        self._com = pythoncom is not None
+        if self._com:
+            pythoncom.CoInitialize()
+        try:
+            self.app = xw.App(visible=False, add_book=False)
+            self.app.api.RegisterXLL(xll_path)
+        except BaseException:
+            self.close()  # kill the hidden Excel already started and undo CoInitialize
+            raise
+
+    def run(self, report_id:int, lag:int) -> List[list]:
+        arr = self.app.api.Run("Ice_Report_Legacy", int(report_id), "*", int(lag))
+        return [list(row) for row in (arr or [])]
+
+    def close(self):
+        """Kill Excel and undo CoInitialize; safe to call more than once."""
+        app, self.app = self.app, None
+        try:
+            if app is not None:
+                app.kill()
+        except Exception:
+            pass
+        if self._com:
+            self._com = False
+            pythoncom.CoUninitialize()
+
+class CannedSession:
+    """Local stand-in for the ICE call: serves ``payloads[(report_id, lag)]`` (header row first).
+
+    ``startup`` / ``latency`` seconds simulate Excel start-up and the ICE round trip; the first
+    ``fail_first`` calls per report raise, to exercise the retries.
+    """
+    _count_lock = threading.Lock()
+
+    def __init__(self, payloads:Dict[Tuple[int, int], List[list]], latency:float=0.0, startup:float=0.0,
+                 fail_first:int=0, _failures:Optional[dict]=None):
+        time.sleep(startup)
+        self.payloads = payloads
+        self.latency = latency
+        self.fail_first = fail_first
+        self._failures = {} if _failures is None else _failures
+
+    @classmethod
+    def factory(cls, payloads, **kwargs) -> Callable[[], "CannedSession"]:
+        failures = {}  # shared by every session of the factory, like a flaky upstream
+        return lambda: cls(payloads, _failures=failures, **kwargs)
+
+    @staticmethod
+    def load_dir(folder:str, report_ids:Dict[str, int]=REPORT_IDS) -> Dict[Tuple[int, int], List[list]]:
+        """Payloads from CSVs named like the fetcher's output (DVaR_COB.csv, SVaR_PrevCOB.csv, ...)."""
+        payloads = {}
+        for var_type, report_id in report_ids.items():
+            for lag in LAG_TAGS:
+                path = os.path.join(folder, report_file_name(var_type, lag))
+                if os.path.exists(path):
+                    df = pd.read_csv(path)
+                    payloads[(report_id, lag)] = [list(df.columns)] + df.values.tolist()
+        return payloads
+
+    def run(self, report_id:int, lag:int) -> List[list]:
+        key = (int(report_id), int(lag))
+        with self._count_lock:
+            n = self._failures[key] = self._failures.get(key, 0) + 1
+        time.sleep(self.latency)
+        if n <= self.fail_first:
+            raise RuntimeError(f"canned failure {n} for report {report_id} lag {lag}")
+        if key not in self.payloads:
+            raise KeyError(f"no canned payload for report {report_id} lag {lag}")
+        return self.payloads[key]
+
+    def close(self):
+        pass
+
+@dataclass
+class FetchResult:
+    var_type: str
+    lag: int
+    path: Optional[str] = None
+    rows: int = 0
+    attempts: int = 0
+    seconds: float = 0.0          # queue to written, retries included
+    ice_seconds: float = 0.0      # the successful ICE call alone
+    session_seconds: float = 0.0  # session start-up paid by this pull (0 when warm)
+    error: Optional[str] = None
+
+def backoff_delays(retries:int, base:float, factor:float=2.0, max_delay:float=30.0, jitter:float=0.1) -> List[float]:
+    """Sleeps between ``retries`` attempts: base, base*factor, ... capped, with +-jitter."""
+    return [min(max_delay, base * factor ** i) * (1 + random.uniform(-jitter, jitter)) for i in range(max(retries - 1, 0))]
+
+def _write_csv(df:pd.DataFrame, path:str):
+    tmp = f"{path}.tmp-{threading.get_ident()}"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+class IceFetcher:
+    """Bounded pool of worker threads, each with one warm session from ``session_factory``.
+
+    ``submit`` returns a Future per report; ``fetch_all`` pulls a batch and waits. Results are
+    written as ``<base_dir>/latest/<name>.csv`` and ``<base_dir>/history/<batch stamp>/<name>.csv``.
+    Use as a context manager, or call ``close()``, to shut the sessions down.
+    """
+
+    def __init__(self, session_factory:Callable, base_dir:str, report_ids:Dict[str, int]=REPORT_IDS,
+                 workers:int=2, retries:int=4, backoff:float=0.5, max_backoff:float=30.0):
+        self.session_factory = session_factory
+        self.base_dir = base_dir
+        self.report_ids = dict(report_ids)
+        self.workers = max(1, int(workers))
+        self.retries = max(1, int(retries))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.results = []  # every FetchResult so far, for metrics()
+        self._jobs = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- workers ---
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._worker, name=f"ice-fetch-{len(self._threads)}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self):
+        session = None
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                future, var_type, lag, hist_dir, queued = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result, session = self._pull(session, var_type, lag, hist_dir, queued)
+                except BaseException as e:
+                    # anything _pull didn't handle still resolves the future, so callers never hang;
+                    # the session may be half-closed, so drop it and start a fresh one next time
+                    logging.exception(f"ICE {var_type} lag={lag}: unexpected error")
+                    session = self._discard(session)
+                    future.set_exception(e)
+                    continue
+                with self._lock:
+                    self.results.append(result)
+                future.set_result(result)
+        finally:
+            self._discard(session)
+
+    @staticmethod
+    def _discard(session):
+        if session is not None:
+            try:
+                session.close()
+            except Exception:
+                logging.exception("Closing an ICE session failed")
+        return None
+
+    def _pull(self, session, var_type:str, lag:int, hist_dir:str, queued:float):
+        result = FetchResult(var_type, lag)
+        report_id = self.report_ids.get(var_type)
+        delays = backoff_delays(self.retries, self.backoff, max_delay=self.max_backoff)
+        for attempt in range(1, self.retries + 1):
+            result.attempts = attempt
+            try:
+                if not report_id:
+                    raise ValueError(f"Missing report_id for {var_type}")
+                if session is None:
+                    t0 = time.perf_counter()
+                    session = self.session_factory()
+                    result.session_seconds += time.perf_counter() - t0
+                t0 = time.perf_counter()
+                data = session.run(report_id, lag)
+                result.ice_seconds = time.perf_counter() - t0
+                if not data:
+                    raise RuntimeError("ICE returned no data.")
+                headers, *rows = data
+                df = pd.DataFrame(rows, columns=headers)
+                name = report_file_name(var_type, lag)
+                latest = os.path.join(self.base_dir, "latest", name)
+                _write_csv(df, latest)
+                _write_csv(df, os.path.join(hist_dir, name))
+                result.path, result.rows, result.error = latest, len(df), None
+                break
+            except ValueError as e:  # bad request: retrying won't help
+                result.error = str(e)
+                break
+            except Exception as e:
+                result.error = f"{type(e).__name__}: {e}"
+                logging.warning(f"ICE {var_type} lag={lag} attempt {attempt}/{self.retries} failed: {e}")
+                if attempt == self.retries:
+                    session = self._discard(session)  # a dead Excel/COM session: start a fresh one next time
+                    break
+                time.sleep(delays[attempt - 1])
+        result.seconds = time.perf_counter() - queued
+        if result.error:
+            logging.error(f"Failed {var_type} lag={lag} after {result.attempts} attempt(s): {result.error}")
+        else:
+            logging.info(f"Saved {var_type} lag={lag} → {result.path} ({result.rows} rows, "
+                         f"{result.seconds:.2f}s, ICE {result.ice_seconds:.2f}s, {result.attempts} attempt(s))")
+        return result, session
+
+    # --- public ---
+    def new_batch(self) -> str:
+        """History directory for one batch of pulls (created, with latest/)."""
+        hist_dir = os.path.join(self.base_dir, "history", datetime.now().strftime("%Y%m%d_%H%M%S"))
+        os.makedirs(hist_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.base_dir, "latest"), exist_ok=True)
+        return hist_dir
+
+    def submit(self, var_type:str, lag:int, hist_dir:Optional[str]=None) -> Future:
+        """Queue one report pull; the Future resolves to its FetchResult (errors included, not raised)."""
+        self._start()
+        future = Future()
+        self._jobs.put((future, var_type, lag, hist_dir or self.new_batch(), time.perf_counter()))
+        return future
+
+    def fetch_all(self, var_types:Iterable[str]=("DVaR", "SVaR"),
+                  lags:Sequence[int]=(LAG_COB, LAG_PREV)) -> Dict[Tuple[str, int], FetchResult]:
+        """Pull every (VaR type, lag) concurrently into one history batch and wait for all of them."""
+        hist_dir = self.new_batch()
+        futures = {(v, lag): self.submit(v, lag, hist_dir) for v in var_types for lag in lags}
+        out = {}
+        for (v, lag), f in futures.items():
+            try:
+                out[(v, lag)] = f.result()
+            except BaseException as e:  # raised past _pull's own handling; the other pulls still count
+                out[(v, lag)] = FetchResult(v, lag, error=f"{type(e).__name__}: {e}")
+        return out
+
+    def metrics(self) -> pd.DataFrame:
+        """One row per pull so far: latency, ICE time, session start-up, attempts, rows, error."""
+        with self._lock:
+            return pd.DataFrame([asdict(r) for r in self.results],
+                                columns=list(FetchResult.__dataclass_fields__))
+
+    def close(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._jobs.put(None)
+        for t in threads:
+            t.join()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fetch the tail reports (ICE, or canned payloads with --canned).")
+    ap.add_argument("--out", required=True, help="base directory for latest/ and history/")
+    ap.add_argument("--canned", default=None, help="folder of DVaR_COB.csv-style payloads to serve instead of ICE")
+    ap.add_argument("--latency", type=float, default=0.0, help="simulated ICE latency per call (with --canned)")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--retries", type=int, default=4)
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-8s %(message)s")
+    if args.canned:
+        factory = CannedSession.factory(CannedSession.load_dir(args.canned), latency=args.latency)
+    else:
+        factory = XlwingsSession
+    with IceFetcher(factory, args.out, workers=args.workers, retries=args.retries) as fetcher:
+        results = fetcher.fetch_all()
+        print(fetcher.metrics().to_string(index=False))
+    return 0 if all(r.error is None for r in results.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
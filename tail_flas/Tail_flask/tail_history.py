@@ -0,0 +1,274 @@
+"""Multi-COB history of the tail scenario vectors, stacked into (COB date x vector x asset class).
+
+    python tail_history.py "C:/Top tails daily run data"                 # backfill / update
+    python tail_history.py "C:/Top tails daily run data" --workers 8     # yearly backfill in parallel
+
+The dashboards only ever compare COB with Prev COB from one workbook. ``TailHistory`` keeps the
+per-asset-class vector sums of every daily run instead: for each VaR type one float64 array per
+node (COB dates x scenario vectors), stored as ``<root>/<DVaR|SVaR>/node<id>.npy`` next to a
+manifest of dates, vector numbers and source workbooks, and memory-mapped on load. Looking up a
+(date, vector) is two dict hits and an array index, so "vector 37's Macro P&L over the last 60
+COBs" or "rank stability of today's worst 20" never reopens an Excel file.
+
+Backfill reads each workbook through tail_store (so the dashboards get their columnar copies
+too), one process per workbook, and only re-reads workbooks whose content changed.
+"""
+import os, sys, json, glob, time, shutil, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from tail_agg import NODE_MAP, node_onehot, pnl_columns, vector_numbers
+from tail_store import CACHE_DIRNAME, WORKBOOK_GLOB, TailStore, open_tail_workbook
+
+HISTORY_DIRNAME = ".tail_history"
+COB_SHEETS = {"DVaR": "DVaR_COB", "SVaR": "SVaR_COB"}
+
+def cob_date_from_filename(path:str) -> Optional[np.datetime64]:
+    """COB date of Tail_analysis_auto_06_Jun_2025.xlsx (the last three ``_`` parts of the name)."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return np.datetime64(datetime.strptime("_".join(name.split("_")[-3:]), "%d_%b_%Y").date(), "D")
+    except ValueError:
+        return None
+
+def vector_sums(nodes, pnl, pnl_cols:Sequence, node_map:Dict=NODE_MAP) -> Tuple[np.ndarray, np.ndarray]:
+    """Vector numbers and the (asset x vector) sums of one sheet, assets in ``node_map`` order."""
+    _, onehot = node_onehot(nodes, node_map, assets=list(node_map.values()))
+    return vector_numbers(pnl_cols), onehot @ np.nan_to_num(np.asarray(pnl, dtype=np.float64))
+
+def frame_vector_sums(raw_df:pd.DataFrame, node_map:Dict=NODE_MAP, node_col:str="Node"):
+    """``vector_sums`` of a raw sheet frame, e.g. an ICE CSV written by fetch_tail_report."""
+    cols = pnl_columns(raw_df.columns)
+    return vector_sums(raw_df[node_col], raw_df[cols].to_numpy(dtype=np.float64, na_value=0.0), cols, node_map)
+
+def _workbook_sums(path:str, node_map:Dict) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    # one backfill task: every COB sheet of a workbook, read through the columnar store
+    book = open_tail_workbook(path)
+    out = {}
+    for var_type, sheet_name in COB_SHEETS.items():
+        sheet = book[sheet_name]
+        out[var_type] = vector_sums(sheet.meta["Node"], sheet.pnl, sheet.pnl_cols, node_map)
+    return out
+
+class TailHistory:
+    """Per-VaR-type (COB date x vector x asset class) cubes under ``root``."""
+
+    def __init__(self, root:str, node_map:Dict=NODE_MAP):
+        self.root = root
+        self.node_map = dict(node_map)
+        self.assets = list(self.node_map.values())
+        self._cubes = {}
+
+    # --- storage ---
+    def _dir(self, var_type:str) -> str:
+        return os.path.join(self.root, var_type)
+
+    def _load(self, var_type:str) -> dict:
+        if var_type in self._cubes:
+            return self._cubes[var_type]
+        d = self._dir(var_type)
+        try:
+            with open(os.path.join(d, "manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        if manifest is None or [str(n) for n in self.node_map] != list(manifest["nodes"]):
+            cube = {"dates": np.array([], dtype="datetime64[D]"), "vectors": np.array([], dtype=np.int64),
+                    "parts": [np.empty((0, 0)) for _ in self.assets], "sources": {}}
+        else:
+            cube = {"dates": np.array(manifest["dates"], dtype="datetime64[D]"),
+                    "vectors": np.array(manifest["vectors"], dtype=np.int64),
+                    "parts": [np.load(os.path.join(d, f"node{n}.npy"), mmap_mode="r") for n in self.node_map],
+                    "sources": manifest["sources"]}
+        cube["date_pos"] = {d: i for i, d in enumerate(cube["dates"].tolist())}
+        cube["vector_pos"] = {v: i for i, v in enumerate(cube["vectors"].tolist())}
+        self._cubes[var_type] = cube
+        return cube
+
+    def _save(self, var_type:str, cube:dict):
+        d = self._dir(var_type)
+        tmp = f"{d}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for node, part in zip(self.node_map, cube["parts"]):
+            np.save(os.path.join(tmp, f"node{node}.npy"), np.ascontiguousarray(part))
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"nodes": [str(n) for n in self.node_map], "assets": self.assets,
+                       "dates": [str(x) for x in cube["dates"]], "vectors": cube["vectors"].tolist(),
+                       "sources": cube["sources"]}, f, indent=1)
+        self._cubes.pop(var_type, None)  # drop memmaps of the old files before replacing them
+        shutil.rmtree(d, ignore_errors=True)
+        os.replace(tmp, d)
+
+    def add(self, var_type:str, records:Iterable[Tuple], save:bool=True):
+        """Merge ``(cob_date, vectors, sums[asset x vector], source)`` records; a date already in the
+        history is overwritten. Vectors absent on some COB stay NaN there."""
+        records = list(records)
+        if not records:
+            return
+        cube = self._load(var_type)
+        dates = np.union1d(cube["dates"], np.array([r[0] for r in records], dtype="datetime64[D]"))
+        vectors = np.union1d(cube["vectors"], np.concatenate([np.asarray(r[1], dtype=np.int64) for r in records]))
+        parts = [np.full((len(dates), len(vectors)), np.nan) for _ in self.assets]
+        if len(cube["dates"]):
+            di, vi = np.searchsorted(dates, cube["dates"]), np.searchsorted(vectors, cube["vectors"])
+            for new, old in zip(parts, cube["parts"]):
+                new[np.ix_(di, vi)] = old
+        sources = dict(cube["sources"])
+        for cob, vecs, sums, source in records:
+            di = np.searchsorted(dates, np.datetime64(cob, "D"))
+            vi = np.searchsorted(vectors, np.asarray(vecs, dtype=np.int64))
+            for a, new in enumerate(parts):
+                new[di, :] = np.nan
+                new[di, vi] = sums[a]
+            sources[str(np.datetime64(cob, "D"))] = source
+        cube = {"dates": dates, "vectors": vectors, "parts": parts, "sources": sources}
+        if save:
+            self._save(var_type, cube)
+        else:
+            cube["date_pos"] = {d: i for i, d in enumerate(dates.tolist())}
+            cube["vector_pos"] = {v: i for i, v in enumerate(vectors.tolist())}
+            self._cubes[var_type] = cube
+
+    def add_frame(self, var_type:str, cob_date, raw_df:pd.DataFrame, source:str=""):
+        """Add one raw COB sheet (Excel frame or ICE CSV) for ``cob_date``."""
+        vectors, sums = frame_vector_sums(raw_df, self.node_map)
+        self.add(var_type, [(cob_date, vectors, sums, {"file": source})])
+
+    # --- queries ---
+    def dates(self, var_type:str) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self._load(var_type)["dates"], name="COB Date")
+
+    def vectors(self, var_type:str) -> np.ndarray:
+        return self._load(var_type)["vectors"]
+
+    def cube(self, var_type:str, last:Optional[int]=None) -> np.ndarray:
+        """(COB date x vector x asset) array, assets in ``self.assets`` order; ``last`` most recent COBs."""
+        parts = self._load(var_type)["parts"]
+        sl = slice(-last, None) if last else slice(None)
+        return np.stack([p[sl] for p in parts], axis=2)
+
+    def _asset(self, cube:dict, asset:str, rows=slice(None)) -> np.ndarray:
+        if asset == "Macro":
+            return sum(np.asarray(p[rows]) for p in cube["parts"])
+        return np.asarray(cube["parts"][self.assets.index(asset)][rows])
+
+    def value(self, var_type:str, cob_date, vector:int, asset:str="Macro") -> float:
+        """P&L of one vector on one COB (KeyError if either is not in the history)."""
+        cube = self._load(var_type)
+        i = cube["date_pos"][np.datetime64(cob_date, "D").item()]
+        j = cube["vector_pos"][int(vector)]
+        if asset == "Macro":
+            return float(sum(p[i, j] for p in cube["parts"]))
+        return float(cube["parts"][self.assets.index(asset)][i, j])
+
+    def series(self, var_type:str, vector:int, asset:str="Macro", last:Optional[int]=None) -> pd.Series:
+        """One vector's P&L across COBs, oldest first."""
+        cube = self._load(var_type)
+        j = cube["vector_pos"][int(vector)]
+        rows = slice(-last, None) if last else slice(None)
+        values = self._asset(cube, asset, (rows, j))
+        return pd.Series(values, index=self.dates(var_type)[rows], name=f"pnl_vector{vector} {asset}")
+
+    def snapshot(self, var_type:str, cob_date) -> pd.DataFrame:
+        """One COB as rank / pnl_vector / assets / Macro, like tail_agg.vector_table."""
+        cube = self._load(var_type)
+        i = cube["date_pos"][np.datetime64(cob_date, "D").item()]
+        out = pd.DataFrame({a: np.asarray(p[i]) for a, p in zip(self.assets, cube["parts"])})
+        out["Macro"] = out[self.assets].sum(axis=1)
+        out.insert(0, "pnl_vector", cube["vectors"])
+        out.insert(0, "rank", out["Macro"].rank(method="first").astype("Int64"))
+        return out
+
+    def rank_history(self, var_type:str, asset:str="Macro", last:Optional[int]=None) -> pd.DataFrame:
+        """COB date x vector ascending ranks (1 = most negative, ties in vector order, NaN unranked)."""
+        cube = self._load(var_type)
+        rows = slice(-last, None) if last else slice(None)
+        values = self._asset(cube, asset, rows)
+        order = np.argsort(np.where(np.isnan(values), np.inf, values), axis=1, kind="stable")
+        ranks = np.empty(values.shape)
+        np.put_along_axis(ranks, order, np.arange(1, values.shape[1] + 1, dtype=np.float64)[None, :], axis=1)
+        ranks[np.isnan(values)] = np.nan
+        return pd.DataFrame(ranks, index=self.dates(var_type)[rows], columns=pd.Index(cube["vectors"], name="pnl_vector"))
+
+    def rank_stability(self, var_type:str, k:int=20, last:int=60, asset:str="Macro") -> pd.DataFrame:
+        """How the worst ``k`` vectors of the latest COB ranked over the last ``last`` COBs."""
+        ranks = self.rank_history(var_type, asset, last)
+        latest = ranks.iloc[-1]
+        worst = latest[latest <= k].sort_values().index
+        hist = ranks[worst]
+        return pd.DataFrame({"Latest Rank": latest[worst], "Mean Rank": hist.mean(), "Rank Std": hist.std(),
+                             "Best Rank": hist.min(), "Worst Rank": hist.max(),
+                             f"COBs in Bottom {k}": (hist <= k).sum(), "COBs": hist.notna().sum()})
+
+def build_history(folder:str, root:Optional[str]=None, workers:Optional[int]=None, pattern:str=WORKBOOK_GLOB,
+                  node_map:Dict=NODE_MAP) -> Tuple[List[str], Dict[str, str]]:
+    """Add every new or changed workbook in ``folder`` to its history.
+
+    Workbooks are read in ``workers`` processes (default: one per CPU, 1 = in-process). A workbook
+    that can't be read (corrupt, or missing a COB sheet) is logged and skipped; the others are still
+    added. Returns the files added and ``{file: error}`` for the ones skipped.
+    """
+    history = TailHistory(root or os.path.join(folder, HISTORY_DIRNAME), node_map)
+    shas = TailStore(os.path.join(folder, CACHE_DIRNAME))
+    known = {}
+    for var_type in COB_SHEETS:
+        for cob, src in history._load(var_type)["sources"].items():
+            known.setdefault(cob, set()).add(src.get("sha"))
+    todo = []
+    for path in sorted(glob.glob(os.path.join(folder, pattern))):
+        cob = cob_date_from_filename(path)
+        if cob is None:
+            continue
+        sha = shas.sha_of(path)
+        if known.get(str(cob)) != {sha}:
+            todo.append((path, cob, sha))
+    if not todo:
+        return [], {}
+    results, failed = {}, {}
+
+    def collect(task, read):
+        name = os.path.basename(task[0])
+        try:
+            results[task] = read()
+        except Exception as e:
+            print(f"{time.strftime('%H:%M:%S')} {name}: ERROR {e}", flush=True)
+            failed[name] = str(e)
+
+    if workers == 1 or len(todo) == 1:
+        for task in todo:
+            collect(task, lambda: _workbook_sums(task[0], node_map))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_workbook_sums, task[0], node_map): task for task in todo}
+            for future in as_completed(futures):
+                collect(futures[future], future.result)
+    done = [task for task in todo if task in results]  # file order, whatever order they finished in
+    if done:
+        for var_type in COB_SHEETS:
+            history.add(var_type, [(cob, *results[(path, cob, sha)][var_type],
+                                    {"file": os.path.basename(path), "sha": sha}) for path, cob, sha in done])
+    return [os.path.basename(task[0]) for task in done], failed
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Stack Tail_analysis_auto_*.xlsx COB sheets into the tail history.")
+    ap.add_argument("folder", help="folder with the daily workbooks")
+    ap.add_argument("--root", default=None, help=f"history directory (default: <folder>/{HISTORY_DIRNAME})")
+    ap.add_argument("--workers", type=int, default=None, help="parallel workbook readers (default: CPU count)")
+    ap.add_argument("--pattern", default=WORKBOOK_GLOB)
+    args = ap.parse_args(argv)
+
+    done, failed = build_history(args.folder, args.root, args.workers, args.pattern)
+    history = TailHistory(args.root or os.path.join(args.folder, HISTORY_DIRNAME))
+    print(f"Read {len(done)} workbook(s)" + (f", {len(failed)} failed" if failed else ""))
+    for var_type in COB_SHEETS:
+        dates = history.dates(var_type)
+        if len(dates):
+            print(f"{var_type}: {len(dates)} COBs ({dates[0]:%d %b %Y} - {dates[-1]:%d %b %Y}), "
+                  f"{len(history.vectors(var_type))} vectors")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""Result cache shared by every worker of the Tail Flask app.
+
+``/process_data`` used to leave its frames in module globals, so the GET routes only worked in
+the worker that had processed the file and nothing survived a restart. ``ResultCache`` keeps
+each result (a dict of DataFrames) under a key derived from the source file's hash:
+
+* on disk, ``<root>/<key>/frame<i>.parquet`` plus ``manifest.json``, written to a temp directory
+  and renamed, so any process can read a finished entry without locking. Mixed-type object
+  columns are stored as text; nothing is ever pickled;
+* in memory, an LRU of the last few results per process, so repeated requests skip Parquet.
+
+``get_or_compute`` is single-flight: threads of one process wait on the first caller, and
+processes take an ``O_EXCL`` lock file next to the entry, so two users processing the same file
+compute it once. Lock files older than ``lock_timeout`` (a crashed worker) are broken.
+
+With ``keep_latest`` (what the Flask app uses: it serves one workbook at a time), writing a new
+entry prunes every other one, so ``<root>`` doesn't grow by one directory per workbook version.
+"""
+import os, json, time, shutil, threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import pandas as pd
+from tail_store import parquet_ready
+
+Result = Dict[str, pd.DataFrame]
+
+class ResultCache:
+    """Keyed results on disk under ``root`` with a per-process LRU of ``max_items`` in front."""
+
+    def __init__(self, root:str, max_items:int=4, lock_timeout:float=600.0, poll:float=0.2,
+                 keep_latest:bool=False):
+        self.root = root
+        self.keep_latest = keep_latest
+        self.max_items = max_items
+        self.lock_timeout = lock_timeout
+        self.poll = poll
+        self.hits = 0
+        self.misses = 0
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, key:str) -> str:
+        return os.path.join(self.root, key)
+
+    # --- memory ---
+    def _remember(self, key:str, result:Result):
+        with self._lock:
+            self._mem[key] = result
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_items:
+                self._mem.popitem(last=False)
+
+    # --- disk ---
+    def _read(self, key:str) -> Optional[Result]:
+        d = self._dir(key)
+        try:
+            with open(os.path.join(d, "manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if not all(fn.endswith(".parquet") for fn in manifest["frames"].values()):
+                # written with the old pickle fallback, which is never loaded: drop it and recompute
+                shutil.rmtree(d, ignore_errors=True)
+                return None
+            return {name: pd.read_parquet(os.path.join(d, fn)) for name, fn in manifest["frames"].items()}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write(self, key:str, result:Result):
+        d = self._dir(key)
+        tmp = f"{d}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        frames = {}
+        for i, (name, df) in enumerate(result.items()):
+            fn = f"frame{i}.parquet"
+            parquet_ready(df).to_parquet(os.path.join(tmp, fn))
+            frames[name] = fn
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"key": key, "written_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "frames": frames}, f, indent=1)
+        try:
+            os.replace(tmp, d)
+        except OSError:
+            # an entry for this key is already there (another worker won); keep it
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    # --- cross-process lock ---
+    def _try_lock(self, key:str) -> bool:
+        path = self._dir(key) + ".lock"
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > self.lock_timeout:
+                    os.remove(path)  # left behind by a worker that died mid-compute
+            except OSError:
+                pass
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def _unlock(self, key:str):
+        try:
+            os.remove(self._dir(key) + ".lock")
+        except OSError:
+            pass
+
+    # --- public ---
+    def get(self, key:str) -> Optional[Result]:
+        with self._lock:
+            result = self._mem.get(key)
+            if result is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return result
+        result = self._read(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, result)
+        return result
+
+    def put(self, key:str, result:Result):
+        self._write(key, result)
+        self._remember(key, result)
+
+    def get_or_compute(self, key:str, compute:Callable[[], Result]) -> Result:
+        """The cached result for ``key``, or ``compute()``'s, computed once across threads and processes."""
+        result = self.get(key)
+        if result is not None:
+            return result
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            event.wait(self.lock_timeout)
+            result = self.get(key)
+            if result is not None:
+                return result
+            return self.get_or_compute(key, compute)  # the leader failed; try ourselves
+        try:
+            while True:
+                if self._try_lock(key):
+                    try:
+                        result = self._read(key)  # finished by another process since our miss
+                        if result is None:
+                            result = compute()
+                            self._write(key, result)
+                            if self.keep_latest:
+                                self.prune(key)
+                    finally:
+                        self._unlock(key)
+                    self._remember(key, result)
+                    return result
+                time.sleep(self.poll)
+                result = self.get(key)
+                if result is not None:
+                    return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def prune(self, keep:str) -> int:
+        """Delete every entry but ``keep`` (the current key); returns how many went."""
+        removed = 0
+        for name in os.listdir(self.root):
+            # skip lock files and other writers' in-progress temp directories
+            if name != keep and not name.endswith(".lock") and ".tmp-" not in name and os.path.isdir(self._dir(name)):
+                shutil.rmtree(self._dir(name), ignore_errors=True)
+                removed += 1
+        with self._lock:
+            for k in [k for k in self._mem if k != keep]:
+                del self._mem[k]
+        return removed
@@ -0,0 +1,108 @@
+"""Top/bottom-K tail selection shared by the Tail comparison views.
+
+Picking the 20 worst and best scenarios used to fully sort the vector set, often more than once
+per table (``sort_values`` both ways, ``nsmallest`` + ``nlargest``). ``bottom_k`` / ``top_k``
+partition with ``np.argpartition`` and only sort the K selected rows, so the cost stays linear
+in the number of scenarios. Ties and NaN behave as in ``nsmallest`` / ``nlargest``: NaN only
+fills in when there are fewer than K numbers, tied values keep sheet order and ``keep="all"``
+also returns rows tied with the K-th.
+"""
+from typing import Optional, Sequence
+import numpy as np
+import pandas as pd
+
+def _select(values, k:int, largest:bool, keep:str) -> np.ndarray:
+    vals = np.asarray(values, dtype=np.float64)
+    k = min(int(k), len(vals))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    missing = np.isnan(vals)
+    pos = np.flatnonzero(~missing)
+    v = -vals[pos] if largest else vals[pos]
+    if k < len(v):
+        kth = v[np.argpartition(v, k - 1)[:k]].max()
+        cand = np.flatnonzero(v <= kth)  # the K smallest plus anything tied with the K-th
+    else:
+        cand = np.arange(len(v))
+    cand = cand[np.lexsort((cand, v[cand]))]
+    if keep != "all":
+        cand = cand[:k]
+    out = pos[cand]
+    if len(out) < k:
+        # fewer than K numbers: NaN rows fill up the rest, in sheet order (all of them if keep="all")
+        nan_pos = np.flatnonzero(missing)
+        out = np.concatenate([out, nan_pos if keep == "all" else nan_pos[:k - len(out)]])
+    return out
+
+def bottom_k(values, k:int=20, keep:str="first") -> np.ndarray:
+    """Positions of the ``k`` smallest values, most negative first."""
+    return _select(values, k, largest=False, keep=keep)
+
+def top_k(values, k:int=20, keep:str="first") -> np.ndarray:
+    """Positions of the ``k`` largest values, largest first."""
+    return _select(values, k, largest=True, keep=keep)
+
+def tails(df:pd.DataFrame, measure:str, k:int=20, keep:str="first"):
+    """``(bottom, top)`` rows of ``df`` on ``measure``, like ``nsmallest`` / ``nlargest``."""
+    vals = df[measure].to_numpy(dtype=np.float64, na_value=np.nan)
+    return df.iloc[bottom_k(vals, k, keep)], df.iloc[top_k(vals, k, keep)]
+
+def rank_first(values, positions:Optional[Sequence[int]]=None) -> np.ndarray:
+    """Ascending ``rank(method="first")`` (1 = most negative) of ``values[positions]``.
+
+    For a handful of positions this counts smaller / earlier-tied values directly, without
+    sorting the whole set. NaN values are not counted and get a NaN rank.
+    """
+    vals = np.asarray(values, dtype=np.float64)
+    if positions is None:
+        return pd.Series(vals).rank(method="first").to_numpy()
+    positions = np.asarray(positions, dtype=np.intp)
+    x = vals[positions][:, None]
+    earlier = np.arange(len(vals))[None, :] < positions[:, None]
+    ranks = ((vals[None, :] < x) | ((vals[None, :] == x) & earlier)).sum(axis=1) + 1.0
+    ranks[np.isnan(x[:, 0])] = np.nan
+    return ranks
+
+def tail_table(cob:pd.DataFrame, prev:Optional[pd.DataFrame]=None, measure:str="Macro", k:int=20,
+               on:str="P&L Vector No", asset_cols:Sequence[str]=(), prev_cols:Sequence[str]=()) -> pd.DataFrame:
+    """Bottom-K then top-K COB rows with their ranks and, given ``prev``, their Prev COB migration.
+
+    Adds ``Tail`` ("bottom"/"top"), ``Tail Rank`` (1 = most extreme), ``<measure> Rank`` and
+    ``<asset> Rank`` for each of ``asset_cols`` (ascending ranks over the whole COB set, so the
+    most positive of N vectors is rank N). With a Prev COB frame keyed on the same ``on`` column
+    it also adds ``Prev <measure>``, ``Prev Rank``, ``Rank Change`` (Prev Rank - COB Rank) and
+    ``Prev <col>`` for each of ``prev_cols``; vectors missing from Prev COB get NaN.
+    """
+    vals = cob[measure].to_numpy(dtype=np.float64, na_value=np.nan)
+    neg, pos = bottom_k(vals, k), top_k(vals, k)
+    sel = np.concatenate([neg, pos])
+    out = cob.iloc[sel].reset_index(drop=True)
+    out.insert(0, "Tail", ["bottom"] * len(neg) + ["top"] * len(pos))
+    out.insert(1, "Tail Rank", np.concatenate([np.arange(1, len(neg) + 1), np.arange(1, len(pos) + 1)]))
+    out[f"{measure} Rank"] = rank_first(vals, sel)
+    for col in asset_cols:
+        out[f"{col} Rank"] = rank_first(cob[col].to_numpy(dtype=np.float64, na_value=np.nan), sel)
+    if prev is not None:
+        prev_vals = prev[measure].to_numpy(dtype=np.float64, na_value=np.nan)
+        where = pd.Index(prev[on]).get_indexer(out[on])
+        found = where >= 0
+        prev_value = np.full(len(out), np.nan)
+        prev_rank = np.full(len(out), np.nan)
+        prev_value[found] = prev_vals[where[found]]
+        prev_rank[found] = rank_first(prev_vals, where[found])
+        out[f"Prev {measure}"] = prev_value
+        out["Prev Rank"] = prev_rank
+        out["Rank Change"] = prev_rank - out[f"{measure} Rank"].to_numpy()
+        for col in prev_cols:
+            values = np.full(len(out), np.nan)
+            values[found] = prev[col].to_numpy(dtype=np.float64, na_value=np.nan)[where[found]]
+            out[f"Prev {col}"] = values
+    return out
+
+REPORT_TOP_RANK = 260  # the top tail's rank label in the Tail reports, whatever the vector count
+
+def report_ranks(table:pd.DataFrame) -> np.ndarray:
+    """The COB Rank labels the Top 20 views have always shown for a ``tail_table``: 1, 2, ... for
+    the bottom tail and ``REPORT_TOP_RANK``, ``REPORT_TOP_RANK`` - 1, ... for the top tail."""
+    tail_rank = table["Tail Rank"].to_numpy()
+    return np.where(table["Tail"].to_numpy() == "top", REPORT_TOP_RANK + 1 - tail_rank, tail_rank)
@@ -0,0 +1,284 @@
+"""Columnar copies of Tail_analysis_auto_*.xlsx workbooks, written once and memory-mapped after.
+
+    python tail_store.py "C:/Top tails daily run data"            # convert new workbooks, keep polling
+    python tail_store.py "C:/Top tails daily run data" --once     # one pass (task scheduler)
+
+Parsing the .xlsx is by far the slowest step of every Tail dashboard, and ``st.cache_data``
+forgets it when the process restarts. ``TailStore`` converts each workbook once, keyed by
+content SHA-256, into one directory per workbook:
+
+    <root>/<sha16>-h<header_row>/manifest.json      column names, pnl_vector columns, date row
+                                /sheet<i>.npy        P&L matrix (rows x vectors, float64)
+                                /sheet<i>.meta.parquet   Node, Asset class, currency, ...
+
+Only .npy and Parquet are ever read back (never pickle), so a writable shared folder can't run code
+in the dashboards; id columns mixing numbers and text are stored as text.
+
+Loading a converted workbook is ``np.load(mmap_mode="r")`` plus a small Parquet read, so any
+historical COB opens in milliseconds. By default the store sits next to the workbooks in
+``.tail_cache``, so every dashboard reading the same folder shares it.
+"""
+import io, os, sys, json, time, glob, shutil, hashlib, argparse
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from tail_excel import SHEETS, TailSheet, read_tail_workbook
+
+CACHE_DIRNAME = ".tail_cache"
+WORKBOOK_GLOB = "Tail_analysis_auto_*.xlsx"
+
+def _sha256(path:str, chunk_size:int=1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _encode(v):
+    # JSON for header / date-row cells; decoded back to the values the Excel reader returns
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return None
+    if isinstance(v, datetime):
+        return {"datetime": v.isoformat()}
+    if isinstance(v, date):
+        return {"date": v.isoformat()}
+    if isinstance(v, (np.integer, np.floating)):
+        return v.item()
+    return v
+
+def _decode(v):
+    if v is None:
+        return np.nan
+    if isinstance(v, dict):
+        return datetime.fromisoformat(v["datetime"]) if "datetime" in v else date.fromisoformat(v["date"])
+    return v
+
+def parquet_ready(df:pd.DataFrame) -> pd.DataFrame:
+    """``df`` with every mixed-type object column (e.g. numeric and text load codes) cast to str,
+    so it always fits a Parquet schema; missing values stay missing."""
+    out = df
+    for col in df.columns:
+        values = df[col]
+        if values.dtype == object and len({type(v) for v in values.dropna()}) > 1:
+            if out is df:
+                out = df.copy()
+            out[col] = values.map(lambda v: v if pd.isna(v) else str(v))
+    return out
+
+def _write_json(path:str, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"  # per process: several workers may update the index at once
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=1)
+    os.replace(tmp, path)
+
+class TailStore:
+    """Converted tail workbooks under ``root``, one directory per (content hash, header row)."""
+
+    def __init__(self, root:str):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        self._index_path = os.path.join(root, "index.json")
+
+    # --- locating entries ---
+    def _index(self) -> Dict[str, dict]:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def sha_of(self, path:str) -> str:
+        """Content hash of a workbook; unchanged files (same size and mtime) skip re-hashing."""
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        known = self._index().get(key)
+        if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+            return known["sha"]
+        sha = _sha256(path)
+        index = self._index()
+        index[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha": sha}
+        _write_json(self._index_path, index)
+        return sha
+
+    def _entry(self, sha:str, header_row:int) -> str:
+        return os.path.join(self.root, f"{sha[:16]}-h{header_row}")
+
+    def _manifest(self, entry:str) -> Optional[dict]:
+        try:
+            with open(os.path.join(entry, "manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not all(info["meta_file"].endswith(".parquet") for info in manifest["sheets"].values()):
+            return None  # written with the old pickle fallback, which is never loaded: convert again
+        return manifest
+
+    # --- writing ---
+    def _write_entry(self, entry:str, source:str, header_row:int, book:Dict[str, TailSheet]):
+        tmp = f"{entry}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        sheets = {}
+        for i, (name, sheet) in enumerate(book.items()):
+            stem = f"sheet{i}"
+            np.save(os.path.join(tmp, stem + ".npy"), np.ascontiguousarray(sheet.pnl))
+            meta = parquet_ready(sheet.meta.copy())
+            meta.columns = [str(c) for c in meta.columns]
+            meta_file = stem + ".meta.parquet"
+            meta.to_parquet(os.path.join(tmp, meta_file), index=False)
+            sheets[name] = {"stem": stem, "meta_file": meta_file, "rows": int(sheet.pnl.shape[0]),
+                            "columns": [_encode(c) for c in sheet.columns],
+                            "meta_cols": [_encode(c) for c in sheet.meta.columns],
+                            "pnl_cols": [_encode(c) for c in sheet.pnl_cols],
+                            "date_row": [[_encode(k), _encode(v)] for k, v in sheet.date_map.items()]}
+        _write_json(os.path.join(tmp, "manifest.json"), {
+            "source": source, "header_row": header_row, "converted_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sheets": sheets})
+        # Move the old entry aside before renaming the new one in, rather than deleting it first.
+        # A reader can still miss the entry between the two renames; it then converts the workbook
+        # itself, which is slower but correct. Readers never see a half-written entry.
+        old = f"{entry}.old-{os.getpid()}"
+        try:
+            os.replace(entry, old)
+        except FileNotFoundError:
+            old = None
+        except OSError:
+            # still open elsewhere (e.g. memory-mapped on Windows): keep it, drop ours
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            # another process finished the same workbook first
+            shutil.rmtree(tmp, ignore_errors=True)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def convert(self, source, header_row:int=1, sheets:Sequence[str]=SHEETS) -> str:
+        """Write the columnar copy of a workbook (path or uploaded buffer); returns its directory."""
+        if isinstance(source, str):
+            sha, name, reader = self.sha_of(source), os.path.basename(source), source
+        else:
+            data = source.getvalue() if hasattr(source, "getvalue") else source.read()
+            sha, name, reader = hashlib.sha256(data).hexdigest(), getattr(source, "name", ""), io.BytesIO(data)
+        entry = self._entry(sha, header_row)
+        manifest = self._manifest(entry)
+        if manifest is not None and all(s in manifest["sheets"] for s in sheets):
+            return entry
+        wanted = list(dict.fromkeys(list(manifest["sheets"]) + list(sheets))) if manifest else list(sheets)
+        book = read_tail_workbook(reader, wanted, header_row=header_row)
+        self._write_entry(entry, name, header_row, book)
+        return entry
+
+    # --- reading ---
+    def _read_entry(self, entry:str, manifest:dict, sheets:Sequence[str], mmap:bool) -> Dict[str, TailSheet]:
+        out = {}
+        for name in sheets:
+            info = manifest["sheets"][name]
+            pnl = np.load(os.path.join(entry, info["stem"] + ".npy"), mmap_mode="r" if mmap else None)
+            meta_path = os.path.join(entry, info["meta_file"])
+            meta = pd.read_parquet(meta_path)
+            meta.columns = [_decode(c) for c in info["meta_cols"]]
+            if len(meta.columns) == 0:
+                meta = pd.DataFrame(index=pd.RangeIndex(info["rows"]))
+            out[name] = TailSheet(name=name, columns=[_decode(c) for c in info["columns"]], meta=meta,
+                                  pnl_cols=[_decode(c) for c in info["pnl_cols"]], pnl=pnl,
+                                  date_map={_decode(k): _decode(v) for k, v in info["date_row"]})
+        return out
+
+    def load(self, source, header_row:int=1, sheets:Sequence[str]=SHEETS, mmap:bool=True) -> Dict[str, TailSheet]:
+        """``read_tail_workbook`` from the columnar copy, converting the workbook first on a miss."""
+        if isinstance(source, str):
+            entry = self._entry(self.sha_of(source), header_row)
+            manifest = self._manifest(entry)
+            if manifest is not None and all(s in manifest["sheets"] for s in sheets):
+                self.hits += 1
+                return self._read_entry(entry, manifest, sheets, mmap)
+        self.misses += 1
+        entry = self.convert(source, header_row, sheets)
+        return self._read_entry(entry, self._manifest(entry), sheets, mmap)
+
+    def prune(self, keep:Sequence[str]) -> int:
+        """Delete entries whose workbook is no longer in ``keep`` (paths); returns how many went."""
+        keep = [p for p in keep if os.path.exists(p)]
+        live = {self.sha_of(p)[:16] for p in keep}
+        index = self._index()
+        paths = {os.path.abspath(p) for p in keep}
+        if any(k not in paths for k in index):
+            _write_json(self._index_path, {k: v for k, v in index.items() if k in paths})
+        removed = 0
+        for entry in glob.glob(os.path.join(self.root, "*-h*")):
+            if os.path.basename(entry).split("-h")[0] not in live:
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+        return removed
+
+def store_for(path:str) -> TailStore:
+    """The store shared by every dashboard reading workbooks from ``path``'s folder."""
+    return TailStore(os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRNAME))
+
+def open_tail_workbook(source, header_row:int=1, sheets:Sequence[str]=SHEETS, root:Optional[str]=None) -> Dict[str, TailSheet]:
+    """Memory-mapped sheets of a workbook (path, or uploaded buffer with ``root``), converting it
+    on first use; reads the .xlsx directly when the store can't be written."""
+    try:
+        store = TailStore(root) if root else store_for(source)
+        book = store.load(source, header_row, sheets)
+        if store.misses and not root:
+            # just converted: drop the copies of workbooks that are no longer in its folder
+            store.prune(glob.glob(os.path.join(os.path.dirname(os.path.abspath(source)), "*.xlsx")))
+        return book
+    except (OSError, ImportError):  # store not writable, or no Parquet engine installed
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return read_tail_workbook(source, sheets, header_row=header_row)
+
+def convert_folder(folder:str, header_row:int=1, pattern:str=WORKBOOK_GLOB) -> List[str]:
+    """Convert every workbook in ``folder`` not yet in its store, then drop the copies of workbooks
+    no longer there; returns the newly converted names."""
+    store = TailStore(os.path.join(folder, CACHE_DIRNAME))
+    done = []
+    for path in sorted(glob.glob(os.path.join(folder, pattern))):
+        entry = store._entry(store.sha_of(path), header_row)
+        if store._manifest(entry) is not None:
+            continue
+        t0 = time.perf_counter()
+        try:
+            store.convert(path, header_row)
+        except Exception as e:
+            print(f"{time.strftime('%H:%M:%S')} {os.path.basename(path)}: ERROR {e}", flush=True)
+            continue
+        print(f"{time.strftime('%H:%M:%S')} {os.path.basename(path)}: converted in {time.perf_counter() - t0:.2f}s",
+              flush=True)
+        done.append(os.path.basename(path))
+    if done:
+        store.prune(glob.glob(os.path.join(folder, "*.xlsx")))
+    return done
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Convert Tail_analysis_auto_*.xlsx workbooks into the columnar tail store.")
+    ap.add_argument("folder", help="folder with the daily workbooks")
+    ap.add_argument("--once", action="store_true", help="convert what is there now and exit")
+    ap.add_argument("--interval", type=float, default=60.0, help="seconds between polls")
+    ap.add_argument("--header-row", type=int, default=1, help="0 for ICE-style sheets without a date row")
+    ap.add_argument("--pattern", default=WORKBOOK_GLOB)
+    args = ap.parse_args(argv)
+
+    if args.once:
+        done = convert_folder(args.folder, args.header_row, args.pattern)
+        print(f"Converted {len(done)} workbook(s) in {args.folder}")
+        return 0
+    print(f"Watching {args.folder} (Ctrl+C to stop)", flush=True)
+    try:
+        while True:
+            convert_folder(args.folder, args.header_row, args.pattern)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
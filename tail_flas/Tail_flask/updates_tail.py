@@ -1,6 +1,5 @@
 import os
 import glob
-import time
 import logging
 import numpy as np
 import pandas as pd
@@ -8,8 +7,13 @@ import streamlit as st
 from datetime import datetime, timedelta
 from typing import Optional, Tuple
 from bokeh.plotting import figure
-from bokeh.models import HoverTool
+from bokeh.models import ColumnDataSource, HoverTool
 from st_aggrid import AgGrid, GridOptionsBuilder
+import tail_agg
+from tail_select import report_ranks, tail_table, tails
+from tail_store import open_tail_workbook
+from tail_fetch import IceFetcher, XlwingsSession
+from tail_chart import CHARTS, chart_data, fingerprint
 
 # --- Optional ICE (xlwings) imports (only used when fetching or computing dates) ---
 try:
@@ -39,10 +43,17 @@ REPORT_IDS = {
     "DVaR": 20455915,
     "SVaR": 20455936,
 }
+# Node id -> asset class summed into the FX / Rates / EM Macro columns
+NODE_MAP = dict(tail_agg.NODE_MAP)
+
 # Lags: 1 = COB, 2 = Prev COB
 LAG_COB = 1
 LAG_PREV = 2
 
+# Concurrent ICE pulls, each worker with its own warm hidden Excel
+ICE_WORKERS = 2
+ICE_RETRIES = 4
+
 # =====================
 # LOGGING
 # =====================
@@ -94,49 +105,33 @@ def previous_business_day(d: datetime, n: int = 1) -> datetime:
 # =====================
 # Expected columns: 'Var Type', 'Node', 'Asset class', 'currency', 'sensitivity_type', 'load_code', 'pnl_vector<N>'
 
-def aggregate_vectors(df: pd.DataFrame, max_vector: int) -> pd.DataFrame:
-    df = df[df['Node'].isin([10, 22194, 1373254])].copy()
-    df['Asset class'] = df['Node'].map({10: 'FX', 22194: 'Rates', 1373254: 'EM Macro'})
-
-    rows = []
-    for i in range(1, max_vector + 1):
-        vcol = f"pnl_vector{i}"
-        if vcol not in df.columns:
-            continue
-        fx_sum = df.loc[df['Asset class'] == 'FX', vcol].sum()
-        rates_sum = df.loc[df['Asset class'] == 'Rates', vcol].sum()
-        em_sum = df.loc[df['Asset class'] == 'EM Macro', vcol].sum()
-        macro = fx_sum + rates_sum + em_sum
-        rows.append([i, vcol, fx_sum, rates_sum, em_sum, macro])
-
-    return pd.DataFrame(rows, columns=['rank', 'pnl_vector', 'FX', 'Rates', 'EM Macro', 'Macro'])
+def aggregate_vectors(df: pd.DataFrame, max_vector: int, node_map: Optional[dict] = None) -> pd.DataFrame:
+    """Per-vector FX / Rates / EM Macro sums and their Macro total, all vectors in one batch."""
+    return tail_agg.vector_table(df, max_vector, NODE_MAP if node_map is None else node_map)
 
 
 def create_top_20_comparison(COB_df: pd.DataFrame, Prev_df: pd.DataFrame) -> pd.DataFrame:
-    neg = COB_df.nsmallest(20, 'Macro')
-    pos = COB_df.nlargest(20, 'Macro')
-    combined = pd.concat([neg, pos], ignore_index=True)
-    combined['COB Rank'] = list(range(1, 21)) + list(range(260, 240, -1))
-
-    prev_map = Prev_df.set_index('pnl_vector')
-    combined['Prev COB Macro'] = combined['pnl_vector'].map(prev_map['Macro'])
-    combined['Prev COB FX'] = combined['pnl_vector'].map(prev_map['FX'])
-    combined['Prev COB Rates'] = combined['pnl_vector'].map(prev_map['Rates'])
-    combined['Prev COB EM Macro'] = combined['pnl_vector'].map(prev_map['EM Macro'])
-    combined['Prev COB P&L Vector No'] = combined['pnl_vector'].map(prev_map['rank'])
+    # shared rank/migration table; COB Rank keeps the report labels (1..20 and 260..241)
+    assets = ['FX', 'Rates', 'EM Macro']
+    top = tail_table(COB_df, Prev_df, 'Macro', 20, on='pnl_vector', prev_cols=['Macro'] + assets)
+    combined = top[list(COB_df.columns)].copy()
+    combined['COB Rank'] = report_ranks(top)
+
+    combined['Prev COB Macro'] = top['Prev Macro']
+    for col in assets:
+        combined[f'Prev COB {col}'] = top[f'Prev {col}']
+    combined['Prev COB P&L Vector No'] = top['rank'].where(top['Prev Rank'].notna())
 
     combined['Diff Macro'] = combined['Macro'] - combined['Prev COB Macro']
-    combined['Diff FX'] = combined['FX'] - combined['Prev COB FX']
-    combined['Diff Rates'] = combined['Rates'] - combined['Prev COB Rates']
-    combined['Diff EM Macro'] = combined['EM Macro'] - combined['Prev COB EM Macro']
+    for col in assets:
+        combined[f'Diff {col}'] = combined[col] - combined[f'Prev COB {col}']
     return combined
 
 
 def create_top_changes(COB_df: pd.DataFrame, Prev_df: pd.DataFrame) -> pd.DataFrame:
     merged = COB_df.merge(Prev_df, on='pnl_vector', suffixes=('_cob', '_prev'))
     merged['Diff'] = merged['Macro_cob'] - merged['Macro_prev']
-    top_neg = merged.nsmallest(20, 'Diff')
-    top_pos = merged.nlargest(20, 'Diff')
+    top_neg, top_pos = tails(merged, 'Diff', 20)
     final = pd.concat([top_neg, top_pos], ignore_index=True)
     final = final.rename(columns={
         'rank_cob': 'COB Rank', 'rank_prev': 'Prev COB Rank',
@@ -152,11 +147,12 @@ def create_top_changes(COB_df: pd.DataFrame, Prev_df: pd.DataFrame) -> pd.DataFr
 # =====================
 @st.cache_data(show_spinner=False)
 def load_from_excel(filepath: str):
-    xls = pd.ExcelFile(filepath)
-    DVaR_COB_raw = xls.parse('DVaR_COB')
-    DVaR_Prev_raw = xls.parse('DVaR_Prev_COB')
-    SVaR_COB_raw = xls.parse('SVaR_COB')
-    SVaR_Prev_raw = xls.parse('SVaR_Prev_COB')
+    # header in the first row; memory-mapped columnar copy (tail_store), converted on first use
+    book = open_tail_workbook(filepath, header_row=0)
+    DVaR_COB_raw = book['DVaR_COB'].frame()
+    DVaR_Prev_raw = book['DVaR_Prev_COB'].frame()
+    SVaR_COB_raw = book['SVaR_COB'].frame()
+    SVaR_Prev_raw = book['SVaR_Prev_COB'].frame()
 
     DVaR_COB_df = aggregate_vectors(DVaR_COB_raw, 521)
     DVaR_Prev_COB_df = aggregate_vectors(DVaR_Prev_raw, 521)
@@ -213,68 +209,26 @@ def build_outputs(DVaR_COB_df, DVaR_Prev_COB_df, SVaR_COB_df, SVaR_Prev_COB_df):
 # ICE FETCH & DATES
 # =====================
 
-def _ensure_ice_dirs():
-    latest_dir = os.path.join(BASE_DIR, "latest")
-    hist_dir = os.path.join(BASE_DIR, "history", datetime.now().strftime("%Y%m%d_%H%M%S"))
-    os.makedirs(latest_dir, exist_ok=True)
-    os.makedirs(hist_dir, exist_ok=True)
-    return latest_dir, hist_dir
-
-
-def _ice_run_with_retry(app, fn_name, *args, retries=3, sleep=0.6):
-    """Run ICE UDF with simple retries to handle COM hiccups."""
-    last_err = None
-    for _ in range(retries):
-        try:
-            return app.api.Run(fn_name, *args)
-        except Exception as e:
-            last_err = e
-            time.sleep(sleep)
-    raise last_err
+def _ice_fetcher(workers: int = ICE_WORKERS) -> IceFetcher:
+    return IceFetcher(lambda: XlwingsSession(XLL_PATH), BASE_DIR, REPORT_IDS, workers=workers, retries=ICE_RETRIES)
 
 def fetch_tail_report(var_type: str, lag: int):
     if xw is None:
         raise RuntimeError("xlwings not available in this environment.")
-    report_id = REPORT_IDS.get(var_type)
-    if not report_id:
-        raise ValueError(f"Missing report_id for {var_type}")
-
-    latest_dir, hist_dir = _ensure_ice_dirs()
-    app = xw.App(visible=False, add_book=False)
-    try:
-        app.api.RegisterXLL(XLL_PATH)
-        # Correct ICE call with retries; ensure int args
-        arr = _ice_run_with_retry(app, "Ice_Report_Legacy", int(report_id), "*", int(lag))
-        data = [list(row) for row in arr]
-        if not data:
-            raise RuntimeError("ICE returned no data.")
-        headers, *rows = data
-        df = pd.DataFrame(rows, columns=headers)
-
-        tag = 'COB' if lag == LAG_COB else 'PrevCOB'
-        out_name = f"{var_type}_{tag}.csv"
-        latest_csv = os.path.join(latest_dir, out_name)
-        hist_csv = os.path.join(hist_dir, out_name)
-        df.to_csv(latest_csv, index=False)
-        df.to_csv(hist_csv, index=False)
-        logging.info(f"Saved {var_type} lag={lag} → {latest_csv}")
-        return latest_csv
-    finally:
-        try:
-            app.kill()
-        except Exception:
-            pass
+    with _ice_fetcher(workers=1) as fetcher:
+        result = fetcher.submit(var_type, lag).result()
+    if result.error:
+        raise RuntimeError(result.error)
+    return result.path
 
 def fetch_all_via_ice():
-    paths = {}
-    for var in ("DVaR", "SVaR"):
-        for lag in (LAG_COB, LAG_PREV):
-            try:
-                paths[(var, lag)] = fetch_tail_report(var, lag)
-                time.sleep(0.2)
-            except Exception as e:
-                logging.error(f"Failed {var} lag={lag}: {e}")
-    return paths
+    """Pull DVaR/SVaR x COB/Prev COB concurrently; returns ({(var, lag): csv path}, per-report metrics)."""
+    if xw is None:
+        raise RuntimeError("xlwings not available in this environment.")
+    with _ice_fetcher() as fetcher:
+        results = fetcher.fetch_all(("DVaR", "SVaR"), (LAG_COB, LAG_PREV))
+        metrics = fetcher.metrics()
+    return {k: r.path for k, r in results.items() if r.error is None}, metrics
 
 
 def get_cob_dates(use_ice: bool, source_excel_path: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
@@ -321,7 +275,7 @@ with col1:
     if st.button("Fetch latest via ICE"):
         with st.spinner("Fetching reports via ICE… this may take a moment"):
             try:
-                out_paths = fetch_all_via_ice()
+                out_paths, fetch_metrics = fetch_all_via_ice()
                 # Clear cached loader so the new CSVs are read immediately
                 try:
                     load_from_ice_latest.clear()
@@ -329,8 +283,9 @@ with col1:
                     pass
                 st.success("Fetched via ICE. Latest CSVs updated.")
                 if out_paths:
-                    st.caption("
-".join(f"✓ {k}: {v}" for k, v in out_paths.items()))
+                    st.caption("\n".join(f"✓ {k}: {v}" for k, v in out_paths.items()))
+                st.dataframe(fetch_metrics[["var_type", "lag", "seconds", "ice_seconds", "attempts", "rows", "error"]],
+                             hide_index=True)
             except Exception as e:
                 st.error(f"ICE fetch failed: {e}")
 with col2:
@@ -367,6 +322,11 @@ tab_choice = st.sidebar.radio("Choose View", [
 ])
 
 
+def _xy(df: pd.DataFrame) -> dict:
+    """Bokeh source data (x=rank, y=Macro) for one line of the Time Series chart."""
+    data = chart_data(df, 'rank', ['Macro'])
+    return {'x': data['rank'], 'y': data['Macro']}
+
 def show_aggrid(df: pd.DataFrame):
     gb = GridOptionsBuilder.from_dataframe(df)
     gb.configure_default_column(filterable=True, sortable=True, resizable=True)
@@ -396,9 +356,13 @@ elif tab_choice == "Time Series":
     cob_df = data[f"{var_choice}_COB_df"]
     prev_df = data[f"{var_choice}_Prev_COB_df"]
 
+    # rank and Macro only, as typed arrays, min/max-decimated past tail_chart.MAX_POINTS vectors;
+    # the arrays are reused while the data is unchanged, the figure is new on every rerun
+    key = fingerprint(var_choice, cob_df[['rank', 'Macro']], prev_df[['rank', 'Macro']])
+    cob_xy, prev_xy = CHARTS.get_or_build(key, lambda: (_xy(cob_df), _xy(prev_df)))
     p = figure(title=f"{var_choice} Macro: COB vs Prev COB", x_axis_label='Vector Rank', y_axis_label='Macro Value', width=1000, height=420)
-    p.line(cob_df['rank'], cob_df['Macro'], legend_label='COB', line_width=2)
-    p.line(prev_df['rank'], prev_df['Macro'], legend_label='Prev COB', line_width=2)
+    p.line('x', 'y', source=ColumnDataSource(cob_xy), legend_label='COB', line_width=2)
+    p.line('x', 'y', source=ColumnDataSource(prev_xy), legend_label='Prev COB', line_width=2)
     p.legend.location = 'top_left'
     p.add_tools(HoverTool(tooltips=[("Rank", "@x"), ("Value", "@y")]))
     st.bokeh_chart(p, use_container_width=True)
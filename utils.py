@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 from datetime import datetime
 from dateutil import parser as dateparser
 import pandas as pd
@@ -34,26 +35,95 @@ def try_date_from_filename(fname:str):
                 pass
     return None
 
+@lru_cache(maxsize=32)
+def _strip_regex(regex_to_strip):
+    return re.compile(regex_to_strip)
+
+# accounting-style negatives: "(1,234.5)" -> -1234.5
+_PARENS_NEGATIVE = re.compile(r"^\s*\(.*\)\s*$")
+# strings float() accepts, minus exotic forms ("1_000") which take the slow path
+_FLOAT_TEXT = r"(?i)^\s*[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?|inf|infinity|nan)\s*$"
+# strings pd.to_numeric accepts (its parser also allows blanks after the exponent marker)
+_NUMERIC_TEXT = r"(?i)^\s*[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:e\s*[+-]?\d+)?|inf|infinity)\s*$"
+
+def _float_or_nan(s):
+    try:
+        return float(s)
+    except Exception:
+        return np.nan
+
 def coerce_numeric(x, regex_to_strip):
     if x is None:
         return np.nan
     if isinstance(x, (int, float, np.number)):
         return float(x)
     s = str(x)
-    s = re.sub(regex_to_strip, "", s)
+    negative = _PARENS_NEGATIVE.match(s) is not None
+    s = _strip_regex(regex_to_strip).sub("", s)
     s = s.replace(",", "")
     if s in ("", "+", "-"):
         return np.nan
-    try:
-        return float(s)
-    except Exception:
-        return np.nan
+    v = _float_or_nan(s)
+    return -abs(v) if negative else v
+
+# below this many cells the fixed cost of the str accessor passes outweighs a plain loop
+VECTORIZE_MIN_CELLS = 1024
+
+def coerce_numeric_series(values:pd.Series, regex_to_strip) -> pd.Series:
+    """Vectorized ``coerce_numeric`` over a whole column; same results, float64, same index.
+
+    Numbers pass through. Strings are cleaned with the ``str`` accessor, validated with one
+    regex and converted in a single array cast; only strings the regex can't vouch for
+    fall back to ``float()`` one by one.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.astype(float)
+    if len(values) < VECTORIZE_MIN_CELLS:
+        return pd.Series([coerce_numeric(None if v is pd.NA else v, regex_to_strip) for v in values],
+                         index=values.index, dtype=float)
+    if pd.api.types.is_string_dtype(values) and values.dtype != object:
+        is_str = values.notna()
+        out = pd.Series(np.nan, index=values.index)
+    else:
+        try:
+            is_str = values.str.len().notna()
+        except AttributeError:  # no strings at all
+            return pd.to_numeric(values, errors="coerce").astype(float)
+        out = pd.to_numeric(values.where(~is_str), errors="coerce").astype(float)
+    text = values[is_str].astype(str)
+    negative = text.str.contains("(", regex=False).to_numpy(dtype=bool)
+    if negative.any():
+        negative = negative & text.str.match(_PARENS_NEGATIVE.pattern).to_numpy(dtype=bool)
+    cleaned = text.str.replace(regex_to_strip, "", regex=True).str.replace(",", "", regex=False)
+    ok = cleaned.str.match(_FLOAT_TEXT).to_numpy(dtype=bool)
+    parsed = np.full(len(cleaned), np.nan)
+    parsed[ok] = cleaned[ok].to_numpy(dtype=object).astype(float)
+    odd = ~ok & ~cleaned.isin(["", "+", "-"]).to_numpy(dtype=bool)
+    if odd.any():
+        parsed[odd] = [_float_or_nan(v) for v in cleaned[odd]]
+    parsed = np.where(negative, -np.abs(parsed), parsed)
+    out[is_str.to_numpy()] = parsed
+    return out
+
+def numeric_counts(df:pd.DataFrame) -> pd.Series:
+    """Per column, how many cells ``pd.to_numeric(errors='coerce')`` would parse (same index as columns)."""
+    counts = []
+    for j in range(df.shape[1]):
+        s = df.iloc[:, j]
+        if pd.api.types.is_numeric_dtype(s):
+            counts.append(int(s.notna().sum()))
+        elif pd.api.types.is_string_dtype(s) and s.dtype != object:
+            counts.append(int(s.str.match(_NUMERIC_TEXT).fillna(False).sum()))
+        else:
+            counts.append(int(pd.to_numeric(s, errors="coerce").notna().sum()))
+    return pd.Series(counts, index=df.columns)
 
 def wide_to_long_guess(df, value_hints):
     cols = df.columns
     val_cols = [c for c in cols if any(h.lower() in str(c).lower() for h in value_hints)]
     if not val_cols:
-        numeric_mask = df.apply(lambda s: pd.to_numeric(s, errors='coerce')).notna().sum()
+        numeric_mask = numeric_counts(df)
         val_cols = list(numeric_mask.sort_values(ascending=False).head(3).index)
     id_cols = [c for c in cols if c not in val_cols]
     long = df.melt(id_vars=id_cols, value_vars=val_cols, var_name="measure", value_name="value")
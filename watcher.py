@@ -0,0 +1,173 @@
+"""Watch a drop folder and ingest new EM Flows PDFs as they land.
+
+    python watcher.py data/inbox --workers 4            # poll forever
+    python watcher.py data/inbox --once                 # one pass (cron / task scheduler)
+
+Each pass parses the PDFs that are new by content (SHA-256 ledger, so re-dropped or renamed
+files are skipped), appends them to the flows store, refreshes the rolling insights state and
+rewrites data/weekly_note.md. The dashboard then only reads precomputed outputs.
+"""
+import os, sys, json, time, glob, argparse
+from typing import Dict, List, Optional
+import yaml
+from parser import EMFlowsParser
+from parse_cache import ParseCache, file_sha256
+from store import FlowsStore
+from insights import publish_insights
+
+class IngestLedger:
+    """JSON record of every PDF the watcher has handled, keyed by content SHA-256.
+
+    It also keeps the (size, mtime_ns, sha) last seen for each file in the drop folder, so a
+    poll only re-hashes files that changed."""
+
+    def __init__(self, path:str="data/watch_ledger.json"):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.files: Dict[str, dict] = {}
+        self.dirty = False
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if "pdfs" in data:
+                self.entries, self.files = data["pdfs"], data.get("files", {})
+            else:  # written before the file index: the whole file is the sha -> entry map
+                self.entries = data
+
+    def sha_of(self, path:str) -> str:
+        """Content hash of a PDF; unchanged files (same size and mtime) skip re-hashing."""
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        known = self.files.get(key)
+        if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+            return known["sha"]
+        sha = file_sha256(path)
+        self.files[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha": sha}
+        self.dirty = True
+        return sha
+
+    def forget_missing(self, paths):
+        """Drop file index entries for anything not in ``paths`` (moved out of the drop folder)."""
+        keep = {os.path.abspath(p) for p in paths}
+        gone = [k for k in self.files if k not in keep]
+        for k in gone:
+            del self.files[k]
+        self.dirty = self.dirty or bool(gone)
+
+    def seen(self, sha:str, retry_failed:bool=False) -> bool:
+        entry = self.entries.get(sha)
+        return entry is not None and not (retry_failed and entry.get("error"))
+
+    def record(self, sha:str, **entry):
+        self.entries[sha] = entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"pdfs": self.entries, "files": self.files}, f, indent=1, sort_keys=True)
+        os.replace(self.path + ".tmp", self.path)
+        self.dirty = False
+
+def _settled(path:str, settle_s:float) -> bool:
+    # a file still being copied keeps changing mtime; only take it once it has been quiet
+    try:
+        return time.time() - os.path.getmtime(path) >= settle_s
+    except OSError:
+        return False
+
+class FolderWatcher:
+    def __init__(self, folder:str, config_path:str="config.yml", store_root:str="data/flows",
+                 ledger_path:str="data/watch_ledger.json", note_path:str="data/weekly_note.md",
+                 state_path:str="data/insights_state.parquet", cache_dir:Optional[str]="data/cache/parsed",
+                 workers:int=2, max_batch:int=20, settle_s:float=5.0, retry_failed:bool=False):
+        self.folder = folder
+        self.parser = EMFlowsParser(config_path)
+        self.cache = ParseCache(self.parser.cfg, cache_dir) if cache_dir else None
+        self.store = FlowsStore(store_root)
+        self.ledger = IngestLedger(ledger_path)
+        self.note_path, self.state_path = note_path, state_path
+        self.workers, self.max_batch = max(1, int(workers)), max(1, int(max_batch))
+        self.settle_s, self.retry_failed = settle_s, retry_failed
+
+    def pending(self) -> List[tuple]:
+        """(path, sha) of settled PDFs not yet in the ledger, oldest first, capped at max_batch."""
+        paths = sorted(glob.glob(os.path.join(self.folder, "*.pdf")), key=lambda p: (os.path.getmtime(p), p))
+        self.ledger.forget_missing(paths)
+        out, shas = [], set()
+        for p in paths:
+            if not _settled(p, self.settle_s):
+                continue
+            sha = self.ledger.sha_of(p)
+            if sha in shas or self.ledger.seen(sha, self.retry_failed):
+                continue
+            shas.add(sha)
+            out.append((p, sha))
+            if len(out) >= self.max_batch:
+                break
+        return out
+
+    def run_once(self) -> List[dict]:
+        """Ingest whatever is pending; returns the parse report (empty if nothing was new)."""
+        todo = self.pending()
+        if not todo:
+            if self.ledger.dirty:
+                self.ledger.save()  # newly hashed files, so the next process doesn't hash them again
+            return []
+        paths = [p for p, _ in todo]
+        df, report = self.parser.parse_many(paths, workers=self.workers, cache=self.cache)
+        if not df.empty:
+            self.store.write(df)
+            publish_insights(self.store, changed_dates=df["as_of_date"].unique(),
+                             state_path=self.state_path, note_path=self.note_path)
+        # only record after the store and note are written, so a crash mid-pass is retried
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+        for (_, sha), r in zip(todo, report):
+            self.ledger.record(sha, source_pdf=r["source_pdf"], as_of_date=r["as_of_date"], rows=r["rows"],
+                               error=r["error"], ingested_at=stamp)
+        self.ledger.save()
+        return report
+
+    def run(self, interval_s:float=30.0):
+        while True:
+            t0 = time.perf_counter()
+            report = self.run_once()
+            for r in report:
+                status = f"ERROR {r['error']}" if r["error"] else f"{r['rows']} rows{' (cached)' if r['cached'] else ''}"
+                print(f"{time.strftime('%H:%M:%S')} {r['source_pdf']}: as_of={r['as_of_date']} {status}", flush=True)
+            if report:
+                print(f"{time.strftime('%H:%M:%S')} ingested {len(report)} PDF(s) in {time.perf_counter() - t0:.2f}s;"
+                      f" note -> {self.note_path}", flush=True)
+            time.sleep(interval_s)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Watch a folder and ingest new EM Flows PDFs as they land.")
+    ap.add_argument("folder", nargs="?", default=None, help="drop folder (default: watch.folder in config.yml)")
+    ap.add_argument("--config", default="config.yml")
+    ap.add_argument("--once", action="store_true", help="process what is there now and exit")
+    ap.add_argument("--interval", type=float, default=None, help="seconds between polls")
+    ap.add_argument("--workers", type=int, default=None, help="max PDFs parsed concurrently")
+    ap.add_argument("--store", default="data/flows")
+    ap.add_argument("--retry-failed", action="store_true", help="re-try PDFs that failed on an earlier pass")
+    args = ap.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        wcfg = (yaml.safe_load(f) or {}).get("watch", {}) or {}
+    folder = args.folder or wcfg.get("folder", "data/inbox")
+    os.makedirs(folder, exist_ok=True)
+    watcher = FolderWatcher(folder, args.config, store_root=args.store,
+                            workers=args.workers or wcfg.get("workers", 2),
+                            max_batch=wcfg.get("max_batch", 20), settle_s=float(wcfg.get("settle_s", 5)),
+                            retry_failed=args.retry_failed)
+    if args.once:
+        report = watcher.run_once()
+        print(f"Ingested {len(report)} new PDF(s) from {folder}")
+        return 1 if any(r["error"] for r in report) else 0
+    print(f"Watching {folder} (Ctrl+C to stop)", flush=True)
+    try:
+        watcher.run(args.interval or float(wcfg.get("interval_s", 30)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())